@@ -0,0 +1,255 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from .config import (
+    INFERENCE_BACKEND, INFERENCE_INT8, INFERENCE_IMGSZ,
+    MODEL_CACHE_DIR, SAVE_DIR, CALIBRATION_MAX_IMAGES
+)
+
+SUPPORTED_BACKENDS = ("torch", "onnx", "openvino", "stub")
+
+def load_model(weights, backend=INFERENCE_BACKEND, int8=INFERENCE_INT8, imgsz=INFERENCE_IMGSZ):
+    """Returns an ultralytics model for `weights` running on the configured backend.
+
+    Exported backends go through the same YOLO wrapper, so callers keep receiving
+    the usual Results objects regardless of the runtime underneath.
+    """
+    if backend == "stub":
+        return StubModel(weights)
+
+    from ultralytics import YOLO
+
+    if backend == "torch":
+        return YOLO(weights)
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {SUPPORTED_BACKENDS})")
+
+    try:
+        artifact = export_model(weights, backend, int8, imgsz)
+    except Exception as e:
+        print(f"[BACKEND] {backend.upper()} EXPORT FAILED for {weights}: {e}. Falling back to torch.")
+        return YOLO(weights)
+
+    print(f"[BACKEND] {backend.upper()}{' INT8' if int8 else ''} -> {artifact}")
+    return YOLO(artifact, task="detect")
+
+_DIGEST_INDEX = os.path.join(MODEL_CACHE_DIR, "digests.json")
+_digest_lock = threading.Lock()
+
+def weights_digest(weights):
+    """Short sha256 of a weights file, or None when it is not on disk (yet).
+
+    Digests are remembered per (path, size, mtime) in MODEL_CACHE_DIR/digests.json,
+    so restarts do not re-read the checkpoints.
+    """
+    path = os.path.abspath(weights)
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    with _digest_lock:
+        try:
+            with open(_DIGEST_INDEX) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        entry = index.get(path)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()[:12]
+        index[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        try:
+            os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+            tmp = f"{_DIGEST_INDEX}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, _DIGEST_INDEX)
+        except OSError:
+            pass # Read-only cache dir: hash again next time
+        return digest
+
+def artifact_path(weights, backend, int8, imgsz, digest=None):
+    """Cache location of an exported model. Keyed by the weights' content hash, so retrained
+    weights saved under the same name are re-exported instead of silently reusing the old graph."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    # Custom weights are all called best.pt; keep the run folder in the key
+    parent = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(weights))))
+    if os.path.isabs(weights) and parent:
+        stem = f"{parent}_{stem}"
+    digest = digest or weights_digest(weights)
+    name = f"{stem}_{digest}_{imgsz}" if digest else f"{stem}_{imgsz}"
+    name += "_int8" if int8 else ""
+    if backend == "onnx":
+        return os.path.join(MODEL_CACHE_DIR, f"{name}.onnx")
+    return os.path.join(MODEL_CACHE_DIR, f"{name}_openvino_model")
+
+def _prune_stale(target, weights, backend, int8, imgsz):
+    """Removes exports of earlier versions of the same weights (same name, other digest)."""
+    pattern = artifact_path(weights, backend, int8, imgsz, digest="?" * 12)
+    for path in glob.glob(pattern):
+        if path != target:
+            print(f"[BACKEND] PRUNING STALE EXPORT {os.path.basename(path)}")
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+def export_model(weights, backend, int8=False, imgsz=INFERENCE_IMGSZ):
+    """Exports `weights` once and returns the cached artifact path on later calls."""
+    from ultralytics import YOLO
+
+    target = artifact_path(weights, backend, int8, imgsz)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    print(f"[BACKEND] EXPORTING {weights} -> {backend.upper()}{' INT8' if int8 else ''} (one-time)")
+    model = YOLO(weights)
+    # Hub weights (yolov8m.pt) may have been downloaded just now, which makes their digest known
+    target = artifact_path(weights, backend, int8, imgsz)
+    if os.path.exists(target):
+        return target
+
+    if backend == "openvino":
+        kwargs = {"int8": True, "data": _calibration_dataset(model.names)} if int8 else {}
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=True, **kwargs)
+        shutil.move(exported, target)
+        _prune_stale(target, weights, backend, int8, imgsz)
+        return target
+
+    # ONNX: dynamic batch so cameras can be stacked into one call
+    exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if int8:
+        _quantize_onnx(exported, target, imgsz)
+        os.remove(exported)
+    else:
+        shutil.move(exported, target)
+    _prune_stale(target, weights, backend, int8, imgsz)
+    return target
+
+def _calibration_images():
+    images = sorted(glob.glob(os.path.join(SAVE_DIR, "*.jpg")), reverse=True)
+    if not images:
+        raise RuntimeError(f"INT8 calibration needs snapshots in {SAVE_DIR}")
+    return images[:CALIBRATION_MAX_IMAGES]
+
+def _calibration_dataset(names):
+    """Builds a throwaway dataset yaml over recent event snapshots for OpenVINO/NNCF calibration."""
+    root = os.path.join(MODEL_CACHE_DIR, "calibration")
+    image_dir = os.path.join(root, "images")
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(image_dir)
+    for path in _calibration_images():
+        shutil.copy(path, image_dir)
+
+    yaml_path = os.path.join(root, "calibration.yaml")
+    with open(yaml_path, "w") as f:
+        f.write(f"path: {root}\ntrain: images\nval: images\nnames:\n")
+        for cls_id, name in names.items():
+            f.write(f"  {cls_id}: '{name}'\n")
+    return yaml_path
+
+def _letterbox_blob(path, imgsz):
+    import cv2
+    import numpy as np
+
+    img = cv2.imread(path)
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob)
+
+def _quantize_onnx(src, dst, imgsz):
+    """Static INT8 quantization of an exported ONNX graph, calibrated on archived event frames."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(src, load_external_data=False).graph.input[0].name
+    images = _calibration_images()
+
+    class EventFrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(images)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            return None if path is None else {input_name: _letterbox_blob(path, imgsz)}
+
+    quantize_static(
+        src, dst, EventFrameReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    # Keep ultralytics metadata (class names, stride, imgsz) on the quantized graph
+    fp32, int8 = onnx.load(src), onnx.load(dst)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, dst)
+
+class _StubBoxes:
+    def __init__(self, rows):
+        self.xyxy = rows[:, :4]
+        self.conf = rows[:, 4]
+        self.cls = rows[:, 5]
+
+class _StubResult:
+    def __init__(self, rows):
+        self.boxes = _StubBoxes(rows)
+
+class StubModel:
+    """Deterministic stand-in for a YOLO model (backend "stub"), no weights or ultralytics needed.
+
+    Every call emits three persons walking on fixed paths, a weapon carried by the
+    first one and a static weapon-like object, so post-processing, tracking and the
+    threat rules (association, static suppression, grouping) run on realistic input.
+    The same frame sequence always yields the same detections.
+    """
+    GEN_NAMES = {0: "person", 1: "bicycle", 2: "car", 34: "baseball bat", 43: "knife", 56: "chair"}
+    SPEC_NAMES = {0: "person", 1: "pistol", 2: "knife"}
+
+    def __init__(self, weights):
+        name = os.path.basename(str(weights))
+        self.ckpt_path = f"stub-{name}"
+        self.general = name.startswith("yolo")
+        self.names = self.GEN_NAMES if self.general else self.SPEC_NAMES
+        self.weapon_cls = 43 if self.general else 1
+        self.calls = 0
+
+    def __call__(self, frames, imgsz=INFERENCE_IMGSZ, conf=0.25, verbose=False, **kwargs):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        results = []
+        for frame in frames:
+            self.calls += 1
+            results.append(_StubResult(self._rows(frame.shape[1], frame.shape[0], self.calls, conf)))
+        return results
+
+    def _rows(self, w, h, t, conf):
+        jitter = 0 if self.general else 2 # Heads disagree slightly, so cross-model dedup has work to do
+        rows = []
+        for i in range(3):
+            cx = w * (0.2 + 0.3 * i) + 0.05 * w * np.sin(t / 10 + i) + jitter
+            pw, ph = w * 0.08, h * 0.35
+            rows.append((cx - pw / 2, h * 0.55 - ph / 2, cx + pw / 2, h * 0.55 + ph / 2, 0.85 - 0.05 * i, 0))
+        hand_x = rows[0][2]
+        rows.append((hand_x - w * 0.02, h * 0.55, hand_x + w * 0.02, h * 0.6, 0.9 if not self.general else 0.6, self.weapon_cls))
+        rows.append((w * 0.85 + jitter, h * 0.1, w * 0.9 + jitter, h * 0.2, 0.5, self.weapon_cls))
+        rows = np.array(rows, dtype=np.float32)
+        return rows[rows[:, 4] >= conf]
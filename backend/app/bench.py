@@ -0,0 +1,245 @@
+"""Offline replay and benchmark harness for the detection pipeline.
+
+Run from backend/:
+
+    python -m app.bench data/events                        # archived snapshots through the real models
+    python -m app.bench capture.mjpeg --stub --frames 500  # deterministic CI run, no weights needed
+    python -m app.bench clip.mp4 --stub --json bench.json --baseline bench_baseline.json
+
+Frames go through the live code path (Camera decode, DetectionSystem.detect_batch,
+process_threats) and every stage is timed. Persistence runs the real snapshot encode
+and file write, but into a temporary folder so the archive and DB are never touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+from .cameras import Camera
+from .config import INFERENCE_BACKEND
+from .inference import DetectionSystem
+from .sources import expand_sources, open_source
+from .storage import encode_snapshot
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+STAGES = ("decode", "infer_spec", "infer_gen", "infer_shared", "postprocess", "threats", "persistence")
+REGRESSION_FLOOR_MS = 0.5 # Ignore slowdowns smaller than this (timer noise on tiny stages)
+
+class StageRecorder:
+    """Collects per-stage durations (thread-safe: the spec head reports from its worker thread)."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+    def summary(self):
+        out = {}
+        for stage in STAGES:
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            ms = np.array(values) * 1000
+            out[stage] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p90_ms": round(float(np.percentile(ms, 90)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return out
+
+class BenchEventSink:
+    """Event sink for benchmarks: EventWriter's encode + write, synchronously, into a scratch folder."""
+    def __init__(self, recorder, directory):
+        self.recorder = recorder
+        self.directory = directory
+        self.events = 0
+
+    def submit(self, frame, threat_type, labels, confidence, filename, boxes, camera_id=None, timestamp=None):
+        with self.recorder.time("persistence"):
+            data = frame if isinstance(frame, bytes) else encode_snapshot(frame)
+            with open(os.path.join(self.directory, filename), "wb") as f:
+                f.write(data)
+        self.events += 1
+        return True
+
+def _timed_frames(paths, loops, recorder):
+    """Yields (kind, item) from every source; reading a decoded video frame counts as decode time."""
+    for _ in range(loops):
+        for path in paths:
+            kind, items = open_source(path)
+            while True:
+                t0 = time.perf_counter()
+                item = next(items, None)
+                if item is None:
+                    break
+                if kind == "frame":
+                    recorder.observe("decode", time.perf_counter() - t0)
+                yield kind, item
+
+def replay(paths, detector, recorder, batch=1, max_frames=None, loops=1, warmup=0):
+    """Feeds every source frame through decode -> detect_batch -> process_threats.
+
+    `batch` frames at a time are handed to detect_batch, each on its own virtual
+    camera (own decode cache and threat state), like a multi-camera tick.
+    Returns (frames measured, seconds).
+    """
+    cameras = [Camera(f"bench{i}", "bench://replay") for i in range(batch)]
+    frames_done = 0
+    pending = []
+    started = time.perf_counter()
+
+    def flush():
+        results = detector.detect_batch([frame for _, _, frame, _ in pending])
+        for (cam, packet, frame, scale), (dets, _) in zip(pending, results):
+            dets.scale(scale)
+            detector.process_threats(frame, dets, cam.threat_state, cam.id, packet.jpeg, scale)
+        pending.clear()
+
+    for kind, item in _timed_frames(paths, loops, recorder):
+        cam = cameras[len(pending)]
+        if kind == "jpeg":
+            cam.publish(jpeg=item)
+        else:
+            cam.publish(frame=item)
+        packet = cam.packet
+        with recorder.time("decode") if kind == "jpeg" else contextlib.nullcontext():
+            frame, scale = cam.decode(packet, cam.inference_reduce(packet))
+        if frame is None:
+            continue # Corrupt JPEG
+        pending.append((cam, packet, frame, scale))
+        if len(pending) == batch:
+            flush()
+        frames_done += 1
+
+        if warmup and frames_done == warmup:
+            # Model warm-up (lazy allocations, kernel selection) stays out of the statistics
+            recorder.reset()
+            frames_done = 0
+            warmup = 0
+            started = time.perf_counter()
+        if max_frames and frames_done >= max_frames:
+            break
+
+    if pending:
+        flush()
+    return frames_done, time.perf_counter() - started
+
+def compare(report, baseline, tolerance):
+    """Returns human-readable regressions of `report` against a previous JSON report."""
+    problems = []
+    for stage, stats in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        if stats["p90_ms"] > old["p90_ms"] * (1 + tolerance) and stats["p90_ms"] - old["p90_ms"] > REGRESSION_FLOOR_MS:
+            problems.append(f"{stage}: p90 {old['p90_ms']:.2f} -> {stats['p90_ms']:.2f} ms")
+    old_fps = baseline.get("throughput_fps")
+    if old_fps and report["throughput_fps"] < old_fps * (1 - tolerance):
+        problems.append(f"throughput: {old_fps:.1f} -> {report['throughput_fps']:.1f} fps")
+    return problems
+
+def print_report(report):
+    print(f"\n{'STAGE':<14}{'COUNT':>8}{'MEAN':>10}{'P50':>10}{'P90':>10}{'P99':>10}{'MAX':>10}  (ms)")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<14}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    print(f"\nFrames: {report['frames']} in {report['seconds']:.2f}s -> {report['throughput_fps']:.1f} fps (batch {report['batch']})")
+    print(f"Events persisted: {report['events']}")
+    mem = report["memory"]
+    print(f"Memory: python peak {mem['python_peak_mb']:.1f} MB, current {mem['python_current_mb']:.1f} MB"
+          + (f", process max RSS {mem['max_rss_mb']:.1f} MB" if mem["max_rss_mb"] is not None else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench", description="Replay recordings through the detection pipeline and time each stage.")
+    parser.add_argument("sources", nargs="+", help="MJPEG captures (.mjpeg/.mjpg), video files, JPEGs or folders of JPEGs (e.g. data/events)")
+    parser.add_argument("--stub", action="store_true", help="Deterministic stub models (no weights, for CI)")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, help="Inference backend when not using --stub")
+    parser.add_argument("--batch", type=int, default=1, help="Frames per detect_batch call (= simulated cameras)")
+    parser.add_argument("--frames", type=int, default=0, help="Stop after this many measured frames (0 = all)")
+    parser.add_argument("--loops", type=int, default=1, help="Replay the sources this many times")
+    parser.add_argument("--warmup", type=int, default=5, help="Frames excluded from the statistics")
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Previous --json report; exit 1 when a stage regresses")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p90/throughput regression")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's console output")
+    args = parser.parse_args(argv)
+
+    paths = expand_sources(args.sources)
+    backend = "stub" if args.stub else args.backend
+    recorder = StageRecorder()
+
+    with tempfile.TemporaryDirectory(prefix="hawkeye-bench-") as scratch:
+        detector = DetectionSystem(backend=backend)
+        detector.stage_observer = recorder.observe
+        detector.event_sink = BenchEventSink(recorder, scratch)
+
+        tracemalloc.start()
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            frames, seconds = replay(paths, detector, recorder, args.batch, args.frames, args.loops, args.warmup)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    report = {
+        "backend": backend,
+        "sources": paths,
+        "batch": args.batch,
+        "frames": frames,
+        "seconds": round(seconds, 3),
+        "throughput_fps": round(frames / seconds, 2) if seconds > 0 else 0.0,
+        "events": detector.event_sink.events,
+        "stages": recorder.summary(),
+        "memory": {
+            "python_current_mb": round(current / 1024 ** 2, 2),
+            "python_peak_mb": round(peak / 1024 ** 2, 2),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        },
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import cv2
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .config import (
+    CAMERAS, DEFAULT_CAMERA_ID, CAMERA_READER, MJPEG_BACKOFF_MIN_SECONDS, MJPEG_BACKOFF_MAX_SECONDS,
+    DECODE_REDUCED, INFERENCE_IMGSZ, MOTION_DOWNSCALE
+)
+from .inference import ThreatState
+from .mjpeg import MJPEGReader, jpeg_size, reduce_factor
+from .motion import MotionGate, InferenceScheduler
+from .streaming import FrameBroadcaster
+
+# Latest frame of a camera, swapped atomically by the fetcher. `jpeg` holds the camera's
+# compressed bytes (MJPEG reader), `frame` an already decoded image (OpenCV reader);
+# `time` is when it arrived.
+FramePacket = namedtuple("FramePacket", ("seq", "jpeg", "frame", "size", "time"))
+
+_IMREAD_FLAGS = {
+    (1, False): cv2.IMREAD_COLOR, (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+    (4, False): cv2.IMREAD_REDUCED_COLOR_4, (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (1, True): cv2.IMREAD_GRAYSCALE, (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4, (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+def decode_jpeg(jpeg, reduce=1, gray=False):
+    """Decodes JPEG bytes, at 1/`reduce` scale (1, 2, 4, 8) straight out of libjpeg. None when corrupt."""
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), _IMREAD_FLAGS[(reduce, gray)])
+
+def empty_detections():
+    """Fresh HUD payload for a camera that has not produced a frame yet."""
+    return {
+        "timestamp": "",
+        "fps": 0,
+        "counts": {"persons": 0, "weapons": 0},
+        "threats": [],
+        "boxes": [],
+        "status": "INITIALIZING",
+        "frame_dims": [0, 0],
+        "debug": {"model_used": "yolov8m (pending)"}
+    }
+
+class Camera:
+    """A single ESP32-CAM uplink with its own frame slot and threat state."""
+    def __init__(self, camera_id, url):
+        self.id = camera_id
+        self.url = url
+        self.reader = CAMERA_READER if url.startswith(("http://", "https://")) else "opencv"
+        self.is_connected = False
+        self.running = True
+        self.packet = FramePacket(0, None, None, None, 0) # seq increments on every received frame
+        self.last_frame_time = 0
+        self._decoded_seq = -1
+        self._decoded = {} # (reduce, gray) -> (image, scale) for _decoded_seq
+        self._decode_lock = threading.Lock()
+        self.threat_state = ThreatState()
+        self.motion = MotionGate()
+        self.scheduler = InferenceScheduler()
+        self.clip_buffer = None # ClipBuffer where events are archived (standalone / api node)
+        self.motion_seq = -1 # Last frame fed to the motion gate
+        self.pipeline_seq = 0 # Last frame the pipeline looked at
+        # Pipeline counters for /metrics (frames received = frame_seq)
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self.frames_dropped = 0
+        self.has_motion = False
+        self.detections = empty_detections()
+        self.detections["camera_id"] = camera_id
+        self.broadcaster = FrameBroadcaster(self)
+
+    @property
+    def frame_seq(self):
+        return self.packet.seq
+
+    @property
+    def latest_frame(self):
+        """Full-resolution BGR frame (decoded on demand), or None."""
+        return self.decode(self.packet)[0]
+
+    def has_frame(self):
+        packet = self.packet
+        return packet.jpeg is not None or packet.frame is not None
+
+    def publish(self, jpeg=None, frame=None):
+        """Fetcher hook: swaps in a new frame and wakes video viewers."""
+        size = jpeg_size(jpeg) if jpeg is not None else (frame.shape[1], frame.shape[0])
+        self.last_frame_time = time.time()
+        self.packet = FramePacket(self.packet.seq + 1, jpeg, frame, size, self.last_frame_time)
+        if self.clip_buffer is not None:
+            self.clip_buffer.add(jpeg, frame, self.last_frame_time)
+        self.broadcaster.notify()
+
+    def clear(self):
+        """Drops the stale frame after the link is lost."""
+        self.packet = FramePacket(self.packet.seq, None, None, None, self.packet.time)
+
+    def decode(self, packet, reduce=1, gray=False):
+        """Returns (image, scale) for `packet`, or (None, 1) when there is nothing decodable.
+
+        Compressed frames are decoded at most once per (reduce, gray) and sequence number;
+        `reduce` (1, 2, 4, 8) maps onto IMREAD_REDUCED_* so libjpeg skips the discarded
+        resolution. Multiply image coordinates by `scale` to get full-frame coordinates.
+        """
+        if packet.jpeg is None:
+            if packet.frame is None:
+                return None, 1
+            if gray:
+                return cv2.cvtColor(packet.frame, cv2.COLOR_BGR2GRAY), 1
+            return packet.frame, 1
+
+        key = (reduce, gray)
+        with self._decode_lock:
+            if self._decoded_seq != packet.seq:
+                self._decoded_seq = packet.seq
+                self._decoded = {}
+            if key not in self._decoded:
+                image = decode_jpeg(packet.jpeg, reduce, gray)
+                self._decoded[key] = (image, reduce) if image is not None else (None, 1)
+            return self._decoded[key]
+
+    def inference_reduce(self, packet, imgsz=INFERENCE_IMGSZ):
+        """Decode downscale for the detector: only when the frame is well above the model input."""
+        return reduce_factor(packet.size, imgsz) if DECODE_REDUCED else 1
+
+    def check_motion(self, packet):
+        """Runs the motion gate once per new frame on a reduced grayscale decode."""
+        if packet.seq != self.motion_seq:
+            self.motion_seq = packet.seq
+            gray, _ = self.decode(packet, reduce_factor(packet.size, max(MOTION_DOWNSCALE)), gray=True)
+            if gray is not None:
+                self.has_motion = self.motion.update(gray)
+        return self.has_motion
+
+    def stop(self):
+        """Ends the fetcher after its current read (camera reassigned to another node)."""
+        self.running = False
+
+    def frame_age(self):
+        return time.time() - self.last_frame_time if self.last_frame_time > 0 else None
+
+    def fetch_forever(self):
+        """Constantly grabs frames from the ESP32-CAM to clear buffers."""
+        if self.reader == "mjpeg":
+            self._fetch_mjpeg()
+        else:
+            self._fetch_opencv()
+
+    def _fetch_mjpeg(self):
+        """Native multipart reader: keeps the camera's JPEG bytes, never decodes here."""
+        backoff = MJPEG_BACKOFF_MIN_SECONDS
+        while self.running:
+            print(f"[STREAM:{self.id}] ATTEMPTING LINK: {self.url}")
+            reader = MJPEGReader(self.url)
+            try:
+                reader.open()
+                self.is_connected = True
+                print(f"[STREAM:{self.id}] UPLINK ESTABLISHED -> {self.url} (native MJPEG)")
+                for jpeg in reader.frames():
+                    if not self.running:
+                        break
+                    self.publish(jpeg=jpeg)
+                    backoff = MJPEG_BACKOFF_MIN_SECONDS
+                if self.running:
+                    print(f"[STREAM:{self.id}] STREAM CLOSED BY CAMERA")
+            except Exception as e:
+                print(f"[STREAM:{self.id}] LINK FAILURE: {self.url} ({e})")
+            finally:
+                reader.close()
+                self.is_connected = False
+                self.clear() # Clear stale frame
+
+            if self.running:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MJPEG_BACKOFF_MAX_SECONDS)
+
+    def _fetch_opencv(self):
+        while self.running:
+            print(f"[STREAM:{self.id}] ATTEMPTING LINK: {self.url}")
+            cap = cv2.VideoCapture(self.url)
+            if not cap.isOpened():
+                self.is_connected = False
+                self.clear()
+                print(f"[STREAM:{self.id}] LINK FAILURE: Destination {self.url} unreachable.")
+                time.sleep(3)
+                continue
+
+            self.is_connected = True
+            print(f"[STREAM:{self.id}] UPLINK ESTABLISHED -> {self.url}")
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            while self.running:
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    self.is_connected = False
+                    self.clear() # Clear stale frame
+                    break
+                self.publish(frame=frame)
+                # No sleep here - grab as fast as possible
+
+            cap.release()
+            time.sleep(1)
+
+class CameraRegistry:
+    """Ordered set of cameras served by this node."""
+    def __init__(self, cameras=None):
+        cameras = CAMERAS if cameras is None else cameras
+        self.cameras = {cid: Camera(cid, url) for cid, url in cameras.items()}
+
+    def __iter__(self):
+        return iter(list(self.cameras.values()))
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def get(self, camera_id):
+        return self.cameras.get(camera_id)
+
+    @property
+    def default(self):
+        return self.cameras.get(DEFAULT_CAMERA_ID) or next(iter(self.cameras.values()))
+
+    def start_fetchers(self):
+        for cam in self:
+            self._start(cam)
+
+    def _start(self, cam):
+        threading.Thread(target=cam.fetch_forever, daemon=True, name=f"fetch-{cam.id}").start()
+
+    def assign(self, cameras):
+        """Replaces the served set with `cameras` (camera_id -> url), keeping unchanged cameras running.
+
+        The dict is swapped atomically, so a loop iterating the registry never sees it change size.
+        """
+        current = self.cameras
+        updated = {}
+        for cid, url in cameras.items():
+            cam = current.get(cid)
+            if cam is None or cam.url != url:
+                cam = Camera(cid, url)
+                self._start(cam)
+            updated[cid] = cam
+        self.cameras = updated
+        for cid, cam in current.items():
+            if updated.get(cid) is not cam:
+                cam.stop()
+        return updated
@@ -0,0 +1,208 @@
+import collections
+import os
+import queue
+import struct
+import threading
+import time
+
+import cv2
+
+from .config import (
+    CLIP_RECORDING, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, CLIP_FPS, CLIP_BUFFER_MAX_BYTES,
+    CLIP_JPEG_QUALITY, CLIP_QUEUE_SIZE, CLIP_MAX_SECONDS, SAVE_DIR
+)
+from .db import add_event_bytes
+from .mjpeg import jpeg_size
+from .retention import disk_ledger
+from .storage import clip_name
+
+class ClipBuffer:
+    """Bounded ring of one camera's recent JPEG frames.
+
+    Keeps at most CLIP_FPS frames per second, for the pre-roll plus post-roll window,
+    and never more than CLIP_BUFFER_MAX_BYTES: memory per camera is fixed by config,
+    not by the camera's frame rate or resolution.
+    """
+    def __init__(self, fps=CLIP_FPS, horizon=CLIP_PRE_SECONDS + CLIP_POST_SECONDS + 1, max_bytes=CLIP_BUFFER_MAX_BYTES):
+        self.interval = 1.0 / fps
+        self.horizon = horizon
+        self.max_bytes = max_bytes
+        self.frames = collections.deque() # (timestamp, jpeg)
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, jpeg=None, frame=None, now=None):
+        """Fetcher hook. Decoded frames (OpenCV reader) are only encoded when a slot is due."""
+        now = now or time.time()
+        if self.frames and now - self.frames[-1][0] < self.interval:
+            return
+        if jpeg is None:
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, CLIP_JPEG_QUALITY])
+            if not ok:
+                return
+            jpeg = buffer.tobytes()
+        with self._lock:
+            self.frames.append((now, jpeg))
+            self.bytes += len(jpeg)
+            while self.frames and (self.frames[0][0] < now - self.horizon or self.bytes > self.max_bytes):
+                self.bytes -= len(self.frames.popleft()[1])
+
+    def window(self, start, end):
+        with self._lock:
+            return [(t, jpeg) for t, jpeg in self.frames if start <= t <= end]
+
+    def stats(self):
+        return {"frames": len(self.frames), "bytes": self.bytes}
+
+def write_mjpeg_avi(path, jpegs, fps):
+    """Muxes JPEG frames into an MJPEG AVI as-is (no decode/re-encode), playable by VLC/ffmpeg/OpenCV."""
+    width, height = jpeg_size(jpegs[0]) or (0, 0)
+    fps = max(1, int(round(fps)))
+    max_frame = max(len(j) for j in jpegs)
+
+    movi, index, offset = [], [], 4 # idx1 offsets are relative to the 'movi' fourcc
+    for jpeg in jpegs:
+        pad = b"\0" if len(jpeg) % 2 else b""
+        movi.append(b"00dc" + struct.pack("<I", len(jpeg)) + jpeg + pad)
+        index.append(struct.pack("<4sIII", b"00dc", 0x10, offset, len(jpeg))) # AVIIF_KEYFRAME
+        offset += 8 + len(jpeg) + len(pad)
+
+    def chunk(fourcc, data):
+        return fourcc + struct.pack("<I", len(data)) + data
+
+    def lst(kind, data):
+        return b"LIST" + struct.pack("<I", len(data) + 4) + kind + data
+
+    avih = struct.pack("<14I", 1000000 // fps, max_frame * fps, 0, 0x10, len(jpegs), 0, 1, max_frame, width, height, 0, 0, 0, 0)
+    strh = struct.pack("<4s4sIHHIIIIIIIIhhhh", b"vids", b"MJPG", 0, 0, 0, 0, 1, fps, 0, len(jpegs), max_frame, 0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+    hdrl = lst(b"hdrl", chunk(b"avih", avih) + lst(b"strl", chunk(b"strh", strh) + chunk(b"strf", strf)))
+    body = b"AVI " + hdrl + lst(b"movi", b"".join(movi)) + chunk(b"idx1", b"".join(index))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+    os.replace(tmp, path) # Never serve a half-written clip
+    return len(body) + 8
+
+class _ClipJob:
+    """One clip being recorded; `end` moves out when later events reuse the clip."""
+    def __init__(self, buffer, image_path, clip, event_type, start, end):
+        self.buffer = buffer
+        self.image_path = image_path
+        self.clip = clip
+        self.event_type = event_type
+        self.start = start
+        self.end = end
+        self.frames = []
+
+    def collect(self, now):
+        """Copies the frames buffered since the last call (the ring would evict a long clip's start)."""
+        last = self.frames[-1][0] if self.frames else None
+        self.frames.extend(f for f in self.buffer.window(self.start, min(now, self.end)) if last is None or f[0] > last)
+
+class ClipRecorder:
+    """Writes pre/post-event clips from the cameras' ClipBuffers on a background thread.
+
+    `request()` only enqueues, so the frame loop never waits; the writer collects each
+    clip's frames as they are buffered and writes it once its post-roll is over. An event
+    inside the post-roll of the previous clip of the same camera reuses that clip and
+    extends its post-roll to its own, up to CLIP_MAX_SECONDS per clip.
+    """
+    def __init__(self, pre=CLIP_PRE_SECONDS, post=CLIP_POST_SECONDS, max_seconds=CLIP_MAX_SECONDS):
+        self.pre = pre
+        self.post = post
+        self.max_seconds = max_seconds
+        self.buffers = {}
+        self.queue = queue.Queue()
+        self.pending = 0 # Clips requested and not yet written (capped at CLIP_QUEUE_SIZE)
+        self.written = 0
+        self.reused = 0
+        self.dropped = 0
+        self.failed = 0
+        self._last = {} # camera_id -> _ClipJob of the newest clip
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def buffer(self, camera_id):
+        buffer = self.buffers.get(camera_id)
+        if buffer is None:
+            buffer = self.buffers[camera_id] = ClipBuffer()
+        return buffer
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="clip-writer")
+                self._thread.start()
+
+    def request(self, camera_id, image_path, event_type, now=None):
+        """Schedules the clip for an event. Returns the clip filename to link, or None."""
+        buffer = self.buffers.get(camera_id)
+        if buffer is None or not buffer.frames:
+            return None
+        now = now or time.time()
+        with self._lock:
+            last = self._last.get(camera_id)
+            if last and now < last.end and now + self.post - last.start <= self.max_seconds:
+                last.end = max(last.end, now + self.post)
+                self.reused += 1
+                return last.clip
+            if self.pending >= CLIP_QUEUE_SIZE:
+                self.dropped += 1
+                return None
+            job = _ClipJob(buffer, image_path, clip_name(image_path), event_type, now - self.pre, now + self.post)
+            self.pending += 1
+            self._last[camera_id] = job
+        self.queue.put(job)
+        self.start()
+        return job.clip
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "reused": self.reused,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "buffers": {cid: b.stats() for cid, b in self.buffers.items()},
+        }
+
+    def _run(self):
+        jobs = []
+        while True:
+            # Wake at the next deadline, and at least every second to collect long clips' frames
+            timeout = min([job.end - time.time() for job in jobs] + [1.0]) if jobs else None
+            try:
+                jobs.append(self.queue.get(timeout=max(0, timeout) if timeout is not None else None))
+            except queue.Empty:
+                pass
+            now = time.time()
+            for job in list(jobs):
+                job.collect(now)
+                if now >= job.end:
+                    jobs.remove(job)
+                    self._write(job)
+
+    def _write(self, job):
+        try:
+            frames = job.frames
+            if not frames:
+                raise RuntimeError("no buffered frames")
+            span = frames[-1][0] - frames[0][0]
+            fps = (len(frames) - 1) / span if span > 0 else CLIP_FPS
+            nbytes = write_mjpeg_avi(os.path.join(SAVE_DIR, job.clip), [jpeg for _, jpeg in frames], fps)
+            # The clip counts towards the event's disk usage (retention budget)
+            add_event_bytes(job.image_path, nbytes)
+            disk_ledger.add(job.event_type, nbytes, count=0)
+            self.written += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"[CLIPS] CLIP FAILED {job.clip}: {e}")
+        finally:
+            job.frames = []
+            with self._lock:
+                self.pending -= 1
+
+# Process-wide recorder; buffers are attached to cameras on nodes that archive events
+clip_recorder = ClipRecorder() if CLIP_RECORDING else None
@@ -1,29 +1,159 @@
 import os
+import platform
 
 # ESP32-CAM Configuration (Production Verified)
 ESP_STREAM_URL = "http://172.20.10.3:81/stream"
 
+# Camera Registry (camera_id -> stream URL). One fetcher per camera, one batched inference call per tick.
+CAMERAS = {
+    "cam0": ESP_STREAM_URL,
+}
+DEFAULT_CAMERA_ID = next(iter(CAMERAS))
+
+# Camera Fetcher ("mjpeg" = native multipart reader keeping the camera's JPEG bytes, "opencv" = cv2.VideoCapture).
+# Non-HTTP sources (files, RTSP, device indexes) always use OpenCV.
+CAMERA_READER = "mjpeg"
+MJPEG_TIMEOUT_SECONDS = 5            # Connect/read timeout; a stalled camera triggers a reconnect
+MJPEG_BACKOFF_MIN_SECONDS = 0.5      # Reconnect backoff (doubles per failure, resets on the first frame)
+MJPEG_BACKOFF_MAX_SECONDS = 10
+MJPEG_MAX_FRAME_BYTES = 4 * 1024 ** 2 # Larger parts are treated as a corrupt stream
+DECODE_REDUCED = True                # Decode at 1/2, 1/4 or 1/8 scale when that still covers INFERENCE_IMGSZ
+
+# Distributed Mode. HAWKEYE_ROLE: "standalone" = cameras, models and API in one process;
+# "api" = dashboard + coordinator only, cameras are assigned to inference nodes (`python -m app.node`).
+HAWKEYE_ROLE = os.environ.get("HAWKEYE_ROLE", "standalone")
+DIST_TRANSPORT = "tcp"
+DIST_LISTEN = os.environ.get("HAWKEYE_LISTEN", "127.0.0.1:7070")         # Coordinator bind address (api role)
+DIST_SECRET = os.environ.get("HAWKEYE_SECRET", "")                        # Shared secret nodes must prove; required off loopback
+DIST_HANDSHAKE_TIMEOUT_SECONDS = 5
+DIST_COORDINATOR = os.environ.get("HAWKEYE_COORDINATOR", "127.0.0.1:7070") # Where inference nodes connect
+DIST_NODE_ID = os.environ.get("HAWKEYE_NODE_ID", platform.node())
+DIST_HEARTBEAT_SECONDS = 2
+DIST_NODE_TIMEOUT_SECONDS = 10 # Silent nodes are dropped and their cameras reassigned
+DIST_VIDEO_FPS = 10            # Live video relayed from nodes to the API node (0 = off)
+DIST_OUTBOX_SIZE = 256         # Queued messages per node before HUD/video updates are dropped
+DIST_EVENT_BUFFER_SIZE = 256   # Events (with their JPEG) a node holds while the coordinator is unreachable
+
 # Model Paths
 MODEL_PATH_PRIMARY = os.path.abspath("./models/threat_yolov8n/weights/best.pt")
 MODEL_PATH_BACKUP = os.path.abspath("./models/firearm_yolov8n/weights/best.pt")
 MODEL_PATH_FALLBACK = "yolov8m.pt"
 
+# Model Registry (new weights are loaded, warmed up and swapped in at runtime through /models)
+MODEL_REGISTRY_DIR = os.path.abspath("./models") # Weights loadable through the API; nothing outside it (checkpoints are pickles)
+MODEL_SHADOW_SAMPLE_EVERY = 10     # A shadowed candidate version also runs on every Nth batch (only batches that ran the general model)
+MODEL_SHADOW_QUEUE_SIZE = 2        # Sampled batches waiting for the shadow thread (oldest dropped when it falls behind)
+MODEL_LOAD_TIMEOUT_SECONDS = 300   # Inference worker processes must all have loaded a version within this
+
 # YOLO Configuration
 CONF_THRESH_PERSON = 0.20  # Lowered to 0.20 for tactical drone tracking
 CONF_THRESH_WEAPON = 0.40  # Restored to 0.40 for better dummy gun/knife tracking
 CONF_THRESH_WEAPON_ARCHIVE = 0.70 # Lowered to 0.70 to ensure incidents are captured
 WEAPON_MAX_BOX_AREA_PCT = 0.25 # Ignore boxes > 25% of frame (eliminates furniture false positives)
-STATIC_SUPPRESSION_FRAMES = 50 # Frames a weapon must move to be considered dynamic
+DEDUP_IOU_THRESH = 0.45   # Cross-model duplicate threshold (spec vs gen boxes)
+STATIC_SUPPRESSION_FRAMES = 50 # Keyframes a weapon track must stay put (and unhandled) to be considered static noise
+STATIC_MOTION_PX = 10      # Track center displacement that counts as movement
 INFERENCE_IMGSZ = 640      # Higher res for distant objects
-FRAME_SKIP = 2
+INFERENCE_PARALLEL_HEADS = True # Run specialist and general models concurrently
+MODEL_WARMUP = True        # One dummy pass per model and input size before the detector reports ready
+
+# Latency Governor (steps down the operating-point ladder when detection misses its SLO, back up when there is headroom)
+GOVERNOR_ENABLED = True
+GOVERNOR_DETECT_SLO_MS = 250     # p90 wall time of one detect_batch call
+GOVERNOR_FRAME_AGE_SLO_MS = 500  # p90 time from frame arrival to its verdict
+GOVERNOR_WINDOW = 30             # Batches per evaluation (and samples required before any step)
+GOVERNOR_HEADROOM = 0.6          # Step back up only when both p90s are below this fraction of their SLO
+GOVERNOR_DWELL_SECONDS = 10      # Min time spent on an operating point before the next step
+GOVERNOR_LADDER = [              # Operating points, best quality first. gen_every=2 runs the general model on every other batch.
+    {"name": "full", "imgsz": INFERENCE_IMGSZ},
+    {"name": "imgsz-480", "imgsz": 480},
+    {"name": "imgsz-320", "imgsz": 320},
+    {"name": "gen-alternate", "imgsz": 320, "gen_every": 2},
+    {"name": "gen-small", "imgsz": 320, "gen_every": 2, "gen_model": "yolov8n.pt"},
+]
+
+# Inference Workers (0 = models run in the API process; N = N worker processes fed through a shared-memory frame ring)
+INFERENCE_WORKERS = 0
+INFERENCE_RING_SLOTS = 8                    # Max frames per batch that travel through shared memory
+INFERENCE_RING_SLOT_BYTES = 1920 * 1080 * 3 # Larger frames fall back to the task queue
+INFERENCE_WORKER_TIMEOUT_SECONDS = 30       # Per batch; unanswered frames come back empty
+
+# Inference Backend ("torch", "onnx", "openvino", or "stub" = deterministic fake models for benchmarks/CI). Exported models are cached under MODEL_CACHE_DIR.
+INFERENCE_BACKEND = "torch"
+INFERENCE_INT8 = False         # Post-training INT8 quantization, calibrated on data/events snapshots
+CALIBRATION_MAX_IMAGES = 64    # Snapshots used for INT8 calibration
+
+# Archive Retention (enforced by the background RetentionService, never on insert)
+RETENTION_MAX_COUNT = 20000              # Max archived events (0 = unlimited)
+RETENTION_MAX_AGE_DAYS = 30              # Drop incidents older than this (0 = keep forever)
+RETENTION_MAX_BYTES = 5 * 1024 ** 3      # Disk budget for snapshots (0 = unlimited)
+RETENTION_TYPE_QUOTAS = {                # Per-threat-type caps so noisy types cannot evict critical ones
+    "SUSPICIOUS_GROUP": 5000,
+}
+RETENTION_INTERVAL_SECONDS = 30
+RETENTION_BATCH_SIZE = 200
+RETENTION_RESYNC_SECONDS = 3600          # Rebuild the in-memory ledger from the DB
+
+# Write-Behind Persistence (snapshots + DB rows are written off the inference thread)
+PERSIST_QUEUE_SIZE = 64    # Pending events before new ones are dropped
+PERSIST_BATCH_SIZE = 16    # Max events committed per transaction
+PERSIST_JPEG_QUALITY = 90
 
-# Archive Retention
-MAX_EVENT_COUNT = 100      # Keep only latest 100 images
+# Snapshot Deduplication (near-identical snapshots of a sustained incident become one archive row)
+DEDUP_ENABLED = True
+DEDUP_HAMMING_MAX = 10                   # Max differing dHash bits (of 64) between consecutive snapshots of one incident
+DEDUP_WINDOW_SECONDS = 30                # An incident ends after this long without a matching snapshot
+DEDUP_MAX_FRAMES = 4                     # Frames kept on disk per incident (first snapshot + representatives)
+DEDUP_KEEP_EVERY = 10                    # Every Nth coalesced snapshot is kept as a representative
+
+# Event Clips (pre/post-event MJPEG AVI per archived event, cut from an in-memory JPEG ring per camera)
+CLIP_RECORDING = True
+CLIP_PRE_SECONDS = 5                     # Footage kept before the event
+CLIP_POST_SECONDS = 5                    # Footage recorded after the event
+CLIP_FPS = 5                             # Frames kept per second (ring memory scales with this, not the camera rate)
+CLIP_BUFFER_MAX_BYTES = 8 * 1024 ** 2    # Hard cap on each camera's ring
+CLIP_JPEG_QUALITY = 80                   # Only used when frames arrive decoded (OpenCV reader)
+CLIP_QUEUE_SIZE = 16                     # Clips waiting for their post-roll before new ones are skipped
+CLIP_MAX_SECONDS = 60                    # Longest clip that later events may extend; past it they start a new one
 
 # Weapon Gating
 WEAPON_MAX_AREA_PCT = 0.40  # Ignore if >40% of frame
 WEAPON_PERSISTENCE_CYCLES = 5  # Tracking history window (voting logic applied in inference.py)
 
+# Live Video (/video MJPEG fan-out: passthrough by default, one encode per frame per quality level otherwise)
+VIDEO_MAX_FPS = 15                  # Per-viewer ceiling
+VIDEO_QUALITY_LEVELS = (50, 70, 90) # Requested qualities snap to these so encodes are shared
+VIDEO_DEFAULT_QUALITY = None       # None = relay the camera's own JPEGs untouched (no decode/encode)
+VIDEO_ENCODE_QUALITY = 80          # Used when a frame must be encoded without a requested quality (OpenCV reader)
+
+# Telemetry (GET /metrics, hot-path logging)
+LOG_RATE_LIMIT_SECONDS = 10     # Per-frame status lines (threat analysis, surveillance) print at most this often per camera/state
+
+# Live HUD (/ws/detections pub/sub: snapshot on join, deltas after, heartbeats while nothing changes)
+HUB_HEARTBEAT_SECONDS = 1.0     # Keep-alive interval for unchanged payloads
+HUB_SEND_TIMEOUT_SECONDS = 5.0  # A client that cannot take one message in this long is disconnected
+
+# Person-ROI Cascade (weapon model only sees crops around persons found by the general model)
+CASCADE_MODE = False
+CASCADE_CROP_IMGSZ = 320       # Inference size per crop (crops are small, so effective resolution goes up)
+CASCADE_CROP_MARGIN_PX = 80    # Crop expansion around each person (matches ASSOCIATION_MARGIN_PX)
+CASCADE_MAX_CROPS = 8          # More windows than this -> run the weapon model on the full frame instead
+CASCADE_SWEEP_SECONDS = 2.0    # Periodic full-frame weapon sweep (safety net for weapons away from persons)
+
+# Motion-Gated Scheduling (full detection rate per camera; the tracker predicts boxes in between)
+INFERENCE_RATE_ACTIVE_HZ = 5.0 # Ceiling while motion or a threat is present
+INFERENCE_RATE_IDLE_HZ = 0.5   # Floor for a quiet scene (still catches slow/static intrusions)
+MOTION_HOLD_SECONDS = 5        # Stay at the active rate this long after the last motion/threat
+MOTION_DOWNSCALE = (64, 48)    # Gate works on a tiny grayscale frame
+MOTION_PIXEL_THRESH = 25       # Per-pixel intensity change that counts as motion
+MOTION_AREA_PCT = 0.01         # Fraction of changed pixels that counts as scene motion
+MOTION_BG_ALPHA = 0.05         # Background running-average learning rate
+
+# Tracking (SORT-style IoU + Kalman, per camera)
+TRACK_IOU_THRESH = 0.3         # Min IoU between predicted track and detection to associate
+TRACK_MAX_MISSES = 3           # Keyframes a track may go unmatched before it is dropped
+TRACK_ASSOCIATION_MEMORY = 5   # Keyframes a weapon stays "handled" after a person was near it
+
 # Threat Logic Configuration
 GROUP_MIN_COUNT = 4
 GROUP_DISTANCE_PX = 120
@@ -35,7 +165,20 @@ EVENT_COOLDOWN_SECONDS = 3
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 SAVE_DIR = os.path.join(DATA_DIR, "events")
+VARIANT_DIR = os.path.join(SAVE_DIR, "variants") # Downscaled copies of the snapshots (kept out of the *.jpg glob)
 DB_PATH = os.path.join(DATA_DIR, "events.db")
+EVENTS_PAGE_MAX = 500              # Largest page served by GET /events
+RECONCILE_INTERVAL_SECONDS = 300   # Background check for rows whose image vanished
+MODEL_CACHE_DIR = os.path.join(DATA_DIR, "model_cache")
+
+# Event Image Service (GET /events/{id}/image?variant=...)
+IMAGE_VARIANTS = {"thumb": 320, "web": 1280} # Variant -> max width; originals narrower than that are served as-is
+IMAGE_VARIANT_JPEG_QUALITY = 80
+IMAGE_VARIANTS_ON_SAVE = True      # Render variants when the event is archived (otherwise on first request)
+IMAGE_CACHE_MAX_BYTES = 32 * 1024 ** 2   # In-memory LRU of hot image bytes
+IMAGE_CACHE_MAX_ITEM_BYTES = 2 * 1024 ** 2 # Larger files are read from disk on every request
+IMAGE_PATH_CACHE_SIZE = 4096       # Event id -> image path entries kept in memory
 
 # Ensure directories exist
 os.makedirs(SAVE_DIR, exist_ok=True)
+os.makedirs(VARIANT_DIR, exist_ok=True)
@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from datetime import datetime
+
+from .config import DIST_TRANSPORT, DIST_LISTEN, DIST_HEARTBEAT_SECONDS, DIST_NODE_TIMEOUT_SECONDS
+from .storage import event_filename
+from .transport import get_transport
+
+class NodeSession:
+    """An inference node connected to the coordinator."""
+    def __init__(self, node_id, conn):
+        self.id = node_id
+        self.conn = conn
+        self.cameras = set()
+        self.connected_at = time.time()
+        self.last_seen = time.time()
+        self.messages = 0
+
+    def send(self, header, payload=b""):
+        try:
+            self.conn.send(header, payload)
+            return True
+        except OSError:
+            return False
+
+class Coordinator:
+    """API-node side of distributed mode.
+
+    Assigns the registry's cameras across connected inference nodes (keeping existing
+    assignments where the load allows, reassigning a dead node's cameras to the
+    survivors), and feeds their detections, live frames and events into the local
+    hub, broadcasters and event writer.
+    """
+    def __init__(self, registry, publish, event_sink, transport=DIST_TRANSPORT, address=DIST_LISTEN):
+        self.registry = registry
+        self.publish = publish
+        self.event_sink = event_sink
+        self.transport = get_transport(transport)
+        self.address = address
+        self.nodes = {}
+        self.assignment = {} # camera_id -> node_id
+        self.rebalances = 0
+        self._lock = threading.RLock()
+        self._server = None
+
+    def start(self):
+        if self._server is None:
+            self._server = self.transport.listen(self.address, self._serve)
+            threading.Thread(target=self._watchdog, daemon=True, name="coordinator-watchdog").start()
+            for cam in self.registry:
+                cam.detections["status"] = "UNASSIGNED"
+            print(f"[COORDINATOR] LISTENING ON {self.address} ({len(self.registry)} cameras)")
+
+    def _serve(self, conn):
+        message = conn.recv()
+        if message is None or message[0].get("type") != "hello":
+            conn.close()
+            return
+        session = NodeSession(message[0]["node_id"], conn)
+        with self._lock:
+            previous = self.nodes.get(session.id)
+            if previous is not None:
+                previous.conn.close() # Reconnect from the same node replaces the old session
+            self.nodes[session.id] = session
+            print(f"[COORDINATOR] NODE JOINED: {session.id} ({conn.peer})")
+            self._rebalance()
+
+        try:
+            while True:
+                message = conn.recv()
+                if message is None:
+                    break
+                session.last_seen = time.time()
+                session.messages += 1
+                self._handle(session, *message)
+        except Exception as e:
+            print(f"[COORDINATOR] NODE {session.id} ERROR: {e}")
+        finally:
+            conn.close()
+            self._drop(session)
+
+    def _handle(self, session, header, payload):
+        kind = header.get("type")
+        if kind == "heartbeat":
+            session.send({"type": "heartbeat"})
+            return
+
+        cam = self.registry.get(header.get("camera_id"))
+        if cam is None:
+            return
+        # Late live updates for a camera that already moved to another node are ignored;
+        # events are still archived (a node holds them while it is disconnected)
+        if kind != "event" and self.assignment.get(cam.id) != session.id:
+            return
+
+        if kind == "detections":
+            cam.detections.clear()
+            cam.detections.update(header["payload"])
+            cam.detections["node_id"] = session.id
+            cam.is_connected = header["payload"].get("status") not in ("OFFLINE", "INITIALIZING")
+            self.publish(cam.id, cam.detections)
+        elif kind == "frame":
+            cam.publish(jpeg=payload)
+        elif kind == "event":
+            record = header["record"]
+            try:
+                # The snapshot name is built here: nothing a node sends ever becomes a path
+                when = datetime.fromisoformat(record["timestamp"])
+                filename = event_filename(record["type"], cam.id, when)
+                confidence = float(record["confidence"])
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[COORDINATOR] NODE {session.id}: REJECTED EVENT ({e})")
+                return
+            self.event_sink.submit(
+                payload, record["type"], record["labels"], confidence, filename,
+                record["bboxes"], cam.id, when.isoformat()
+            )
+
+    def _drop(self, session):
+        with self._lock:
+            if self.nodes.get(session.id) is not session:
+                return
+            del self.nodes[session.id]
+            print(f"[COORDINATOR] NODE LOST: {session.id} (cameras: {sorted(session.cameras) or 'none'})")
+            for cid in session.cameras:
+                cam = self.registry.get(cid)
+                if cam is not None:
+                    cam.is_connected = False
+                    cam.clear()
+                    cam.detections["status"] = "UNASSIGNED"
+                    self.publish(cid, cam.detections)
+            self._rebalance()
+
+    def _rebalance(self):
+        """Recomputes camera -> node with minimal moves. Caller holds the lock."""
+        cameras = [cam.id for cam in self.registry]
+        nodes = list(self.nodes.values())
+        new = {}
+        if nodes:
+            target = math.ceil(len(cameras) / len(nodes))
+            load = {node.id: 0 for node in nodes}
+            for cid in cameras:
+                nid = self.assignment.get(cid)
+                if nid in load and load[nid] < target:
+                    new[cid] = nid
+                    load[nid] += 1
+            for cid in cameras:
+                if cid not in new:
+                    nid = min(load, key=load.get)
+                    new[cid] = nid
+                    load[nid] += 1
+
+        self.assignment = new
+        self.rebalances += 1
+        for node in nodes:
+            cameras_for = {cid for cid, nid in new.items() if nid == node.id}
+            if cameras_for != node.cameras:
+                node.cameras = cameras_for
+                node.send({"type": "assign", "cameras": {cid: self.registry.get(cid).url for cid in sorted(cameras_for)}})
+                print(f"[COORDINATOR] ASSIGN {node.id} <- {sorted(cameras_for) or 'none'}")
+
+    def _watchdog(self):
+        while True:
+            time.sleep(DIST_HEARTBEAT_SECONDS)
+            cutoff = time.time() - DIST_NODE_TIMEOUT_SECONDS
+            for session in list(self.nodes.values()):
+                if session.last_seen < cutoff:
+                    print(f"[COORDINATOR] NODE TIMEOUT: {session.id}")
+                    session.conn.close() # Unblocks its reader, which drops and rebalances
+
+    def stats(self):
+        return {
+            "nodes": {
+                node.id: {"cameras": sorted(node.cameras), "last_seen": round(time.time() - node.last_seen, 1), "messages": node.messages}
+                for node in list(self.nodes.values())
+            },
+            "unassigned": [cam.id for cam in self.registry if cam.id not in self.assignment],
+            "rebalances": self.rebalances,
+        }
@@ -1,111 +1,255 @@
 import sqlite3
 import json
-from datetime import datetime
+import threading
 import os
-from .config import DB_PATH, MAX_EVENT_COUNT, SAVE_DIR
+from .config import DB_PATH, SAVE_DIR
+
+# Long-lived connection shared by the API, persistence and maintenance threads
+_conn = None
+_lock = threading.RLock()
+
+def get_connection():
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _conn.row_factory = sqlite3.Row
+            # WAL: readers (dashboard polling) never block the event writer
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+        return _conn
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            type TEXT NOT NULL,
-            labels TEXT,
-            confidence REAL,
-            image_path TEXT,
-            bboxes TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def log_event(event_type, labels, confidence, image_path, bboxes):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO events (timestamp, type, labels, confidence, image_path, bboxes)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        datetime.now().isoformat(),
-        event_type,
-        json.dumps(labels),
-        confidence,
-        image_path,
-        json.dumps(bboxes)
-    ))
-    conn.commit()
-    event_id = cursor.lastrowid
-    
-    # Retention Policy: Keep only latest MAX_EVENT_COUNT
-    cursor.execute("SELECT COUNT(*) FROM events")
-    count = cursor.fetchone()[0]
-    
-    if count > MAX_EVENT_COUNT:
-        # Find oldest events to delete
-        cursor.execute("SELECT id, image_path FROM events ORDER BY timestamp ASC LIMIT ?", (count - MAX_EVENT_COUNT,))
-        to_delete = cursor.fetchall()
-        
-        for row in to_delete:
-            del_id, del_path = row
-            # Delete image file
-            if del_path:
-                full_path = os.path.join(SAVE_DIR, del_path)
-                if os.path.exists(full_path):
-                    try:
-                        os.remove(full_path)
-                    except Exception as e:
-                        print(f"Error deleting old event image {full_path}: {e}")
-            
-            # Delete DB row
-            cursor.execute("DELETE FROM events WHERE id = ?", (del_id,))
-        
+    with _lock:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                type TEXT NOT NULL,
+                labels TEXT,
+                confidence REAL,
+                image_path TEXT,
+                bboxes TEXT,
+                camera_id TEXT,
+                disk_bytes INTEGER,
+                clip_path TEXT,
+                frame_count INTEGER DEFAULT 1,
+                first_timestamp TEXT,
+                last_timestamp TEXT,
+                phash TEXT,
+                kept_frames INTEGER DEFAULT 1
+            )
+        """)
+        # Migrate archives created by older releases
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(events)")]
+        if "camera_id" not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN camera_id TEXT")
+        if "disk_bytes" not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN disk_bytes INTEGER")
+        if "clip_path" not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN clip_path TEXT")
+        for column, decl in (("frame_count", "INTEGER DEFAULT 1"), ("first_timestamp", "TEXT"), ("last_timestamp", "TEXT"),
+                             ("phash", "TEXT"), ("kept_frames", "INTEGER DEFAULT 1")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE events ADD COLUMN {column} {decl}")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_type ON events(type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_confidence ON events(confidence)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_image_path ON events(image_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_clip_path ON events(clip_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_camera ON events(camera_id)")
+        conn.commit()
+
+def log_events(records):
+    """Inserts a batch of event records in a single transaction and returns their ids.
+
+    Retention is enforced separately by the background RetentionService, so inserts stay O(1).
+    """
+    with _lock:
+        conn = get_connection()
+        cursor = conn.cursor()
+        event_ids = []
+        for rec in records:
+            cursor.execute("""
+                INSERT INTO events (timestamp, type, labels, confidence, image_path, bboxes, camera_id, disk_bytes, clip_path,
+                                    frame_count, first_timestamp, last_timestamp, phash, kept_frames)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                rec["timestamp"],
+                rec["type"],
+                json.dumps(rec["labels"]),
+                rec["confidence"],
+                rec["image_path"],
+                json.dumps(rec["bboxes"]),
+                rec.get("camera_id"),
+                rec.get("disk_bytes"),
+                rec.get("clip_path"),
+                rec.get("frame_count", 1),
+                rec.get("first_timestamp", rec["timestamp"]),
+                rec.get("last_timestamp", rec["timestamp"]),
+                rec.get("phash"),
+                rec.get("kept_frames", 1)
+            ))
+            event_ids.append(cursor.lastrowid)
+        conn.commit()
+        return event_ids
+
+def coalesce_events(updates):
+    """Folds coalesced snapshots into their incident rows.
+
+    `updates`: (frames, last_timestamp, confidence, kept_frames, disk_bytes, event_id) tuples;
+    frames and disk_bytes are increments, confidence keeps the maximum.
+    Returns the ids of rows that no longer exist (deleted by retention meanwhile).
+    """
+    missing = []
+    with _lock:
+        conn = get_connection()
+        for update in updates:
+            cursor = conn.execute("""
+                UPDATE events SET
+                    frame_count = COALESCE(frame_count, 1) + ?,
+                    last_timestamp = ?,
+                    confidence = MAX(COALESCE(confidence, 0), ?),
+                    kept_frames = ?,
+                    disk_bytes = COALESCE(disk_bytes, 0) + ?
+                WHERE id = ?
+            """, update)
+            if cursor.rowcount == 0:
+                missing.append(update[-1])
+        conn.commit()
+    return missing
+
+def add_event_bytes(image_path, nbytes):
+    """Adds a late-written artifact (event clip) to an event's disk usage."""
+    with _lock:
+        conn = get_connection()
+        conn.execute("UPDATE events SET disk_bytes = COALESCE(disk_bytes, 0) + ? WHERE image_path = ?", (nbytes, image_path))
+        conn.commit()
+
+def move_event_bytes(event_id, nbytes):
+    """Charges an artifact to another event (a shared clip whose carrying row was deleted)."""
+    with _lock:
+        conn = get_connection()
+        conn.execute("UPDATE events SET disk_bytes = COALESCE(disk_bytes, 0) + ? WHERE id = ?", (nbytes, event_id))
         conn.commit()
-        
-    conn.close()
-    return event_id
-
-def get_events(limit=200):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events ORDER BY timestamp DESC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    
-    events = []
-    ids_to_purge = []
-    
-    for row in rows:
-        event = dict(row)
-        if event['image_path']:
-            image_full_path = os.path.join(SAVE_DIR, event['image_path'])
-            if os.path.exists(image_full_path):
-                events.append(event)
-            else:
-                ids_to_purge.append(event['id'])
-        else:
-            events.append(event)
-            
-    if ids_to_purge:
-        try:
-            cursor.executemany("DELETE FROM events WHERE id = ?", [(id_val,) for id_val in ids_to_purge])
+
+def clip_owners(clip_paths):
+    """{clip_path: (id, type)} of the oldest remaining event linking each clip; unreferenced clips are absent."""
+    if not clip_paths:
+        return {}
+    with _lock:
+        rows = get_connection().execute(
+            f"SELECT clip_path, MIN(id), type FROM events WHERE clip_path IN ({', '.join('?' for _ in clip_paths)}) GROUP BY clip_path",
+            list(clip_paths)
+        ).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def oldest_events(limit, event_type=None, older_than=None):
+    """Oldest rows first (by id), optionally restricted to one type or to timestamps before `older_than`."""
+    clauses, params = [], []
+    if event_type is not None:
+        clauses.append("type = ?")
+        params.append(event_type)
+    if older_than is not None:
+        clauses.append("timestamp < ?")
+        params.append(older_than)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _lock:
+        rows = get_connection().execute(
+            f"SELECT id, type, image_path, disk_bytes, clip_path FROM events {where} ORDER BY id ASC LIMIT ?", (*params, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def delete_events(event_ids):
+    with _lock:
+        conn = get_connection()
+        conn.executemany("DELETE FROM events WHERE id = ?", [(event_id,) for event_id in event_ids])
+        conn.commit()
+
+def event_totals():
+    """{type: (count, disk_bytes)} aggregated in one indexed pass."""
+    with _lock:
+        rows = get_connection().execute(
+            "SELECT type, COUNT(*), COALESCE(SUM(disk_bytes), 0) FROM events GROUP BY type"
+        ).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def backfill_disk_bytes(size_of, batch_size=500):
+    """Fills disk_bytes for rows written before the column existed."""
+    while True:
+        with _lock:
+            rows = get_connection().execute(
+                "SELECT id, image_path FROM events WHERE disk_bytes IS NULL LIMIT ?", (batch_size,)
+            ).fetchall()
+        if not rows:
+            return
+        updates = [(size_of(row[1]), row[0]) for row in rows]
+        with _lock:
+            conn = get_connection()
+            conn.executemany("UPDATE events SET disk_bytes = ? WHERE id = ?", updates)
             conn.commit()
-            print(f"Archive Purge: Removed {len(ids_to_purge)} entries with missing source images.")
-        except Exception as e:
-            print(f"Archive Purge Error: {e}")
-            
-    conn.close()
-    return events
+
+def get_events(limit=200, before_id=None, event_types=None, since=None, until=None, min_confidence=None, camera_ids=None):
+    """Newest-first page of events using keyset pagination on id.
+
+    Pass the last id of a page as `before_id` to fetch the next one. Time bounds
+    are ISO-8601 strings compared against the stored timestamps.
+    """
+    clauses, params = [], []
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    if event_types:
+        clauses.append(f"type IN ({', '.join('?' for _ in event_types)})")
+        params.extend(event_types)
+    if camera_ids:
+        clauses.append(f"camera_id IN ({', '.join('?' for _ in camera_ids)})")
+        params.extend(camera_ids)
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(min_confidence)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _lock:
+        rows = get_connection().execute(
+            f"SELECT * FROM events {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
 
 def get_event_by_id(event_id):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with _lock:
+        row = get_connection().execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()
     return dict(row) if row else None
 
-# Initialize on import
-init_db()
+def reconcile_missing_images(purge, batch_size=500):
+    """Hands rows whose snapshot file no longer exists to `purge(rows)` (rows as from oldest_events).
+
+    Runs as a background task, never on reads. Returns how many rows were purged.
+    """
+    purged = 0
+    last_id = -1
+    while True:
+        with _lock:
+            rows = get_connection().execute(
+                "SELECT id, type, image_path, disk_bytes, clip_path FROM events WHERE id > ? ORDER BY id ASC LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        # Filesystem checks happen outside the DB lock
+        missing = [dict(row) for row in rows if row["image_path"] and not os.path.exists(os.path.join(SAVE_DIR, row["image_path"]))]
+        if missing:
+            purged += purge(missing)
+
+    if purged:
+        print(f"Archive Purge: Removed {purged} entries with missing source images.")
+    return purged
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+
+from .config import DEDUP_HAMMING_MAX, DEDUP_WINDOW_SECONDS, DEDUP_MAX_FRAMES, DEDUP_KEEP_EVERY
+
+def dhash(image):
+    """64-bit difference hash of a snapshot (JPEG bytes or BGR frame).
+
+    JPEGs are decoded straight to 1/8-scale grayscale, so hashing costs far less than
+    the snapshot write it may save.
+    """
+    if isinstance(image, bytes):
+        gray = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            raise ValueError("undecodable snapshot")
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class Incident:
+    """An open run of near-identical snapshots of one camera and threat type."""
+    __slots__ = ("record", "event_id", "image_path", "phash", "last_seen", "frame_count", "kept")
+
+    def __init__(self, record, phash, now):
+        self.record = record  # Archive row, until it is inserted
+        self.event_id = None
+        self.image_path = record["image_path"]
+        self.phash = phash
+        self.last_seen = now
+        self.frame_count = 1
+        self.kept = 1         # Frames on disk: the snapshot plus representatives
+
+class SnapshotDeduper:
+    """Coalesces near-duplicate event snapshots into one archive row per incident.
+
+    A snapshot whose dHash is within DEDUP_HAMMING_MAX bits of the previous one of the
+    same camera and threat type, less than DEDUP_WINDOW_SECONDS later, extends that
+    incident (frame count, last timestamp) instead of becoming a new event. Every
+    DEDUP_KEEP_EVERY-th coalesced frame is kept as a representative, up to
+    DEDUP_MAX_FRAMES per incident. Only used from the event writer thread.
+    """
+    def __init__(self, max_distance=DEDUP_HAMMING_MAX, window=DEDUP_WINDOW_SECONDS, max_frames=DEDUP_MAX_FRAMES, keep_every=DEDUP_KEEP_EVERY):
+        self.max_distance = max_distance
+        self.window = window
+        self.max_frames = max_frames
+        self.keep_every = keep_every
+        self.open = {} # (camera_id, type) -> Incident
+        self.coalesced = 0
+
+    def check(self, record, phash, now):
+        """Returns the open incident `record` continues, or None after opening a new one for it."""
+        key = (record.get("camera_id"), record["type"])
+        incident = self.open.get(key)
+        if incident is not None and now - incident.last_seen <= self.window and hamming(incident.phash, phash) <= self.max_distance:
+            incident.phash = phash # Follow slow scene drift within one incident
+            incident.last_seen = now
+            incident.frame_count += 1
+            self.coalesced += 1
+            return incident
+        self.open[key] = Incident(record, phash, now)
+        return None
+
+    def keep_frame(self, incident):
+        """Representative index (1, 2, ...) when this coalesced frame is kept on disk, else None."""
+        if incident.kept >= self.max_frames or (incident.frame_count - 1) % self.keep_every:
+            return None
+        incident.kept += 1
+        return incident.kept - 1
+
+    def inserted(self, record, event_id):
+        incident = self.open.get((record.get("camera_id"), record["type"]))
+        if incident is not None and incident.record is record:
+            incident.event_id = event_id
+            incident.record = None
+
+    def reopen(self, record, phash, now):
+        """Opens a new incident for a snapshot that was coalesced into a row deleted meanwhile."""
+        self.open[(record.get("camera_id"), record["type"])] = Incident(record, phash, now)
+        self.coalesced -= 1
+
+    def forget(self, event_ids):
+        """Closes the incidents of deleted rows (retention), so their next snapshot opens a new one."""
+        for key, incident in list(self.open.items()):
+            if incident.event_id in event_ids:
+                del self.open[key]
+
+    def discard(self, record):
+        """Forgets the incident of a row that could not be archived."""
+        key = (record.get("camera_id"), record["type"])
+        incident = self.open.get(key)
+        if incident is not None and incident.record is record:
+            del self.open[key]
+
+    def stats(self):
+        return {"open_incidents": len(self.open), "coalesced": self.coalesced}
@@ -0,0 +1,72 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Per-slot metadata, stored in front of the frame data
+SLOT_HEADER = np.dtype([
+    ("seq", "<i8"),        # Sequence number of the frame in the slot (-1 while being written)
+    ("height", "<i4"),
+    ("width", "<i4"),
+    ("channels", "<i4"),
+    ("timestamp", "<f8"),  # time.time() when the frame was written
+])
+_ALIGN = 64
+
+class FrameRing:
+    """Fixed-size frame slots in multiprocessing.shared_memory.
+
+    The owner writes uint8 frames into slots and hands (slot, seq) to readers, which
+    map the slot as an ndarray without copying. A reader re-checks the slot's sequence
+    number after use to detect that the frame was overwritten underneath it.
+    """
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.data_offset = -(-slots * SLOT_HEADER.itemsize // _ALIGN) * _ALIGN
+        self.stride = -(-slot_bytes // _ALIGN) * _ALIGN
+        size = self.data_offset + slots * self.stride
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.headers = np.ndarray((slots,), dtype=SLOT_HEADER, buffer=self.shm.buf)
+        if self.owner:
+            self.headers["seq"] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def fits(self, frame):
+        return frame.dtype == np.uint8 and frame.nbytes <= self.slot_bytes
+
+    def write(self, slot, frame, seq):
+        """Copies `frame` into `slot` and publishes it under `seq`."""
+        header = self.headers[slot:slot + 1]
+        header["seq"] = -1
+        self._array(slot, frame.shape)[...] = frame
+        header["height"] = frame.shape[0]
+        header["width"] = frame.shape[1]
+        header["channels"] = frame.shape[2] if frame.ndim == 3 else 1
+        header["timestamp"] = time.time()
+        header["seq"] = seq
+
+    def seq(self, slot):
+        return int(self.headers["seq"][slot])
+
+    def view(self, slot, seq):
+        """Zero-copy ndarray of the frame in `slot`, or None if it no longer holds `seq`."""
+        header = self.headers[slot]
+        if int(header["seq"]) != seq:
+            return None
+        shape = (int(header["height"]), int(header["width"]), int(header["channels"]))
+        return self._array(slot, shape if shape[2] > 1 else shape[:2])
+
+    def _array(self, slot, shape):
+        offset = self.data_offset + slot * self.stride
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def close(self):
+        self.headers = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,100 @@
+import collections
+import time
+
+import numpy as np
+
+from .config import (
+    GOVERNOR_DETECT_SLO_MS, GOVERNOR_FRAME_AGE_SLO_MS, GOVERNOR_WINDOW, GOVERNOR_HEADROOM,
+    GOVERNOR_DWELL_SECONDS, GOVERNOR_LADDER
+)
+
+class LatencyGovernor:
+    """Picks the detector's operating point from measured latency.
+
+    The pipeline reports every batch (detect wall time and the age of its oldest frame).
+    Once a full window is collected, a p90 above either SLO steps one rung down the
+    ladder (smaller input, general model on alternate batches, smaller general model);
+    both p90s under GOVERNOR_HEADROOM x SLO step one rung back up. Each step clears the
+    window and starts a dwell period, so the governor never oscillates on noise, and
+    it never degrades while a threat is active on any camera.
+    """
+    def __init__(self, ladder=GOVERNOR_LADDER, detect_slo_ms=GOVERNOR_DETECT_SLO_MS, frame_age_slo_ms=GOVERNOR_FRAME_AGE_SLO_MS,
+                 window=GOVERNOR_WINDOW, headroom=GOVERNOR_HEADROOM, dwell=GOVERNOR_DWELL_SECONDS):
+        self.ladder = ladder
+        self.detect_slo = detect_slo_ms / 1000
+        self.frame_age_slo = frame_age_slo_ms / 1000
+        self.window = window
+        self.headroom = headroom
+        self.dwell = dwell
+        self.level = 0
+        self.since = time.time()
+        self.steps = 0
+        self.held = 0 # Degrade steps withheld because a threat was active
+        self.batches = 0
+        self.detect = collections.deque(maxlen=window)
+        self.frame_age = collections.deque(maxlen=window)
+        self.last_p90 = (None, None)
+
+    @property
+    def point(self):
+        return self.ladder[self.level]
+
+    def run_general(self):
+        """Whether this batch runs the general model (gen_every=N: one batch in N)."""
+        self.batches += 1
+        return self.batches % self.point.get("gen_every", 1) == 0
+
+    def observe(self, detect_seconds, frame_age_seconds, threat_active=False, now=None):
+        """Feeds one batch; returns True when the operating point changed."""
+        now = now or time.time()
+        self.detect.append(detect_seconds)
+        self.frame_age.append(frame_age_seconds)
+        if len(self.detect) < self.window or now - self.since < self.dwell:
+            return False
+
+        detect_p90 = float(np.percentile(self.detect, 90))
+        age_p90 = float(np.percentile(self.frame_age, 90))
+        self.last_p90 = (detect_p90, age_p90)
+        if detect_p90 > self.detect_slo or age_p90 > self.frame_age_slo:
+            if self.level == len(self.ladder) - 1:
+                return False
+            if threat_active:
+                self.held += 1
+                return False
+            return self._step(+1, now, detect_p90, age_p90)
+        if self.level > 0 and detect_p90 < self.detect_slo * self.headroom and age_p90 < self.frame_age_slo * self.headroom:
+            return self._step(-1, now, detect_p90, age_p90)
+        return False
+
+    def _step(self, direction, now, detect_p90, age_p90):
+        self.level += direction
+        self.since = now
+        self.steps += 1
+        self.detect.clear()
+        self.frame_age.clear()
+        print(f"[GOVERNOR] {'DEGRADING' if direction > 0 else 'RESTORING'} -> {self.point['name']} "
+              f"(detect p90 {detect_p90 * 1000:.0f}ms / SLO {self.detect_slo * 1000:.0f}ms, "
+              f"frame age p90 {age_p90 * 1000:.0f}ms / SLO {self.frame_age_slo * 1000:.0f}ms)")
+        return True
+
+    def report(self):
+        """Current operating point for the HUD payload's debug block (changes only on a step)."""
+        point = self.point
+        return {
+            "level": self.level,
+            "name": point["name"],
+            "imgsz": point["imgsz"],
+            "gen_every": point.get("gen_every", 1),
+            "gen_model": point.get("gen_model"),
+            "since": round(self.since, 1),
+        }
+
+    def stats(self):
+        detect_p90, age_p90 = self.last_p90
+        return {
+            **self.report(),
+            "steps": self.steps,
+            "held_for_threat": self.held,
+            "detect_p90_ms": round(detect_p90 * 1000, 1) if detect_p90 is not None else None,
+            "frame_age_p90_ms": round(age_p90 * 1000, 1) if age_p90 is not None else None,
+        }
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import threading
+
+from fastapi import WebSocketDisconnect
+
+from .config import HUB_HEARTBEAT_SECONDS, HUB_SEND_TIMEOUT_SECONDS
+
+try:
+    import msgpack
+except ImportError: # Optional: binary encoding for /ws/detections?encoding=msgpack
+    msgpack = None
+
+# Column order of the compact box rows used by the msgpack encoding
+BOX_FIELDS = ("cls", "label", "conf", "x1", "y1", "x2", "y2", "source", "track_id")
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def field(self, key, value):
+        return json.dumps(key) + ":" + json.dumps(value, separators=(",", ":"))
+
+    def message(self, header, fields):
+        head = json.dumps(header, separators=(",", ":"))[1:-1]
+        return '{%s,"data":{%s}}' % (head, ",".join(fields))
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        self.packer = msgpack.Packer()
+
+    def field(self, key, value):
+        if key == "boxes":
+            value = [[box.get(f) for f in BOX_FIELDS] for box in value]
+        return self.packer.pack(key) + self.packer.pack(value)
+
+    def message(self, header, fields):
+        header = dict(header, box_fields=BOX_FIELDS)
+        out = [self.packer.pack_map_header(len(header) + 1)]
+        out.extend(self.packer.pack(k) + self.packer.pack(v) for k, v in header.items())
+        out.append(self.packer.pack("data") + self.packer.pack_map_header(len(fields)))
+        out.extend(fields)
+        return b"".join(out)
+
+JSON_CODEC = JsonCodec()
+CODECS = {"json": JSON_CODEC}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+class Channel:
+    """Last published HUD state of one camera, pre-encoded for every codec in use."""
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.fields = {} # key -> JSON field text, the diff baseline
+        self.current = (0, {}) # (version, {codec: {"snapshot"|"delta"|"heartbeat": message}}), swapped atomically
+
+class Subscriber:
+    def __init__(self, websocket, camera_id, codec):
+        self.websocket = websocket
+        self.camera_id = camera_id
+        self.codec = codec
+        self.version = 0 # Last version delivered to this client
+        self.wake = asyncio.Queue(maxsize=1) # Latest-wins: a pending wake-up already covers any newer update
+
+class DetectionHub:
+    """Pub/sub for HUD payloads on the server's event loop.
+
+    The processing thread publishes each camera's payload; only changed top-level
+    fields are re-serialized and every message is encoded once per codec, not once
+    per client. Each subscriber is sent a delta when it is exactly one version behind,
+    a full snapshot when it fell behind further, and a heartbeat when nothing changed.
+    """
+    def __init__(self):
+        self.channels = {}
+        self.subscribers = set()
+        self.sent = 0
+        self.dropped = 0 # Clients disconnected for not draining their queue
+        self._loop = None
+        self._lock = threading.Lock()
+        self._codec_users = {}
+
+    def bind(self, loop):
+        """Attaches the hub to the server's event loop (called on startup)."""
+        self._loop = loop
+
+    def _channel(self, camera_id):
+        channel = self.channels.get(camera_id)
+        if channel is None:
+            channel = self.channels.setdefault(camera_id, Channel(camera_id))
+        return channel
+
+    def publish(self, camera_id, payload):
+        """Processing-thread hook. Returns True when the payload changed since the last publish."""
+        channel = self._channel(camera_id)
+        with self._lock:
+            fields = {k: JSON_CODEC.field(k, v) for k, v in payload.items()}
+            changed = [k for k, text in fields.items() if channel.fields.get(k) != text]
+            version = channel.current[0]
+            if not changed and version:
+                return False
+
+            version += 1
+            channel.fields = fields
+            codecs = [JSON_CODEC] + [CODECS[name] for name, users in self._codec_users.items() if users and name != "json"]
+            messages = {codec.name: self._encode(codec, camera_id, version, fields, changed, payload) for codec in codecs}
+            channel.current = (version, messages)
+
+        if self._loop is not None and self.subscribers:
+            self._loop.call_soon_threadsafe(self._notify, camera_id)
+        return True
+
+    def _encode(self, codec, camera_id, version, fields, changed, payload):
+        if codec is not JSON_CODEC:
+            fields = {k: codec.field(k, v) for k, v in payload.items()}
+        header = {"camera_id": camera_id, "version": version}
+        return {
+            "snapshot": codec.message({"type": "snapshot", **header}, list(fields.values())),
+            "delta": codec.message({"type": "delta", **header}, [fields[k] for k in changed]),
+            "heartbeat": codec.message({"type": "heartbeat", **header}, []),
+        }
+
+    def _ensure_codec(self, channel, codec):
+        """Late-joining client with a codec nobody used at the last publish: encode it now."""
+        with self._lock:
+            version, messages = channel.current
+            if not version or codec.name in messages:
+                return
+            payload = {k: json.loads(text.split(":", 1)[1]) for k, text in channel.fields.items()}
+            messages = dict(messages)
+            messages[codec.name] = self._encode(codec, channel.camera_id, version, channel.fields, [], payload)
+            channel.current = (version, messages)
+
+    def _notify(self, camera_id):
+        for sub in self.subscribers:
+            if sub.camera_id == camera_id and not sub.wake.full():
+                sub.wake.put_nowait(True)
+
+    async def serve(self, websocket, camera_id, encoding="json"):
+        """Runs one accepted WebSocket until it disconnects or stops draining."""
+        codec = CODECS.get(encoding, JSON_CODEC)
+        sub = Subscriber(websocket, camera_id, codec)
+        with self._lock:
+            self._codec_users[codec.name] = self._codec_users.get(codec.name, 0) + 1
+        self.subscribers.add(sub)
+        sender = asyncio.create_task(self._send_loop(sub))
+        receiver = asyncio.create_task(self._receive_loop(sub))
+        try:
+            done, _ = await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                try:
+                    await asyncio.wait_for(websocket.close(), HUB_SEND_TIMEOUT_SECONDS)
+                except Exception:
+                    pass
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            self.subscribers.discard(sub)
+            with self._lock:
+                self._codec_users[codec.name] -= 1
+
+    async def _receive_loop(self, sub):
+        try:
+            while True:
+                await sub.websocket.receive_text() # Keep alive
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    async def _send_loop(self, sub):
+        channel = self._channel(sub.camera_id)
+        send = sub.websocket.send_bytes if sub.codec.binary else sub.websocket.send_text
+        while True:
+            if channel.current[0] == sub.version:
+                try:
+                    await asyncio.wait_for(sub.wake.get(), HUB_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+            version, messages = channel.current
+            if not version:
+                continue
+            if sub.codec.name not in messages:
+                # Only a client that still needs a snapshot can lack its codec's messages
+                self._ensure_codec(channel, sub.codec)
+                version, messages = channel.current
+            if version == sub.version:
+                kind = "heartbeat"
+            elif sub.version and version == sub.version + 1:
+                kind = "delta"
+            else:
+                kind = "snapshot"
+
+            try:
+                await asyncio.wait_for(send(messages[sub.codec.name][kind]), HUB_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                print(f"[HUB] DROPPING STALLED CLIENT ({sub.camera_id})")
+                return
+            except Exception:
+                return # Connection gone
+            sub.version = version
+            self.sent += 1
+
+    def stats(self):
+        return {
+            "clients": len(self.subscribers),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "versions": {cid: ch.current[0] for cid, ch in self.channels.items()},
+        }
+
+# Process-wide hub shared by every camera
+hub = DetectionHub()
@@ -0,0 +1,174 @@
+import collections
+import hashlib
+import os
+import threading
+
+import cv2
+
+from .cameras import decode_jpeg
+from .config import (
+    SAVE_DIR, IMAGE_VARIANTS, IMAGE_VARIANT_JPEG_QUALITY, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_ITEM_BYTES,
+    IMAGE_PATH_CACHE_SIZE
+)
+from .db import add_event_bytes, get_event_by_id
+from .mjpeg import jpeg_size, reduce_factor
+from .storage import variant_path, write_atomic
+
+def render_variant(jpeg, width, quality=IMAGE_VARIANT_JPEG_QUALITY):
+    """Downscaled JPEG no wider than `width`, or None when the original already is.
+
+    libjpeg does most of the shrinking while decoding (IMREAD_REDUCED_*), so a thumbnail
+    of a full-HD snapshot never materializes the full-resolution image.
+    """
+    size = jpeg_size(jpeg)
+    if size and size[0] <= width:
+        return None
+    image = decode_jpeg(jpeg, reduce_factor(size, width) if size else 1)
+    if image is None:
+        raise ValueError("undecodable snapshot")
+    h, w = image.shape[:2]
+    if w > width:
+        image = cv2.resize(image, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+def write_variants(jpeg, image_path):
+    """Renders every configured variant of a freshly archived snapshot. Returns the bytes written."""
+    written = 0
+    for variant, width in IMAGE_VARIANTS.items():
+        data = render_variant(jpeg, width)
+        if data is not None:
+            write_atomic(variant_path(image_path, variant), data)
+            written += len(data)
+    return written
+
+class LRUCache:
+    """Bounded mapping evicting the least recently used entries by count and (optionally) by size."""
+    def __init__(self, max_items=None, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value[0]
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.items[key] = (value, size)
+            self.bytes += size
+            while self.items and ((self.max_items and len(self.items) > self.max_items) or
+                                  (self.max_bytes and self.bytes > self.max_bytes)):
+                self.bytes -= self.items.popitem(last=False)[1][1]
+
+    def pop(self, key):
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+
+    def stats(self):
+        return {"entries": len(self.items), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+class ImageService:
+    """Archived event images with downscaled variants and an in-memory cache.
+
+    Snapshots never change once written (event ids are AUTOINCREMENT and never reused),
+    so every response carries a strong content ETag and may be cached as immutable.
+    Variants missing on disk (older events, IMAGE_VARIANTS_ON_SAVE off) are rendered on
+    first request and stored next to the snapshot.
+    """
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES, max_item_bytes=IMAGE_CACHE_MAX_ITEM_BYTES, max_paths=IMAGE_PATH_CACHE_SIZE):
+        self.max_item_bytes = max_item_bytes
+        self.paths = LRUCache(max_items=max_paths)   # event id -> image path
+        self.content = LRUCache(max_bytes=max_bytes) # (image path, variant) -> (etag, bytes)
+        self.rendered = 0
+        self._render_lock = threading.Lock()
+
+    def image_path(self, event_id):
+        path = self.paths.get(event_id)
+        if path is None:
+            event = get_event_by_id(event_id)
+            if not event or not event["image_path"]:
+                return None
+            path = event["image_path"]
+            self.paths.put(event_id, path)
+        return path
+
+    def load(self, image_path, variant="full", event_image=None):
+        """(etag, jpeg bytes) of one variant of a snapshot, or None when the snapshot is gone.
+
+        `event_image`: the event's own image_path when `image_path` is one of its representative frames.
+        """
+        key = (image_path, variant)
+        original = os.path.join(SAVE_DIR, image_path)
+        cached = self.content.get(key)
+        if cached is not None:
+            # One stat instead of a read: retention may have deleted the event since
+            if os.path.exists(original):
+                return cached
+            self.forget(image_path)
+            return None
+
+        if variant == "full":
+            data = _read(original)
+        else:
+            data = _read(variant_path(image_path, variant)) or self._render(image_path, variant, event_image or image_path)
+        if data is None:
+            return None
+
+        entry = (f'"{hashlib.blake2b(data, digest_size=12).hexdigest()}"', data)
+        if len(data) <= self.max_item_bytes:
+            self.content.put(key, entry, len(data))
+        return entry
+
+    def _render(self, image_path, variant, event_image):
+        """Renders and stores a missing variant (events archived before variants existed)."""
+        with self._render_lock:
+            data = _read(variant_path(image_path, variant)) # A concurrent request may have rendered it
+            if data is not None:
+                return data
+            original = _read(os.path.join(SAVE_DIR, image_path))
+            if original is None:
+                return None
+            rendered = render_variant(original, IMAGE_VARIANTS[variant])
+            if rendered is None:
+                return original # Already small enough
+            write_atomic(variant_path(image_path, variant), rendered)
+            # Counted towards the event's disk usage; the retention ledger picks it up on its next resync
+            add_event_bytes(event_image, len(rendered))
+            self.rendered += 1
+            return rendered
+
+    def forget(self, image_path):
+        """Drops a deleted snapshot's bytes from the cache."""
+        for variant in ("full", *IMAGE_VARIANTS):
+            self.content.pop((image_path, variant))
+
+    def stats(self):
+        return {"paths": self.paths.stats(), "content": self.content.stats(), "rendered": self.rendered}
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+# Process-wide service behind /events/{id}/image and /images/{filename}
+image_service = ImageService()
@@ -1,220 +1,431 @@
+import contextlib
+import copy
 import cv2
+import gc
 import numpy as np
-from ultralytics import YOLO
 import time
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from .config import (
     MODEL_PATH_PRIMARY, MODEL_PATH_BACKUP, MODEL_PATH_FALLBACK,
     CONF_THRESH_PERSON, CONF_THRESH_WEAPON, CONF_THRESH_WEAPON_ARCHIVE,
     WEAPON_MAX_AREA_PCT, WEAPON_MAX_BOX_AREA_PCT, WEAPON_PERSISTENCE_CYCLES, STATIC_SUPPRESSION_FRAMES,
     GROUP_MIN_COUNT, GROUP_DISTANCE_PX, ASSOCIATION_MARGIN_PX, GROUP_TIME_SECONDS,
-    EVENT_COOLDOWN_SECONDS, SAVE_DIR
+    EVENT_COOLDOWN_SECONDS, SAVE_DIR, INFERENCE_IMGSZ, INFERENCE_PARALLEL_HEADS, INFERENCE_BACKEND, MODEL_WARMUP,
+    GOVERNOR_ENABLED, GOVERNOR_LADDER, CASCADE_MODE, CASCADE_CROP_IMGSZ, CASCADE_CROP_MARGIN_PX, CASCADE_MAX_CROPS
 )
-from .db import log_event
-from .storage import save_snapshot
+from .backends import load_model
+from .logs import RateLimitedLog
+from .postprocess import Detections, SOURCE_GEN, SOURCE_SPEC, crop_regions, merge_detections
+from .persistence import event_writer
+from .registry import ModelRegistry, ModelVersion, model_labels
+from .spatial import SpatialIndex
+from .storage import event_filename
+from .tracking import Tracker
 
-class DetectionSystem:
-    def __init__(self):
-        # Initialize Dual Neural Pipeline
-        self.model_weapons, self.model_gen = self._load_models()
-        self.gen_class_names = self.model_gen.names
-        self.weapon_class_names = self.model_weapons.names
-        
+class ThreatState:
+    """Per-camera memory for the threat rules (persistence voting, tracking, grouping).
+
+    A `still` state judges one independent image (bulk re-analysis of archived snapshots):
+    there is no history to vote over and no time to dwell, so a single weapon hit counts
+    as the vote and a dense group is suspicious at once.
+    """
+    def __init__(self, still=False):
+        self.still = still
         self.last_threat_time = {}
         self.cluster_active_since = None
         self.weapon_history = [] # For voting persistence
-        self.static_weapon_counts = {} # {bbox_key: frame_count} for static suppression
-        
-        # Tactical Whitelists
-        self.weapon_keywords = [
-            'gun', 'pistol', 'rifle', 'handgun', 'firearm', 
-            'knife', 'dagger', 'machete', 'sword', 
-            'bat', 'baseball bat', 'hockey stick', 'stick', 'weapon', 'club', 'spear'
-        ]
-        
-        # Map IDs across models
-        self.weapon_ids_gen = [id for id, name in self.gen_class_names.items() if any(k in name.lower() for k in self.weapon_keywords)]
-        self.person_ids_gen = [id for id, name in self.gen_class_names.items() if 'person' in name.lower()]
+        self.tracker = Tracker() # Track history drives static suppression and person-weapon association
+        self.threats = [] # Last keyframe verdict, reused while the tracker predicts
+
+class DetectionSystem:
+    def __init__(self, backend=INFERENCE_BACKEND, spec_weights=None, gen_weights=None, version="startup"):
+        self.backend = backend
+        self.alt_models = {} # Alternative general models of the governor's ladder (weights -> model, None = unusable)
+        self._alt_lock = threading.Lock()
+        self.head_pool = None
         
-        self.weapon_ids_spec = [id for id, name in self.weapon_class_names.items() if any(k in name.lower() for k in self.weapon_keywords)]
-        self.person_ids_spec = [id for id, name in self.weapon_class_names.items() if 'person' in name.lower()]
+        # Initialize Dual Neural Pipeline
+        model_weapons, model_gen = self._load_models(backend, spec_weights, gen_weights)
+        self._init_classes(ModelVersion(version, model_weapons.names, model_gen.names, model_weapons, model_gen, (spec_weights, gen_weights)))
+        if MODEL_WARMUP:
+            self.warm_up()
 
+        m_gen, m_spec = self.model_labels()
         print(f"--- Hybrid Neural Architecture Online ---")
-        print(f"Model Gen: {os.path.basename(self.model_gen.ckpt_path) if hasattr(self.model_gen, 'ckpt_path') else 'yolov8m'}")
-        print(f"Model Spec: {os.path.basename(self.model_weapons.ckpt_path) if hasattr(self.model_weapons, 'ckpt_path') else 'Custom Spec'}")
+        print(f"Model Gen: {m_gen}")
+        print(f"Model Spec: {m_spec}")
+        print(f"Scheduler: {'Shared single pass' if self.shared_model else ('Concurrent heads' if self.head_pool else 'Sequential heads')}")
         print(f"Sensors: General({len(self.person_ids_gen)}P/{len(self.weapon_ids_gen)}W) | Spec({len(self.person_ids_spec)}P/{len(self.weapon_ids_spec)}W)")
         print(f"----------------------------------------")
 
-    def _load_models(self):
-        """Loads two models: one for general persons/objects, one for specialized weapons."""
+    def _init_classes(self, active):
+        """Model version (class-id lookups) and threat state shared by the in-process detector and the worker pool."""
+        self._swap_lock = threading.RLock() # Held for a whole batch, so a version swap lands between two batches
+        self.activate(active)
+        self.models = ModelRegistry(self, active)
+        
+        self.default_state = ThreatState() # Used when no camera-specific state is supplied
+        self.event_sink = event_writer # Anything with EventWriter.submit(); inference nodes forward to the API node
+        self.stage_observer = None # Optional callable(stage, seconds) fed by the hot path (benchmarks, metrics)
+        self.status_log = RateLimitedLog()
+
+    def model_labels(self):
+        """(general, specialist) checkpoint names for the HUD."""
+        return model_labels(self.model_gen, self.model_weapons)
+
+    def _load_models(self, backend=INFERENCE_BACKEND, spec_weights=None, gen_weights=None):
+        """Loads two models: one for general persons/objects, one for specialized weapons.
+
+        The runtime (torch / ONNX Runtime / OpenVINO, optionally INT8, or the deterministic
+        stub) is picked by `backend`; `spec_weights` / `gen_weights` override the checkpoints
+        (e.g. re-scoring the archive with a retrained model, or a promoted model version).
+        """
         # 1. Load General Intelligence (YOLOv8m)
-        try:
-            m_gen = YOLO("yolov8m.pt")
-        except:
-            m_gen = YOLO(MODEL_PATH_FALLBACK)
+        if gen_weights:
+            m_gen = load_model(gen_weights, backend)
+        else:
+            try:
+                m_gen = load_model("yolov8m.pt", backend)
+            except:
+                m_gen = load_model(MODEL_PATH_FALLBACK, backend)
             
-        # 2. Load Specialized Weapon Model
-        if os.path.exists(MODEL_PATH_PRIMARY):
-            m_spec = YOLO(MODEL_PATH_PRIMARY)
+        # 2. Load Specialized Weapon Model (the stub needs no weights on disk)
+        if spec_weights:
+            m_spec = load_model(spec_weights, backend)
+        elif os.path.exists(MODEL_PATH_PRIMARY) or backend == "stub":
+            m_spec = load_model(MODEL_PATH_PRIMARY, backend)
         elif os.path.exists(MODEL_PATH_BACKUP):
-            m_spec = YOLO(MODEL_PATH_BACKUP)
+            m_spec = load_model(MODEL_PATH_BACKUP, backend)
         else:
             m_spec = m_gen # Fallback to same if unique model is missing
             
         return m_spec, m_gen
 
-    def _calculate_iou(self, box1, box2):
-        """Helper for Intersection over Union to prevent double-counting."""
-        x1 = max(box1['x1'], box2['x1'])
-        y1 = max(box1['y1'], box2['y1'])
-        x2 = min(box1['x2'], box2['x2'])
-        y2 = min(box1['y2'], box2['y2'])
+    def load_version(self, name, spec_weights, gen_weights=None):
+        """Loads and warms up a model version next to the active one, which keeps serving meanwhile.
+
+        The active general model is reused when `gen_weights` matches its weights.
+        """
+        active = self.models.current()
+        model_gen = self.model_gen if gen_weights == active.weights[1] else load_model(gen_weights, self.backend)
+        model_weapons = load_model(spec_weights, self.backend)
+        version = ModelVersion(name, model_weapons.names, model_gen.names, model_weapons, model_gen, (spec_weights, gen_weights))
+        if MODEL_WARMUP:
+            self.warm_up([model_weapons] if model_gen is self.model_gen else [model_gen, model_weapons])
+        return version
+
+    def activate(self, version):
+        """Swaps a model version in. Waits for the running batch, so every batch sees one version only."""
+        with self._swap_lock:
+            gen_changed = getattr(self, "gen_class_names", None) != version.gen_class_names
+            version.bind(self)
+            # Second head runs on a worker while the first runs inline (torch releases the GIL)
+            if INFERENCE_PARALLEL_HEADS and not self.shared_model and self.head_pool is None:
+                self.head_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-spec")
+            if gen_changed:
+                with self._alt_lock:
+                    self.alt_models = {} # Ladder variants are only valid for the general model's classes
+
+    def release_version(self, version):
+        """Called when the registry drops a version: frees its models (those the active version does not share)."""
+        live = {id(self.model_gen), id(self.model_weapons)}
+        released = [m for m in (version.model_weapons, version.model_gen) if m is not None and id(m) not in live]
+        version.model_weapons = version.model_gen = None
+        version.shared_model = False
+        del released # Ladder variants of a replaced general model were already dropped on activate()
+        gc.collect()
+        torch = sys.modules.get("torch") # Only loaded by the torch backend
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def warm_up(self, models=None):
+        """One dummy pass per model and configured input size, so layer fusion, graph compilation
+        and allocator growth happen during startup instead of on the first camera frames."""
+        sizes = [INFERENCE_IMGSZ]
+        if GOVERNOR_ENABLED:
+            sizes += sorted({p["imgsz"] for p in GOVERNOR_LADDER} - {INFERENCE_IMGSZ}, reverse=True)
+        if CASCADE_MODE and not self.shared_model:
+            sizes.append(CASCADE_CROP_IMGSZ)
+        models = models or ([self.model_gen] if self.shared_model else [self.model_gen, self.model_weapons])
+        t0 = time.time()
+        for imgsz in sizes:
+            blank = np.full((imgsz * 3 // 4, imgsz, 3), 114, dtype=np.uint8) # 4:3 like the cameras
+            for model in models:
+                model([blank], imgsz=imgsz, conf=min(CONF_THRESH_PERSON, CONF_THRESH_WEAPON), verbose=False)
+        print(f"[SYSTEM] WARM-UP COMPLETE: imgsz {sizes} in {time.time() - t0:.1f}s")
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, full_sweep=None, point=None, held=None):
+        """Runs both heads once over a batch of frames (one per camera) and post-processes each.
+
+        In cascade mode `full_sweep[i]` requests a full-frame weapon pass for frame i;
+        otherwise the weapon model only sees crops around detected persons.
+        `point` is the governor's operating point (input size, general model variant);
+        `held[i]`, when given, are frame i's tracked persons, standing in for the general
+        model on batches that skip it.
+        """
+        if not frames:
+            return []
+        with self._swap_lock:
+            return self._detect_batch(frames, full_sweep, point, held)
+
+    def shadow_batch(self, frames, full_sweep, point, live, live_seconds):
+        """On sampled batches, queues the shadowed candidate version over the frames the live version just saw."""
+        candidate = self.models.shadow_candidate()
+        if candidate is not None:
+            self.models.shadow_runner.submit(candidate, frames, full_sweep, point, live, live_seconds)
+
+    def compare_shadow(self, candidate, frames, full_sweep, point, live, live_seconds):
+        """ShadowRunner job: runs the candidate and records it next to the live results."""
+        if candidate.name not in self.models.versions:
+            return # Unloaded while the batch waited
+        t0 = time.perf_counter()
+        results = self.run_version(candidate, frames, full_sweep, point)
+        seconds = time.perf_counter() - t0
+        self.record_stage("shadow", seconds)
+        self.models.record_shadow(candidate, live, results, live_seconds, seconds)
+
+    def run_version(self, version, frames, full_sweep=None, point=None):
+        """detect_batch with a loaded, non-active version (shadow runs). Stage timings are not reported.
+
+        A candidate that shares a model with the live version waits for the running batch
+        (models are not safe to call from two threads); otherwise both run concurrently.
+        """
+        shadow = copy.copy(self)
+        version.bind(shadow)
+        shadow.stage_observer = None
+        if point and version.gen_class_names != self.gen_class_names:
+            point = {**point, "gen_model": None} # Ladder variants only stand in for the live general model
+        shares_model = (
+            {id(version.model_gen), id(version.model_weapons)} & {id(self.model_gen), id(self.model_weapons)}
+            or (point and point.get("gen_model"))
+        )
+        with self._swap_lock if shares_model else contextlib.nullcontext():
+            return shadow._detect_batch(frames, full_sweep, point, None)
+
+    def _detect_batch(self, frames, full_sweep, point, held):
+        imgsz = point["imgsz"] if point else INFERENCE_IMGSZ
+        model_gen = self._general_model(point.get("gen_model") if point else None)
+        if self.shared_model:
+            held = None
+        if CASCADE_MODE and not self.shared_model:
+            return self._detect_cascade(frames, full_sweep or [False] * len(frames), imgsz, model_gen, held)
+        conf = min(CONF_THRESH_PERSON, CONF_THRESH_WEAPON)
+        if held is not None:
+            res_spec, res_gen = self._infer("infer_spec", self.model_weapons, frames, imgsz, conf), held
+        else:
+            res_spec, res_gen = self._run_heads(frames, imgsz, conf, model_gen)
+        t0 = time.perf_counter()
+        results = [self._postprocess(frame, rs, rg) for frame, rs, rg in zip(frames, res_spec, res_gen)]
+        self.record_stage("postprocess", time.perf_counter() - t0)
+        return results
+
+    def _general_model(self, weights):
+        """General model for an operating point. Variants load and warm up on a background
+        thread; the default model keeps serving until they are ready."""
+        if not weights or self.shared_model:
+            return self.model_gen
+        with self._alt_lock:
+            if weights not in self.alt_models:
+                self.alt_models[weights] = None
+                threading.Thread(target=self._load_general, args=(weights,), daemon=True, name="yolo-alt").start()
+                return self.model_gen
+            return self.alt_models[weights] or self.model_gen
+
+    def _load_general(self, weights):
+        try:
+            t0 = time.time()
+            model = load_model(weights, self.backend)
+            # Class masks are shared with the default general model
+            if dict(model.names) != dict(self.gen_class_names):
+                raise ValueError("class names differ from the general model")
+            self.warm_up([model])
+            with self._alt_lock:
+                self.alt_models[weights] = model
+            print(f"[SYSTEM] GENERAL MODEL VARIANT READY: {weights} in {time.time() - t0:.1f}s")
+        except Exception as e:
+            print(f"[SYSTEM] GENERAL MODEL VARIANT {weights} UNAVAILABLE: {e}")
+
+    def record_stage(self, stage, seconds):
+        """Reports one stage duration to `stage_observer` (metrics, benchmarks)."""
+        if self.stage_observer is not None:
+            self.stage_observer(stage, seconds)
+
+    def _infer(self, stage, model, frames, imgsz, conf):
+        """One timed model call over a list of images."""
+        t0 = time.perf_counter()
+        results = model(frames, imgsz=imgsz, conf=conf, verbose=False)
+        self.record_stage(stage, time.perf_counter() - t0)
+        return results
+
+    def _detect_cascade(self, frames, full_sweep, imgsz=INFERENCE_IMGSZ, model_gen=None, held=None):
+        """Person-ROI cascade: general model (or the held person tracks) finds persons, weapon model runs on batched crops around them.
+
+        Windows are inferred at CASCADE_CROP_IMGSZ when they fit it, otherwise at `imgsz`, so no
+        window is shrunk below the full-frame resolution. Crowded frames are swept whole at `imgsz`.
+        """
+        conf = min(CONF_THRESH_PERSON, CONF_THRESH_WEAPON)
         
-        intersection = max(0, x2 - x1) * max(0, y2 - y1)
-        area1 = (box1['x2'] - box1['x1']) * (box1['y2'] - box1['y1'])
-        area2 = (box2['x2'] - box2['x1']) * (box2['y2'] - box2['y1'])
+        # Safety-net sweeps do not depend on the general pass, so they overlap with it
+        sweep_frames = [f for f, sweep in zip(frames, full_sweep) if sweep]
+        sweep_future = None
+        if sweep_frames and self.head_pool is not None:
+            sweep_future = self.head_pool.submit(self._infer, "infer_spec", self.model_weapons, sweep_frames, imgsz, conf)
         
-        union = area1 + area2 - intersection
-        return intersection / union if union > 0 else 0
-
-    def _is_near(self, weapon, person):
-        """Refined association logic: Check if weapon is within proximity of the person's box."""
-        # Person box with expanded margin
-        px1, py1 = person['x1'] - ASSOCIATION_MARGIN_PX, person['y1'] - ASSOCIATION_MARGIN_PX
-        px2, py2 = person['x2'] + ASSOCIATION_MARGIN_PX, person['y2'] + ASSOCIATION_MARGIN_PX
+        res_gen = held if held is not None else self._infer("infer_gen", model_gen or self.model_gen, frames, imgsz, conf)
+        t0 = time.perf_counter()
+        gens, crops, owners, crowded = [], [], [], []
+        large = max(imgsz, CASCADE_CROP_IMGSZ)
+        for i, (frame, rg) in enumerate(zip(frames, res_gen)):
+            h, w = frame.shape[:2]
+            gen = rg if held is not None else Detections.from_result(rg, SOURCE_GEN, self.person_mask_gen, self.weapon_mask_gen, h * w, self.class_names)
+            gens.append(gen)
+            if full_sweep[i]:
+                continue
+            regions = crop_regions(gen.persons.xyxy, CASCADE_CROP_MARGIN_PX, w, h, CASCADE_MAX_CROPS)
+            if regions is None:
+                crowded.append(i) # Too many windows: the whole frame at the full input size
+                continue
+            for x0, y0, x1, y1 in regions:
+                crops.append(frame[y0:y1, x0:x1])
+                owners.append((i, x0, y0, CASCADE_CROP_IMGSZ if max(x1 - x0, y1 - y0) <= CASCADE_CROP_IMGSZ else large))
+        
+        postprocess_time = time.perf_counter() - t0
         
-        # Weapon center
-        wcx = (weapon['x1'] + weapon['x2']) / 2
-        wcy = (weapon['y1'] + weapon['y2']) / 2
+        # One batched weapon call per input size over every crop (and crowded frame) from every camera
+        res_crops, res_crowded = [None] * len(crops), {}
+        for size in sorted({owner[3] for owner in owners} | ({large} if crowded else set())):
+            rows = [k for k, owner in enumerate(owners) if owner[3] == size]
+            whole = crowded if size == large else []
+            res = self._infer("infer_spec", self.model_weapons, [crops[k] for k in rows] + [frames[i] for i in whole], size, conf)
+            for k, rc in zip(rows, res):
+                res_crops[k] = rc
+            res_crowded.update(zip(whole, res[len(rows):]))
+        if sweep_frames:
+            res_sweep = iter(sweep_future.result() if sweep_future else self._infer("infer_spec", self.model_weapons, sweep_frames, imgsz, conf))
         
-        return px1 <= wcx <= px2 and py1 <= wcy <= py2
+        t0 = time.perf_counter()
+        spec_parts = [[] for _ in frames]
+        for (i, x0, y0, _), rc in zip(owners, res_crops):
+            h, w = frames[i].shape[:2]
+            part = Detections.from_result(rc, SOURCE_SPEC, self.person_mask_spec, self.weapon_mask_spec, h * w, self.class_names)
+            spec_parts[i].append(part.offset(x0, y0))
+        
+        results = []
+        for i, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            if full_sweep[i] or i in res_crowded:
+                res = next(res_sweep) if full_sweep[i] else res_crowded[i]
+                spec = Detections.from_result(res, SOURCE_SPEC, self.person_mask_spec, self.weapon_mask_spec, h * w, self.class_names)
+            else:
+                # Overlapping crops can see the same weapon twice
+                spec_crops = Detections.concat(spec_parts[i]) if spec_parts[i] else Detections.empty(self.class_names)
+                spec = merge_detections(Detections.empty(self.class_names), spec_crops)
+            results.append((merge_detections(spec, gens[i]), (w, h)))
+        self.record_stage("postprocess", postprocess_time + time.perf_counter() - t0)
+        return results
 
-    def detect(self, frame):
+    def _run_heads(self, frames, imgsz, conf, model_gen=None):
+        """Parallel Multi-Head Inference: latency tracks the slower head instead of the sum of both."""
+        if self.shared_model:
+            res = self._infer("infer_shared", self.model_gen, frames, imgsz, conf)
+            return res, res
+        
+        model_gen = model_gen or self.model_gen
+        if self.head_pool is None:
+            res_spec = self._infer("infer_spec", self.model_weapons, frames, imgsz, conf)
+            res_gen = self._infer("infer_gen", model_gen, frames, imgsz, conf)
+            return res_spec, res_gen
+        
+        spec_future = self.head_pool.submit(self._infer, "infer_spec", self.model_weapons, frames, imgsz, conf)
+        res_gen = self._infer("infer_gen", model_gen, frames, imgsz, conf)
+        return spec_future.result(), res_gen
+
+    def _postprocess(self, frame, res_spec, res_gen):
         h, w = frame.shape[:2]
         frame_area = h * w
-        boxes = []
-        persons = []
-        weapons = []
         
-        # Parallel Multi-Head Inference
-        res_spec = self.model_weapons(frame, imgsz=640, conf=min(CONF_THRESH_PERSON, CONF_THRESH_WEAPON), verbose=False)[0]
-        res_gen = self.model_gen(frame, imgsz=640, conf=min(CONF_THRESH_PERSON, CONF_THRESH_WEAPON), verbose=False)[0]
+        # Specialized Model (Primary for Weapons)
+        spec = Detections.from_result(res_spec, SOURCE_SPEC, self.person_mask_spec, self.weapon_mask_spec, frame_area, self.class_names)
         
-        # Process Specialized Model (Primary for Weapons)
-        for box in res_spec.boxes:
-            cls_id = int(box.cls[0])
-            label = self.weapon_class_names[cls_id]
-            conf = float(box.conf[0])
-            xyxy = box.xyxy[0].tolist()
-            
-            is_p = cls_id in self.person_ids_spec and conf >= CONF_THRESH_PERSON
-            is_w = cls_id in self.weapon_ids_spec and conf >= CONF_THRESH_WEAPON
-            
-            # Weapon Area Filter: Ignore huge false positives (furniture/walls)
-            if is_w:
-                box_area_pct = ((xyxy[2] - xyxy[0]) * (xyxy[3] - xyxy[1])) / (frame_area)
-                if box_area_pct > WEAPON_MAX_BOX_AREA_PCT:
-                    is_w = False # Suppress oversized boxes
-            
-            if is_p or is_w:
-                # Add tactical diagnostic metadata
-                diag_label = f"[{label.upper()}/SPEC] {conf:.2f}"
-                data = {"cls": cls_id, "label": diag_label, "conf": conf, "x1": xyxy[0], "y1": xyxy[1], "x2": xyxy[2], "y2": xyxy[3], "source": "spec"}
-                if is_p: persons.append(data)
-                if is_w: weapons.append(data)
-                boxes.append(data)
-
-        # Process General Model (Secondary for Weapons, Primary for Persons/Silhouettes/Sticks)
-        for box in res_gen.boxes:
-            cls_id = int(box.cls[0])
-            label = self.gen_class_names[cls_id]
-            conf = float(box.conf[0])
-            xyxy = box.xyxy[0].tolist()
-            
-            is_p = cls_id in self.person_ids_gen and conf >= CONF_THRESH_PERSON
-            is_w = cls_id in self.weapon_ids_gen and conf >= CONF_THRESH_WEAPON
-            
-            if is_w:
-                box_area_pct = ((xyxy[2] - xyxy[0]) * (xyxy[3] - xyxy[1])) / (frame_area)
-                if box_area_pct > WEAPON_MAX_BOX_AREA_PCT:
-                    is_w = False
-            
-            if is_p or is_w:
-                diag_label = f"[{label.upper()}/GEN] {conf:.2f}"
-                data = {"cls": cls_id, "label": diag_label, "conf": conf, "x1": xyxy[0], "y1": xyxy[1], "x2": xyxy[2], "y2": xyxy[3], "source": "gen"}
-                
-                # IoU Deduplication
-                # Check if this object is already detected by the Spec model
-                is_duplicate = False
-                for existing in boxes:
-                    if self._calculate_iou(data, existing) > 0.45: # Standard IoU threshold
-                        is_duplicate = True
-                        # If the Gen model has higher confidence, update the box (optional, but keeps highest score)
-                        if data['conf'] > existing['conf']:
-                            existing.update(data)
-                        break
-                
-                if not is_duplicate:
-                    if is_p: persons.append(data)
-                    if is_w: weapons.append(data)
-                    boxes.append(data)
-                
-        return boxes, persons, weapons, (w, h)
+        # A shared single pass would only produce exact duplicates of the spec boxes
+        if res_gen is res_spec:
+            return spec, (w, h)
+        
+        # General Model (Secondary for Weapons, Primary for Persons/Silhouettes/Sticks), IoU-deduplicated against spec.
+        # On batches that skip it, the held person tracks arrive as ready Detections.
+        if isinstance(res_gen, Detections):
+            gen = res_gen
+        else:
+            gen = Detections.from_result(res_gen, SOURCE_GEN, self.person_mask_gen, self.weapon_mask_gen, frame_area, self.class_names)
+        return merge_detections(spec, gen), (w, h)
+
+    def process_threats(self, frame, dets, state=None, camera_id=None, snapshot=None, scale=1, now=None):
+        """Applies the threat rules to one frame's detections.
 
-    def process_threats(self, frame, boxes, persons, weapons):
+        `frame` may be a reduced-resolution decode (`scale` maps it back to the full frame,
+        in which `dets` are expressed); `snapshot` is the camera's original JPEG, archived
+        as-is instead of re-encoding `frame` when given. `now` is the frame's time (epoch
+        seconds; media time for recordings), which group dwell and event cooldowns run on.
+        Returns (threats, visible) where `visible` is `dets` minus static-noise weapons.
+        """
+        t0 = time.perf_counter()
+        state = state or self.default_state
         threats = []
-        now = time.time()
+        now = time.time() if now is None else now
+        
+        # 0. TRACKING: stable ids for persons and weapons across keyframes
+        dets.track_id = state.tracker.update(dets)
+        persons = dets.persons
+        
+        # Grid over person boxes, shared by association and grouping (near-linear in crowds)
+        index = SpatialIndex(persons.xyxy, GROUP_DISTANCE_PX)
         
         # 1. STATIC SUPPRESSION LOGIC (Identifying Furniture/Closets)
-        active_weapon_keys = []
-        filtered_weapons = []
+        weapon_rows = np.flatnonzero(dets.is_weapon)
+        weapon_tracks = [state.tracker.get(tid) for tid in dets.track_id[weapon_rows].tolist()]
         
-        for w in weapons:
-            # Create a spatial key (rounded to ignore tiny jitters)
-            box_key = (round(w['x1'], -1), round(w['y1'], -1), round(w['x2'], -1), round(w['y2'], -1))
-            active_weapon_keys.append(box_key)
-            
-            # Increment static count
-            self.static_weapon_counts[box_key] = self.static_weapon_counts.get(box_key, 0) + 1
-            
-            # Check if anyone is near this weapon
-            is_being_handled = any(self._is_near(w, p) for p in persons)
-            
-            # Suppression: If static for long but NO person is near, it's noise
-            is_static_noise = (self.static_weapon_counts[box_key] > STATIC_SUPPRESSION_FRAMES) and not is_being_handled
-            
-            if not is_static_noise:
-                filtered_weapons.append(w)
-            else:
-                # Completely remove from the HUD/Archive boxes list
-                if w in boxes:
-                    boxes.remove(w)
-
-        # Cleanup static counts for objects no longer present
-        all_keys = list(self.static_weapon_counts.keys())
-        for k in all_keys:
-            if k not in active_weapon_keys:
-                # If it's gone for 10 frames, reset (prevents noise from being permanently marked)
-                self.static_weapon_counts[k] -= 2 # Fade out
-                if self.static_weapon_counts[k] <= 0:
-                    del self.static_weapon_counts[k]
-
-        weapons = filtered_weapons # Use suppressed list for alerting
+        # Check who is near each weapon now (one association pass, closest person first) and fold it into track history
+        pair_w, pair_p = index.associate(dets.centers()[weapon_rows], ASSOCIATION_MARGIN_PX)
+        carriers = np.split(persons.track_id[pair_p], np.searchsorted(pair_w, np.arange(1, len(weapon_rows))))
+        for track, carrier_ids in zip(weapon_tracks, carriers):
+            track.observe_handling(carrier_ids)
+        is_being_handled = np.array([t.is_handled() for t in weapon_tracks], dtype=bool)
+        
+        # Suppression: If the track has not moved for long and NO person handled it recently, it's noise
+        is_static = np.array([t.static_updates > STATIC_SUPPRESSION_FRAMES for t in weapon_tracks], dtype=bool)
+        is_static_noise = is_static & ~is_being_handled
+        for track, noise in zip(weapon_tracks, is_static_noise.tolist()):
+            track.suppressed = noise
+        
+        # Completely remove from the HUD/Archive boxes list
+        visible_mask = np.ones(len(dets), dtype=bool)
+        visible_mask[weapon_rows[is_static_noise]] = False
+        visible = dets[visible_mask]
+
+        # Use suppressed list for alerting
+        weapons = dets[weapon_rows[~is_static_noise]]
+        is_being_handled = is_being_handled[~is_static_noise]
         
         # 1. WEAPON_DETECTED (Voting Persistence + Archival Locking)
         # Store max confidence for the window
-        max_conf_now = max([w['conf'] for w in weapons]) if weapons else 0
-        self.weapon_history.append(max_conf_now)
+        max_conf_now = float(weapons.conf.max()) if len(weapons) else 0
+        state.weapon_history.append(max_conf_now)
         
-        if len(self.weapon_history) > WEAPON_PERSISTENCE_CYCLES:
-            self.weapon_history.pop(0)
+        if len(state.weapon_history) > WEAPON_PERSISTENCE_CYCLES:
+            state.weapon_history.pop(0)
             
         # HUD Trigger (Flicker resistant)
-        is_weapon_seen_enough = sum(1 for c in self.weapon_history if c >= CONF_THRESH_WEAPON) >= 2
+        is_weapon_seen_enough = sum(1 for c in state.weapon_history if c >= CONF_THRESH_WEAPON) >= (1 if state.still else 2)
         
         # Archiving Trigger (Requires at least one locked detection in window)
-        is_weapon_locked = any(c >= CONF_THRESH_WEAPON_ARCHIVE for c in self.weapon_history)
+        is_weapon_locked = any(c >= CONF_THRESH_WEAPON_ARCHIVE for c in state.weapon_history)
         
         if is_weapon_seen_enough:
             # We save the event ONLY if it was "locked" at some point in the cycle
@@ -225,34 +436,21 @@ class DetectionSystem:
                 threats.append("WEAPON_DETECTED_UNLOCKED") # Custom internal type for HUD-only
             
         # 2. PERSON_WITH_WEAPON (Box Proximity Association)
-        person_with_weapon = False
-        for w in weapons:
-            for p in persons:
-                if self._is_near(w, p):
-                    person_with_weapon = True
-                    break
+        person_with_weapon = bool(is_being_handled.any())
         
         if person_with_weapon and is_weapon_locked:
             threats.append("PERSON_WITH_WEAPON")
             
-        # 3. SUSPICIOUS_GROUP (Rule-based)
-        if len(persons) >= GROUP_MIN_COUNT:
-            # Clustering check using centroid
-            person_centers = [np.array([(p['x1'] + p['x2']) / 2, (p['y1'] + p['y2']) / 2]) for p in persons]
-            centroid = np.mean(person_centers, axis=0)
+        # 3. SUSPICIOUS_GROUP (Rule-based): any dense cluster counts, separate crowds do not average out
+        groups = index.groups(GROUP_DISTANCE_PX, GROUP_MIN_COUNT)
+        if groups:
+            if state.cluster_active_since is None:
+                state.cluster_active_since = now
             
-            clustered_count = sum(1 for c in person_centers if np.linalg.norm(c - centroid) < GROUP_DISTANCE_PX)
-            
-            if clustered_count >= GROUP_MIN_COUNT:
-                if self.cluster_active_since is None:
-                    self.cluster_active_since = now
-                
-                if now - self.cluster_active_since >= GROUP_TIME_SECONDS:
-                    threats.append("SUSPICIOUS_GROUP")
-            else:
-                self.cluster_active_since = None
+            if state.still or now - state.cluster_active_since >= GROUP_TIME_SECONDS:
+                threats.append("SUSPICIOUS_GROUP")
         else:
-            self.cluster_active_since = None
+            state.cluster_active_since = None
                 
         # Deduplication and Persisting
         save_required = False
@@ -263,38 +461,39 @@ class DetectionSystem:
             if t.endswith("_UNLOCKED"):
                 continue
 
-            last_time = self.last_threat_time.get(t, 0)
+            last_time = state.last_threat_time.get(t, 0)
             if now - last_time > EVENT_COOLDOWN_SECONDS:
-                self.last_threat_time[t] = now
+                state.last_threat_time[t] = now
                 save_required = True
                 primary_threat = t # Log the first significant threat found
                 
         if save_required:
-            self.save_event(frame, primary_threat, boxes, weapons)
+            self.save_event(snapshot if snapshot is not None else frame, primary_threat, visible, camera_id, datetime.fromtimestamp(now))
                 
+        # Per-frame status, rate-limited per camera and verdict (a new verdict prints immediately)
         if threats:
-            print(f"THREAT ANALYSIS: Detected {len(persons)} persons and {len(weapons)} weapons.")
-            print(f"ACTIVE THREATS: {threats}")
             # Diagnostic: Show why a weapon might be suppressed
-            for w in weapons:
-                w_area = ((w['x2'] - w['x1']) * (w['y2'] - w['y1'])) / (frame.shape[0] * frame.shape[1])
-                print(f"  > [TARGET] {w['label']} Area:{w_area:.1%} Conf:{w['conf']:.2f}")
+            w_areas = weapons.areas() / (frame.shape[0] * frame.shape[1] * scale * scale)
+            targets = [f"{label} Area:{w_area:.1%}" for label, w_area in zip(weapons.labels(), w_areas.tolist())] # Labels carry the confidence
+            self.status_log(f"{camera_id}:{threats}", "THREAT", "ACTIVE THREATS", camera=camera_id, threats=threats, persons=len(persons), weapons=len(weapons), groups=[len(g) for g in groups] or None, targets=targets or None)
         elif len(persons) > 0:
-            print(f"SURVEILLANCE: {len(persons)} contacts in sector.")
+            self.status_log(f"{camera_id}:surveillance", "SURVEILLANCE", "contacts in sector", camera=camera_id, persons=len(persons))
         elif len(weapons) > 0:
-            print(f"SUPPRESSION: {len(weapons)} environmental signals filtered (Static/Oversized).")
+            self.status_log(f"{camera_id}:suppression", "SUPPRESSION", "environmental signals filtered (Static/Oversized)", camera=camera_id, weapons=len(weapons))
             
-        return threats
+        state.threats = threats
+        self.record_stage("threats", time.perf_counter() - t0)
+        return threats, visible
 
-    def save_event(self, frame, threat_type, boxes, weapons):
-        timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp_str}_{threat_type}.jpg"
-        
-        # Ensure only 100 images requirement: log_event handles the retention
-        save_snapshot(frame, filename)
+    def save_event(self, frame, threat_type, dets, camera_id=None, when=None):
+        """Queues the snapshot (BGR frame or JPEG bytes) and DB row on the write-behind persistence worker."""
+        when = when or datetime.now()
+        filename = event_filename(threat_type, camera_id, when)
         
+        boxes = dets.to_dicts()
         labels = [b['label'] for b in boxes]
-        conf = max([b['conf'] for b in boxes]) if boxes else 0
+        conf = float(dets.conf.max()) if len(dets) else 0
         
-        log_event(threat_type, labels, conf, filename, boxes)
-        print(f"Event Captured: {threat_type} -> {filename}")
+        # Encoding, file write and retention happen off-thread
+        if self.event_sink.submit(frame, threat_type, labels, conf, filename, boxes, camera_id, when.isoformat()):
+            print(f"Event Captured: {threat_type} [{camera_id}] -> {filename}")
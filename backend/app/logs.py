@@ -0,0 +1,35 @@
+import time
+
+from .config import LOG_RATE_LIMIT_SECONDS
+
+def _format_field(value):
+    if isinstance(value, float):
+        value = round(value, 3)
+    if isinstance(value, (list, tuple)):
+        value = ",".join(str(v) for v in value)
+    text = str(value)
+    return f'"{text}"' if " " in text else text
+
+class RateLimitedLog:
+    """Structured `[TAG] message key=value ...` lines, at most one per key every `interval` seconds.
+
+    Hot-path reporting (one call per processed frame) goes through here instead of print;
+    repeats are counted and reported as `suppressed=N` on the next line that gets through.
+    """
+    def __init__(self, interval=LOG_RATE_LIMIT_SECONDS):
+        self.interval = interval
+        self._last = {}     # key -> time of the last printed line
+        self._skipped = {}  # key -> lines suppressed since then
+
+    def __call__(self, key, tag, message, **fields):
+        now = time.time()
+        if now - self._last.get(key, 0) < self.interval:
+            self._skipped[key] = self._skipped.get(key, 0) + 1
+            return False
+        self._last[key] = now
+        skipped = self._skipped.pop(key, 0)
+        if skipped:
+            fields["suppressed"] = skipped
+        details = " ".join(f"{k}={_format_field(v)}" for k, v in fields.items() if v is not None)
+        print(f"[{tag}] {message} {details}".rstrip())
+        return True
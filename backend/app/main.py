@@ -1,16 +1,32 @@
 import asyncio
-import cv2
 import threading
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Query, Header, Response, Path
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 import os
 import time
+from typing import List, Optional
 
-from .config import ESP_STREAM_URL, FRAME_SKIP, SAVE_DIR, CONF_THRESH_PERSON, CONF_THRESH_WEAPON
-from .db import get_events, get_event_by_id
+from .config import (
+    DEFAULT_CAMERA_ID, SAVE_DIR, INFERENCE_WORKERS, HAWKEYE_ROLE, CONF_THRESH_PERSON, CONF_THRESH_WEAPON,
+    EVENTS_PAGE_MAX, VIDEO_MAX_FPS, VIDEO_DEFAULT_QUALITY, IMAGE_VARIANTS, IMAGE_VARIANTS_ON_SAVE,
+    DEDUP_MAX_FRAMES
+)
+from .cameras import CameraRegistry
+from .clips import clip_recorder
+from .coordinator import Coordinator
+from .db import init_db, get_events, get_event_by_id
+from .hub import hub
+from .images import image_service, write_variants
 from .inference import DetectionSystem
+from .metrics import metrics, observe_stage, runtime_collector, MODEL_LOAD_SECONDS
+from .persistence import event_writer
+from .pipeline import run_pipeline, label_cameras
+from .registry import resolve_weights
+from .retention import retention_service
+from .storage import frame_name
+from .workers import InferencePool
+from .streaming import BOUNDARY
 
 app = FastAPI(title="Hawkeye Surveillance System")
 
@@ -21,154 +37,217 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Detection System (Lazy loaded to avoid blocking startup)
 detector = None
 
+# Camera Registry: one fetcher + threat state per camera, shared detector
+registry = CameraRegistry()
+
+# Distributed mode (api role): inference nodes own cameras and models, this process aggregates
+coordinator = None
+
 def load_detector_async():
-    global detector, latest_detections
-    latest_detections["status"] = "MODEL_SYNC"
+    global detector
+    for cam in registry:
+        cam.detections["status"] = "MODEL_SYNC"
     print("[SYSTEM] ACQUIRING NEURAL WEIGHTS...")
-    detector = DetectionSystem()
+    started = time.time()
+    # Worker processes keep model compute off the API process's GIL
+    loaded = InferencePool() if INFERENCE_WORKERS > 0 else DetectionSystem()
+    loaded.stage_observer = observe_stage
+    # Versions promoted through /models relabel the HUD
+    loaded.models.on_promote = lambda version: label_cameras(registry, loaded)
+    MODEL_LOAD_SECONDS.set(round(time.time() - started, 3))
+    detector = loaded
     
-    m_gen = os.path.basename(detector.model_gen.ckpt_path) if hasattr(detector.model_gen, 'ckpt_path') and detector.model_gen.ckpt_path else "yolov8m"
-    m_spec = os.path.basename(detector.model_weapons.ckpt_path) if hasattr(detector.model_weapons, 'ckpt_path') and detector.model_weapons.ckpt_path else "custom"
-    
-    latest_detections["debug"]["model_used"] = f"Hybrid ({m_gen} + {m_spec})"
-    print(f"[SYSTEM] NEURAL CONVERGENCE COMPLETE: {latest_detections['debug']['model_used']}")
-
-# State
-is_camera_connected = False
-latest_frame = None
-last_frame_time = 0
-latest_detections = {
-    "timestamp": "",
-    "fps": 0,
-    "counts": {"persons": 0, "weapons": 0},
-    "threats": [],
-    "boxes": [],
-    "status": "INITIALIZING",
-    "frame_dims": [0, 0],
-    "debug": {"model_used": "yolov8m (pending)"}
-}
-clients = set()
-
-# Mount static files for events
-app.mount("/images", StaticFiles(directory=SAVE_DIR), name="images")
-
-def video_fetcher():
-    """Constantly grabs frames from the ESP32-CAM to clear buffers."""
-    global latest_frame, is_camera_connected
-    while True:
-        print(f"[STREAM] ATTEMPTING LINK: {ESP_STREAM_URL}")
-        cap = cv2.VideoCapture(ESP_STREAM_URL)
-        if not cap.isOpened():
-            is_camera_connected = False
-            latest_frame = None
-            print(f"[STREAM] LINK FAILURE: Destination {ESP_STREAM_URL} unreachable.")
-            time.sleep(3)
-            continue
-            
-        is_camera_connected = True
-        print(f"[STREAM] UPLINK ESTABLISHED -> {ESP_STREAM_URL}")
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                is_camera_connected = False
-                latest_frame = None # Clear stale frame
-                break
-            latest_frame = frame
-            last_frame_time = time.time()
-            # No sleep here - grab as fast as possible
-            
-        cap.release()
-        time.sleep(1)
-
-def video_processing_loop():
-    """Handles inference and broadcasting at a stable rate."""
-    global latest_detections, latest_frame
-    frame_count = 0
-    start_time = time.time()
-    
-    while True:
-        t1 = time.time()
-        
-        if latest_frame is not None:
-            frame = latest_frame.copy()
-            
-            # Update dims immediately if not set
-            if latest_detections["frame_dims"] == [0, 0]:
-                h, w = frame.shape[:2]
-                latest_detections["frame_dims"] = [w, h]
-
-            if frame_count % FRAME_SKIP == 0 and detector is not None:
-                boxes, persons, weapons, dims = detector.detect(frame)
-                threats = detector.process_threats(frame, boxes, persons, weapons)
-                
-                end_time = time.time()
-                fps = 1.0 / (end_time - start_time) if (end_time - start_time) > 0 else 0
-                start_time = end_time
-                
-                latest_detections.update({
-                    "timestamp": str(time.time()),
-                    "fps": round(fps, 1),
-                    "counts": {
-                        "persons": len(persons),
-                        "weapons": len(weapons)
-                    },
-                    "threats": threats,
-                    "boxes": boxes,
-                    "status": "CONNECTED",
-                    "frame_dims": dims
-                })
-            elif detector is None:
-                latest_detections["status"] = "MODEL_SYNC"
-            else:
-                # Connected but skipped frame
-                latest_detections["status"] = "CONNECTED"
-        else:
-            # No frame available
-            latest_detections["fps"] = 0
-            if is_camera_connected:
-                # Camera thread says linked, but no frames (possible buffer stall or auth)
-                latest_detections["status"] = "MODEL_SYNC" if detector is None else "UPLINK_STALL"
-            else:
-                latest_detections["status"] = "OFFLINE"
-                latest_detections["frame_dims"] = [0, 0]
-
-        # Constant Broadcast (Heartbeat)
-        for client in list(clients):
-            try:
-                asyncio.run_coroutine_threadsafe(client.send_json(latest_detections), loop)
-            except Exception:
-                pass
-        
-        frame_count += 1
-        elapsed = time.time() - t1
-        time.sleep(max(0.01, 0.066 - elapsed))
-
-# Start background threads
-loop = asyncio.get_event_loop()
-threading.Thread(target=load_detector_async, daemon=True).start()
-threading.Thread(target=video_fetcher, daemon=True).start()
-threading.Thread(target=video_processing_loop, daemon=True).start()
+    model_used = label_cameras(registry, detector)
+    print(f"[SYSTEM] NEURAL CONVERGENCE COMPLETE: {model_used}")
+
+# Start background threads (schema setup first: the writer and retention threads query it)
+init_db()
+event_writer.stage_observer = observe_stage
+if IMAGE_VARIANTS_ON_SAVE:
+    event_writer.variants = write_variants
+metrics.add_collector(runtime_collector(registry, event_writer, hub))
+if clip_recorder is not None:
+    # Cameras feed their clip rings from the fetcher (or, in api role, from frames relayed by nodes)
+    for cam in registry:
+        cam.clip_buffer = clip_recorder.buffer(cam.id)
+    event_writer.clips = clip_recorder
+    clip_recorder.start()
+event_writer.start()
+retention_service.on_purge = event_writer.forget_events
+retention_service.start()
+if HAWKEYE_ROLE == "api":
+    # Node results land in the same hub, broadcasters and event writer as local ones
+    coordinator = Coordinator(registry, hub.publish, event_writer)
+    coordinator.start()
+else:
+    threading.Thread(target=load_detector_async, daemon=True).start()
+    registry.start_fetchers()
+    # Publish to the HUD hub: serialized once, only changed fields go out as deltas
+    threading.Thread(target=run_pipeline, args=(registry, lambda: detector, hub.publish), daemon=True, name="pipeline").start()
+
+def _camera_or_404(camera_id):
+    cam = registry.get(camera_id)
+    if cam is None:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    return cam
+
+def _camera_status(cam):
+    age = cam.frame_age()
+    return {
+        "stream": "CONNECTED" if cam.is_connected else "DISCONNECTED",
+        "reader": cam.reader,
+        "last_frame_age": round(age, 1) if age is not None else "N/A",
+    }
 
 @app.get("/health")
 def health():
+    primary = registry.default
     return {
         "status": "ok", 
-        "stream": "CONNECTED" if is_camera_connected else "DISCONNECTED",
-        "last_frame_age": round(time.time() - last_frame_time, 1) if last_frame_time > 0 else "N/A",
-        "model": latest_detections["debug"]["model_used"],
-        "clients": len(clients)
+        **_camera_status(primary),
+        "model": primary.detections["debug"]["model_used"],
+        "clients": len(hub.subscribers),
+        "hub": hub.stats(),
+        "persistence": event_writer.stats(),
+        "clips": clip_recorder.stats() if clip_recorder else None,
+        "images": image_service.stats(),
+        "retention": retention_service.stats(),
+        "workers": detector.stats() if isinstance(detector, InferencePool) else None,
+        "role": HAWKEYE_ROLE,
+        "coordinator": coordinator.stats() if coordinator else None,
+        "cameras": {cam.id: {**_camera_status(cam), "video": cam.broadcaster.stats()} for cam in registry}
     }
 
+@app.get("/health/live")
+def liveness():
+    """Liveness: the process is up and serving requests (restart only when this fails)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    """Readiness: models loaded and warmed (standalone) or at least one inference node linked (api role)."""
+    if HAWKEYE_ROLE == "api":
+        checks = {"inference_nodes": bool(coordinator and coordinator.nodes)}
+    else:
+        checks = {"models": detector is not None}
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "starting",
+        "checks": checks,
+        "cameras_connected": sum(cam.is_connected for cam in registry),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition: stage latency histograms, frame counters, queue depths, frame age."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cameras")
+def list_cameras():
+    return [{"id": cam.id, "url": cam.url, "status": cam.detections["status"], **_camera_status(cam)} for cam in registry]
+
+MODEL_VERSION_NAME = r"^[\w.-]{1,64}$"
+
+def _models():
+    """Model registry of this process's detector."""
+    if HAWKEYE_ROLE == "api":
+        raise HTTPException(status_code=404, detail="Models are managed by the inference nodes")
+    if detector is None:
+        raise HTTPException(status_code=503, detail="Models are still loading")
+    return detector.models
+
+@app.get("/models")
+def list_models():
+    """Loaded model versions, loads in progress, and the running shadow comparison."""
+    return _models().stats()
+
+@app.post("/models/rollback")
+def rollback_model():
+    """Promotes the previously active version again."""
+    try:
+        _models().rollback()
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _models().stats()
+
+@app.delete("/models/shadow")
+def stop_shadow():
+    """Ends the shadow comparison and returns its final report."""
+    return _models().stop_shadow()
+
+@app.post("/models/{name}", status_code=202)
+def load_model_version(
+    name: str = Path(..., pattern=MODEL_VERSION_NAME),
+    spec: str = Query(..., description="Weapon model weights, relative to MODEL_REGISTRY_DIR"),
+    gen: Optional[str] = Query(None, description="General model weights (default: keep the active one)"),
+    shadow: bool = Query(False, description="Compare against the live version on sampled batches once loaded"),
+):
+    """Loads and warms up a new model version in the background; the active version keeps serving."""
+    models = _models()
+    try:
+        weights = resolve_weights(spec, detector.backend), resolve_weights(gen, detector.backend) if gen else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        models.load(name, *weights, shadow=shadow)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return models.stats()
+
+@app.post("/models/{name}/promote")
+def promote_model(name: str):
+    """Swaps a loaded version in between two batches (the previous one stays loaded for rollback)."""
+    try:
+        _models().promote(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Model version not loaded")
+    return _models().stats()
+
+@app.post("/models/{name}/shadow")
+def start_shadow(name: str):
+    """(Re)starts comparing a loaded version against the live one on sampled batches."""
+    try:
+        _models().start_shadow(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Model version not loaded")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _models().stats()
+
+@app.delete("/models/{name}")
+def unload_model(name: str):
+    """Unloads a version that is not active."""
+    try:
+        _models().unload(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Model version not loaded")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _models().stats()
+
 @app.get("/events")
-def list_events():
-    return get_events()
+def list_events(
+    response: Response,
+    limit: int = Query(200, ge=1, le=EVENTS_PAGE_MAX),
+    before: Optional[int] = Query(None, description="Keyset cursor: return events with id < before"),
+    type: Optional[List[str]] = Query(None),
+    camera: Optional[List[str]] = Query(None),
+    since: Optional[str] = Query(None, description="ISO-8601 lower bound (inclusive)"),
+    until: Optional[str] = Query(None, description="ISO-8601 upper bound (exclusive)"),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+):
+    events = get_events(limit, before, type, since, until, min_confidence, camera)
+    if len(events) == limit:
+        response.headers["X-Next-Cursor"] = str(events[-1]["id"])
+    return events
 
 @app.get("/events/{event_id}")
 def event_details(event_id: int):
@@ -177,35 +256,65 @@ def event_details(event_id: int):
         raise HTTPException(status_code=404, detail="Event not found")
     return event
 
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _image_response(image_path, variant, if_none_match, event_image=None):
+    """JPEG with a strong ETag; a matching If-None-Match gets 304 without the body."""
+    entry = image_service.load(image_path, variant, event_image) if image_path else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag, data = entry
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
 @app.get("/events/{event_id}/image")
-def get_event_image(event_id: int):
-    event = get_event_by_id(event_id)
-    if not event or not event['image_path']:
+def get_event_image(
+    event_id: int,
+    variant: str = Query("full", pattern=f"^(full|{'|'.join(IMAGE_VARIANTS)})$"),
+    frame: int = Query(0, ge=0, lt=max(1, DEDUP_MAX_FRAMES), description="Representative frame of a coalesced incident (0 = first snapshot)"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Snapshot of an event: `full` (as archived), or a downscaled `thumb` / `web` copy."""
+    image_path = image_service.image_path(event_id)
+    return _image_response(image_path and frame_name(image_path, frame), variant, if_none_match, image_path)
+
+@app.get("/images/{filename}")
+def get_archived_image(filename: str, if_none_match: Optional[str] = Header(None)):
+    """Snapshot by filename (links from older dashboards), with the same caching as /events/{id}/image."""
+    if os.path.basename(filename) != filename or not filename.lower().endswith(".jpg"):
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    path = os.path.join(SAVE_DIR, event['image_path'])
-    return FileResponse(path)
+    return _image_response(filename, "full", if_none_match)
+
+@app.get("/events/{event_id}/clip")
+def get_event_clip(event_id: int):
+    """Pre/post-event MJPEG AVI. FileResponse answers Range requests, so players can seek."""
+    event = get_event_by_id(event_id)
+    if not event or not event.get('clip_path'):
+        raise HTTPException(status_code=404, detail="Clip not found")
+    path = os.path.join(SAVE_DIR, event['clip_path'])
+    if not os.path.exists(path):
+        # Written once the post-roll has been recorded
+        raise HTTPException(status_code=404, detail="Clip not available")
+    return FileResponse(path, media_type="video/x-msvideo", filename=event['clip_path'])
 
 @app.websocket("/ws/detections")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, camera: str = DEFAULT_CAMERA_ID, encoding: str = "json"):
+    if registry.get(camera) is None:
+        await websocket.close(code=1008)
+        return
     await websocket.accept()
-    clients.add(websocket)
-    try:
-        while True:
-            await websocket.receive_text() # Keep alive
-    except WebSocketDisconnect:
-        clients.remove(websocket)
-
-def gen_frames():
-    while True:
-        if latest_frame is not None:
-            ret, buffer = cv2.imencode('.jpg', latest_frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        else:
-            time.sleep(0.01)
+    await hub.serve(websocket, camera, encoding)
+
+@app.on_event("startup")
+async def bind_event_loop():
+    loop = asyncio.get_running_loop()
+    hub.bind(loop)
+    for cam in registry:
+        cam.broadcaster.bind(loop)
 
 @app.get("/video")
-def video_feed():
-    return StreamingResponse(gen_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+def video_feed(camera: str = DEFAULT_CAMERA_ID, fps: float = VIDEO_MAX_FPS, quality: Optional[int] = Query(VIDEO_DEFAULT_QUALITY, ge=1, le=100)):
+    cam = _camera_or_404(camera)
+    return StreamingResponse(cam.broadcaster.stream(fps, quality), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
@@ -0,0 +1,166 @@
+"""Prometheus text-format metrics for GET /metrics (no client library needed).
+
+Hot-path code only touches Histogram.observe (stage latencies); everything else is
+read from the live objects at scrape time by collectors, so counting costs nothing per frame.
+"""
+import bisect
+import threading
+import time
+
+# Seconds; spans sub-millisecond post-processing up to a stalled CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels.items())
+    return "{" + pairs + "}"
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        out = []
+        for key, values in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                out.append(("_bucket", dict(labels, le=_format_value(float(bound))), cumulative))
+            out.append(("_sum", labels, values[-1]))
+            out.append(("_count", labels, cumulative))
+        return out
+
+class Gauge:
+    """Last-set value keyed by label values."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[tuple(labels.get(name, "") for name in self.labelnames)] = value
+
+    def samples(self):
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, labelnames=()):
+        metric = Gauge(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """`collect()` yields (name, kind, help, [(labels, value), ...]) families at scrape time."""
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples()
+            if samples:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}" for suffix, labels, value in samples)
+        for collect in self.collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"[METRICS] COLLECTOR FAILED: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry served by /metrics
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "hawkeye_stage_seconds",
+    "Pipeline stage latency (decode, detect, infer_spec, infer_gen, infer_shared, postprocess, threats, shadow, persistence, persistence_db)",
+    ("stage",),
+)
+MODEL_LOAD_SECONDS = metrics.gauge("hawkeye_model_load_seconds", "Wall time of the last model load")
+OPERATING_POINT_LEVEL = metrics.gauge("hawkeye_operating_point_level", "Latency governor rung (0 = full quality)")
+
+def observe_stage(stage, seconds):
+    """stage_observer hook for DetectionSystem / EventWriter."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+def runtime_collector(registry, event_writer, hub):
+    """Per-camera frame counters, frame age and queue depths, read from the live objects."""
+    def collect():
+        cams = list(registry)
+        per_camera = lambda attr: [({"camera": cam.id}, getattr(cam, attr)) for cam in cams]
+        yield ("hawkeye_frames_received_total", "counter", "Frames received from the camera", [({"camera": cam.id}, cam.frame_seq) for cam in cams])
+        yield ("hawkeye_frames_inferred_total", "counter", "Frames sent through the detector", per_camera("frames_inferred"))
+        yield ("hawkeye_frames_skipped_total", "counter", "Frames seen by the pipeline but not inferred (motion/rate gating)", per_camera("frames_skipped"))
+        yield ("hawkeye_frames_dropped_total", "counter", "Frames replaced before the pipeline saw them, or undecodable", per_camera("frames_dropped"))
+        now = time.time()
+        yield ("hawkeye_frame_age_seconds", "gauge", "Time since the camera's last frame (NaN before the first one)",
+               [({"camera": cam.id}, now - cam.last_frame_time if cam.last_frame_time else None) for cam in cams])
+        yield ("hawkeye_camera_connected", "gauge", "1 while the camera uplink is established", [({"camera": cam.id}, int(cam.is_connected)) for cam in cams])
+
+        stats = event_writer.stats()
+        yield ("hawkeye_persist_queue_depth", "gauge", "Events waiting for the write-behind worker", [({}, stats["depth"])])
+        yield ("hawkeye_persist_queue_capacity", "gauge", "Write-behind queue size", [({}, stats["capacity"])])
+        yield ("hawkeye_persist_events_total", "counter", "Events by persistence outcome",
+               [({"outcome": k}, stats[k]) for k in ("submitted", "written", "coalesced", "dropped", "failed")])
+
+        subscribers = list(hub.subscribers)
+        yield ("hawkeye_hub_clients", "gauge", "Connected /ws/detections clients", [({}, len(subscribers))])
+        lag = {}
+        for sub in subscribers:
+            channel = hub.channels.get(sub.camera_id)
+            behind = channel.current[0] - sub.version if channel else 0
+            lag[sub.camera_id] = max(lag.get(sub.camera_id, 0), behind)
+        yield ("hawkeye_hub_max_lag_versions", "gauge", "Versions the slowest HUD client of each camera is behind", [({"camera": cid}, v) for cid, v in sorted(lag.items())])
+        yield ("hawkeye_hub_messages_total", "counter", "HUD messages sent", [({}, hub.sent)])
+        yield ("hawkeye_hub_dropped_clients_total", "counter", "HUD clients disconnected for stalling", [({}, hub.dropped)])
+        yield ("hawkeye_video_viewers", "gauge", "Connected /video viewers", [({"camera": cam.id}, cam.broadcaster.viewers) for cam in cams])
+        yield ("hawkeye_video_frames_total", "counter", "Live video frames by path (relayed camera JPEG / fresh encode)",
+               [({"camera": cam.id, "path": "relayed"}, cam.broadcaster.relayed) for cam in cams]
+               + [({"camera": cam.id, "path": "encoded"}, cam.broadcaster.encodes) for cam in cams])
+    return collect
@@ -0,0 +1,164 @@
+import http.client
+from urllib.parse import urlsplit
+
+from .config import MJPEG_TIMEOUT_SECONDS, MJPEG_MAX_FRAME_BYTES
+
+MAX_HEADER_LINE = 1024
+RESYNC_CHUNK = 64 * 1024 # Read size while discarding an oversized part
+
+# Start-of-frame markers carrying the image dimensions (all SOFn except DHT/JPG/DAC)
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def parse_boundary(content_type):
+    """Boundary token from a multipart Content-Type header, or None."""
+    media_type, _, params = content_type.partition(";")
+    if not media_type.strip().lower().startswith("multipart/"):
+        return None
+    for param in params.split(";"):
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').encode()
+    return None
+
+def jpeg_size(data):
+    """(width, height) read from the JPEG SOF header without decoding, or None."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2 if marker != 0xFF else 1 # Fill bytes and standalone markers carry no length
+            continue
+        if marker in _SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+def reduce_factor(size, target):
+    """Largest libjpeg downscale (8, 4, 2) that keeps the longer side at or above `target` pixels."""
+    if not size:
+        return 1
+    longest = max(size)
+    for factor in (8, 4, 2):
+        if longest // factor >= target:
+            return factor
+    return 1
+
+def _is_delimiter(line, boundary):
+    # Cameras disagree on whether the header boundary already includes the leading dashes
+    return line.strip().lstrip(b"-").startswith(boundary.lstrip(b"-"))
+
+def _read_exact(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def read_parts(stream, boundary, max_frame_bytes=MJPEG_MAX_FRAME_BYTES):
+    """Yields the raw body of every part of a multipart/x-mixed-replace byte stream.
+
+    `stream` is any binary file-like object with readline()/read(). Parts with a
+    Content-Length (the ESP32 always sends one) are read in a single call; otherwise
+    the body runs up to the next boundary line. A declared length over `max_frame_bytes`
+    raises ValueError; an undeclared body that grows past it is dropped and the reader
+    resyncs on the next boundary.
+    """
+    at_part = False # True when the boundary line of the next part was already consumed
+    while True:
+        if not at_part:
+            line = stream.readline(MAX_HEADER_LINE)
+            if not line:
+                return
+            if not _is_delimiter(line, boundary):
+                continue # Preamble or the CRLF that precedes each boundary
+            if line.strip().endswith(b"--") and len(line.strip()) > 2:
+                return # Closing boundary
+        at_part = False
+
+        headers = {}
+        while True:
+            line = stream.readline(MAX_HEADER_LINE)
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get(b"content-length")
+        if length is not None:
+            length = int(length)
+            if length > max_frame_bytes:
+                raise ValueError(f"MJPEG part of {length} bytes exceeds limit")
+            data = _read_exact(stream, length)
+            if data is None:
+                return
+        else:
+            lines, total = [], 0
+            while True:
+                # Bounded reads: a body without line breaks cannot grow past the limit either
+                line = stream.readline(max_frame_bytes + 1 - total if lines is not None else RESYNC_CHUNK)
+                if not line:
+                    return
+                if _is_delimiter(line, boundary):
+                    at_part = True
+                    break
+                if lines is None:
+                    continue
+                lines.append(line)
+                total += len(line)
+                if total > max_frame_bytes:
+                    lines = None # Discard up to the next boundary
+            if lines is None:
+                print(f"[MJPEG] Dropped a part over {max_frame_bytes} bytes without Content-Length")
+                continue
+            data = b"".join(lines)
+            if data.endswith(b"\r\n"):
+                data = data[:-2]
+        yield data
+
+class MJPEGReader:
+    """Persistent HTTP connection to an MJPEG endpoint (ESP32 /stream) yielding raw JPEG bytes."""
+    def __init__(self, url, timeout=MJPEG_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+        self.boundary = None
+        self._conn = None
+        self._response = None
+
+    def open(self):
+        parts = urlsplit(self.url)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._conn = conn_cls(parts.hostname, parts.port, timeout=self.timeout)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self._conn.request("GET", path, headers={"Accept": "multipart/x-mixed-replace"})
+        response = self._conn.getresponse()
+        if response.status != 200:
+            raise ConnectionError(f"HTTP {response.status} {response.reason}")
+        content_type = response.getheader("Content-Type", "")
+        self.boundary = parse_boundary(content_type)
+        if self.boundary is None:
+            raise ConnectionError(f"Not a multipart stream: {content_type!r}")
+        self._response = response
+        return self
+
+    def frames(self):
+        """Raw JPEG bytes of every part, in arrival order. Ends when the server closes the stream."""
+        return read_parts(self._response, self.boundary)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._response = None
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+from .config import (
+    MOTION_DOWNSCALE, MOTION_PIXEL_THRESH, MOTION_AREA_PCT, MOTION_BG_ALPHA,
+    INFERENCE_RATE_IDLE_HZ, INFERENCE_RATE_ACTIVE_HZ, MOTION_HOLD_SECONDS, CASCADE_SWEEP_SECONDS
+)
+
+class MotionGate:
+    """Cheap scene-change detector: frame differencing against a running-average background on a tiny grayscale frame."""
+    def __init__(self, size=MOTION_DOWNSCALE, pixel_thresh=MOTION_PIXEL_THRESH, area_pct=MOTION_AREA_PCT, alpha=MOTION_BG_ALPHA):
+        self.size = size
+        self.pixel_thresh = pixel_thresh
+        self.area_pct = area_pct
+        self.alpha = alpha
+        self.background = None
+        self.score = 0.0 # Fraction of changed pixels on the last update
+
+    def update(self, frame):
+        """Feeds a BGR or grayscale frame and returns True when the scene changed."""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA), (5, 5), 0)
+
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype(np.float32)
+            self.score = 1.0
+            return True
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        self.score = float(np.count_nonzero(diff > self.pixel_thresh)) / diff.size
+        cv2.accumulateWeighted(small, self.background, self.alpha)
+        return self.score >= self.area_pct
+
+class InferenceScheduler:
+    """Per-camera keyframe pacing: ceiling rate while motion or a threat is present, idle floor otherwise."""
+    def __init__(self, idle_hz=INFERENCE_RATE_IDLE_HZ, active_hz=INFERENCE_RATE_ACTIVE_HZ, hold_seconds=MOTION_HOLD_SECONDS):
+        self.idle_hz = idle_hz
+        self.active_hz = active_hz
+        self.hold_seconds = hold_seconds
+        self.last_inference = 0
+        self.active_until = 0
+        self.last_sweep = 0
+
+    def is_active(self, now):
+        return now < self.active_until
+
+    def due(self, now, motion, threat_active):
+        """True when a full detection should run on this tick."""
+        if motion or threat_active:
+            # Hold the fast rate briefly so a pause in movement does not drop coverage mid-incident
+            self.active_until = now + self.hold_seconds
+        rate = self.active_hz if self.is_active(now) else self.idle_hz
+        return now - self.last_inference >= 1.0 / rate
+
+    def mark(self, now):
+        self.last_inference = now
+
+    def sweep_due(self, now, interval=CASCADE_SWEEP_SECONDS):
+        """Cascade mode: True (and restarts the timer) when a full-frame weapon sweep is due."""
+        if now - self.last_sweep >= interval:
+            self.last_sweep = now
+            return True
+        return False
+
+    def mode(self, now):
+        return "ACTIVE" if self.is_active(now) else "IDLE"
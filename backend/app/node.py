@@ -0,0 +1,204 @@
+"""Inference node for distributed mode.
+
+Run with `python -m app.node` (from backend/) on each inference box. Set
+HAWKEYE_COORDINATOR to the API node's coordinator address, HAWKEYE_SECRET to its shared
+secret, and optionally HAWKEYE_NODE_ID.
+"""
+import collections
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .config import (
+    DIST_TRANSPORT, DIST_COORDINATOR, DIST_NODE_ID, DIST_HEARTBEAT_SECONDS, DIST_NODE_TIMEOUT_SECONDS,
+    DIST_VIDEO_FPS, DIST_OUTBOX_SIZE, DIST_EVENT_BUFFER_SIZE, INFERENCE_WORKERS
+)
+from .cameras import CameraRegistry
+from .inference import DetectionSystem
+from .pipeline import run_pipeline, label_cameras
+from .storage import encode_snapshot
+from .transport import get_transport
+from .workers import InferencePool
+
+class RemoteEventSink:
+    """EventWriter stand-in on inference nodes: events (with their JPEG) go to the API node."""
+    def __init__(self, node):
+        self.node = node
+        self.submitted = 0
+
+    def submit(self, frame, threat_type, labels, confidence, filename, boxes, camera_id=None, timestamp=None):
+        record = {
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "type": threat_type,
+            "labels": labels,
+            "confidence": confidence,
+            "bboxes": boxes,
+        } # The coordinator names the snapshot itself
+        # Encoding (when the frame is not already a JPEG) happens on the sender thread
+        if self.node.send({"type": "event", "camera_id": camera_id, "record": record}, frame, droppable=False):
+            self.submitted += 1
+            return True
+        return False
+
+class InferenceNode:
+    """Runs the camera fetchers and the detection pipeline for the cameras the coordinator assigns."""
+    def __init__(self, coordinator=DIST_COORDINATOR, node_id=DIST_NODE_ID, transport=DIST_TRANSPORT):
+        self.coordinator = coordinator
+        self.node_id = node_id
+        self.transport = get_transport(transport)
+        self.registry = CameraRegistry({})
+        self.detector = None
+        self.conn = None
+        self.outbox = queue.Queue(maxsize=DIST_OUTBOX_SIZE)
+        self.dropped = 0
+        self.held = collections.deque() # (header, jpeg) of events waiting for the coordinator link
+        self.events_dropped = 0
+        self._sent_payloads = {} # camera_id -> last HUD payload sent (JSON text)
+        self._video = {}         # camera_id -> (last relayed seq, time)
+
+    def run(self):
+        threading.Thread(target=self._load_detector, daemon=True, name="model-load").start()
+        threading.Thread(target=run_pipeline, args=(self.registry, lambda: self.detector, self.publish), daemon=True, name="pipeline").start()
+        threading.Thread(target=self._send_loop, daemon=True, name="node-sender").start()
+        threading.Thread(target=self._heartbeat_loop, daemon=True, name="node-heartbeat").start()
+        self._connect_forever()
+
+    def _load_detector(self):
+        print(f"[NODE:{self.node_id}] ACQUIRING NEURAL WEIGHTS...")
+        detector = InferencePool() if INFERENCE_WORKERS > 0 else DetectionSystem()
+        detector.event_sink = RemoteEventSink(self)
+        self.detector = detector
+        print(f"[NODE:{self.node_id}] NEURAL CONVERGENCE COMPLETE: {label_cameras(self.registry, detector)}")
+
+    def _connect_forever(self):
+        backoff = 1
+        while True:
+            try:
+                conn = self.transport.connect(self.coordinator)
+                conn.send({"type": "hello", "node_id": self.node_id})
+                conn.settimeout(DIST_NODE_TIMEOUT_SECONDS) # Coordinator answers every heartbeat
+                self.conn = conn
+                backoff = 1
+                print(f"[NODE:{self.node_id}] LINKED TO COORDINATOR {self.coordinator}")
+                while True:
+                    message = conn.recv()
+                    if message is None:
+                        break
+                    header, _ = message
+                    if header.get("type") == "assign":
+                        self._assign(header["cameras"])
+            except Exception as e:
+                print(f"[NODE:{self.node_id}] COORDINATOR LINK FAILURE: {e}")
+            finally:
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+
+            # Without a coordinator the cameras may already be served elsewhere
+            self._assign({})
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+    def _assign(self, cameras):
+        changed = set(cameras) != {cam.id for cam in self.registry}
+        cameras = self.registry.assign(cameras)
+        if self.detector is not None:
+            label_cameras(cameras.values(), self.detector)
+        for cid in list(self._sent_payloads):
+            if cid not in cameras:
+                del self._sent_payloads[cid]
+        if changed:
+            print(f"[NODE:{self.node_id}] SERVING: {sorted(cameras) or 'none'}")
+
+    def send(self, header, payload=b"", droppable=True):
+        """Queues a message for the coordinator. HUD/video updates are dropped when the link is backed up."""
+        try:
+            if droppable:
+                self.outbox.put_nowait((header, payload))
+            else:
+                self.outbox.put((header, payload), timeout=1)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if not droppable:
+                print(f"[NODE:{self.node_id}] OUTBOX FULL: dropped {header['type']} [{header.get('camera_id')}] ({self.dropped} total)")
+            return False
+
+    def publish(self, camera_id, payload):
+        """Pipeline hook: forwards changed HUD payloads and relays live frames at DIST_VIDEO_FPS."""
+        if self.conn is None:
+            return
+        text = json.dumps(payload, separators=(",", ":"))
+        if self._sent_payloads.get(camera_id) != text:
+            self._sent_payloads[camera_id] = text
+            # Send a detached copy: the pipeline keeps mutating `payload` while the sender serializes
+            self.send({"type": "detections", "camera_id": camera_id, "payload": json.loads(text)})
+
+        cam = self.registry.get(camera_id)
+        if cam is None or DIST_VIDEO_FPS <= 0:
+            return
+        last_seq, last_time = self._video.get(camera_id, (-1, 0))
+        now = time.time()
+        if cam.frame_seq != last_seq and now - last_time >= 1.0 / DIST_VIDEO_FPS:
+            seq, data = cam.broadcaster.encoded(None) # Passthrough JPEG bytes when available
+            if data is not None:
+                self._video[camera_id] = (seq, now)
+                self.send({"type": "frame", "camera_id": camera_id}, data)
+
+    def _hold(self, header, payload):
+        """Keeps an event until the coordinator is reachable again; the oldest goes when the buffer is full."""
+        if len(self.held) >= DIST_EVENT_BUFFER_SIZE:
+            dropped, _ = self.held.popleft()
+            self.events_dropped += 1
+            print(f"[NODE:{self.node_id}] EVENT BUFFER FULL: dropped {dropped['record']['type']} [{dropped['camera_id']}] ({self.events_dropped} total)")
+        self.held.append((header, payload))
+
+    def _flush_held(self, conn):
+        while self.held:
+            header, payload = self.held[0]
+            conn.send(header, payload) # OSError: stays held for the next link
+            self.held.popleft()
+
+    def _send_loop(self):
+        while True:
+            try:
+                header, payload = self.outbox.get(timeout=DIST_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                header = None
+            conn = self.conn
+            try:
+                if conn is not None and self.held:
+                    self._flush_held(conn)
+            except OSError:
+                conn = None # Reader thread notices the broken link and reconnects
+            if header is None:
+                continue
+
+            if not isinstance(payload, bytes):
+                payload = encode_snapshot(payload)
+            is_event = header["type"] == "event"
+            if conn is None:
+                if is_event:
+                    self._hold(header, payload)
+                continue # HUD/video updates are stale by the time the link is back
+            try:
+                conn.send(header, payload)
+            except OSError:
+                if is_event:
+                    self._hold(header, payload)
+
+    def _heartbeat_loop(self):
+        # Sent directly instead of through the outbox, so a backed-up link never delays them
+        while True:
+            time.sleep(DIST_HEARTBEAT_SECONDS)
+            conn = self.conn
+            if conn is not None:
+                try:
+                    conn.send({"type": "heartbeat", "node_id": self.node_id})
+                except OSError:
+                    pass
+
+if __name__ == "__main__":
+    InferenceNode().run()
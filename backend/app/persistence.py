@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .config import PERSIST_QUEUE_SIZE, PERSIST_BATCH_SIZE, DEDUP_ENABLED
+from .db import coalesce_events, log_events
+from .dedup import SnapshotDeduper, dhash
+from .retention import disk_ledger
+from .storage import encode_snapshot, frame_name, remove_event_files, write_snapshot
+
+class EventWriter:
+    """Write-behind event persistence.
+
+    The inference thread only enqueues (frame, metadata); JPEG encoding (skipped when
+    the camera's own JPEG is passed through), file writes and batched DB inserts happen
+    on a dedicated worker. When the queue is full new events are dropped and counted
+    instead of stalling the frame loop. Near-duplicate snapshots of a sustained incident
+    are folded into the incident's first row instead of archived again.
+    """
+    def __init__(self, maxsize=PERSIST_QUEUE_SIZE, batch_size=PERSIST_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.stage_observer = None # Optional callable(stage, seconds), as on DetectionSystem
+        self.clips = None # Optional ClipRecorder: events get a pre/post-event clip linked
+        self.variants = None # Optional callable(jpeg, image_path) -> bytes written (downscaled image variants)
+        self.dedup = SnapshotDeduper() if DEDUP_ENABLED else None
+        self._purged = set() # Event ids deleted by retention, not yet closed in the deduper
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="event-writer")
+                self._thread.start()
+
+    def submit(self, frame, threat_type, labels, confidence, filename, boxes, camera_id=None, timestamp=None):
+        """Non-blocking enqueue. `frame` is a BGR image (must not be modified afterwards) or ready JPEG bytes."""
+        self.start()
+        record = {
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "type": threat_type,
+            "labels": labels,
+            "confidence": confidence,
+            "image_path": filename,
+            "bboxes": boxes,
+            "camera_id": camera_id,
+        }
+        try:
+            self.queue.put_nowait((frame, record, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            print(f"[PERSIST] QUEUE FULL: dropped {threat_type} ({self.dropped} total)")
+            return False
+        self.submitted += 1
+        return True
+
+    def forget_events(self, event_ids):
+        """Retention hook: deleted rows must not absorb further snapshots."""
+        if self.dedup is not None:
+            with self._lock:
+                self._purged.update(event_ids)
+
+    def join(self):
+        """Blocks until every queued event has been written."""
+        self.queue.join()
+
+    def stats(self):
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            **(self.dedup.stats() if self.dedup else {"open_incidents": 0, "coalesced": 0}),
+        }
+
+    def _record(self, stage, seconds):
+        if self.stage_observer is not None:
+            self.stage_observer(stage, seconds)
+
+    def _write_variants(self, data, image_path):
+        try:
+            return self.variants(data, image_path)
+        except Exception as e:
+            # The snapshot is archived; missing variants are rendered on first request
+            print(f"[PERSIST] VARIANTS FAILED {image_path}: {e}")
+            return 0
+
+    def _archive(self, frame, record, submitted):
+        """Writes a new event's snapshot and variants and schedules its clip."""
+        data = frame if isinstance(frame, bytes) else encode_snapshot(frame)
+        write_snapshot(data, record["image_path"])
+        record["disk_bytes"] = len(data)
+        if self.variants is not None:
+            record["disk_bytes"] += self._write_variants(data, record["image_path"])
+        if self.clips is not None:
+            record["clip_path"] = self.clips.request(record["camera_id"], record["image_path"], record["type"], now=submitted)
+
+    def _coalesce(self, incident, frame, record, submitted, updates, first):
+        """Folds a near-duplicate snapshot into its incident."""
+        nbytes = 0
+        index = self.dedup.keep_frame(incident)
+        if index is not None:
+            data = frame if isinstance(frame, bytes) else encode_snapshot(frame)
+            name = frame_name(incident.image_path, index)
+            write_snapshot(data, name)
+            nbytes = len(data)
+            if self.variants is not None:
+                nbytes += self._write_variants(data, name)
+
+        row = incident.record
+        if row is not None:
+            # Incident opened earlier in this batch: its row is not inserted yet
+            row["frame_count"] = incident.frame_count
+            row["last_timestamp"] = record["timestamp"]
+            row["confidence"] = max(row["confidence"], record["confidence"])
+            row["kept_frames"] = incident.kept
+            row["disk_bytes"] += nbytes
+            return
+        # The row may be gone by the time it is updated: keep this batch's first snapshot to archive instead
+        first.setdefault(incident.event_id, (frame, record, submitted, incident.image_path))
+        frames, _, confidence, _, total, _ = updates.get(incident.event_id, (0, None, 0.0, 0, 0, None))
+        updates[incident.event_id] = (
+            frames + 1, record["timestamp"], max(confidence, record["confidence"]), incident.kept, total + nbytes, incident.event_id
+        )
+
+    def _rescue(self, event_ids, updates, first):
+        """Archives the first snapshot coalesced into each deleted row as a new event instead."""
+        rescued = []
+        self.dedup.forget(set(event_ids))
+        for event_id in event_ids:
+            frame, record, submitted, image_path = first[event_id]
+            frames, last_timestamp, confidence = updates[event_id][:3]
+            remove_event_files(image_path) # Representatives written for the deleted row
+            try:
+                self._archive(frame, record, submitted)
+            except Exception as e:
+                self.failed += 1
+                print(f"[PERSIST] SNAPSHOT FAILED {record['image_path']}: {e}")
+                continue
+            record.update(frame_count=frames, last_timestamp=last_timestamp, confidence=confidence)
+            self.dedup.reopen(record, int(record["phash"], 16), submitted)
+            rescued.append(record)
+        return rescued
+
+    def _insert(self, records):
+        event_ids = log_events(records)
+        self.written += len(records)
+        for record, event_id in zip(records, event_ids):
+            if self.dedup is not None:
+                self.dedup.inserted(record, event_id)
+            disk_ledger.add(record["type"], record["disk_bytes"])
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            records, updates, first = [], {}, {}
+            if self._purged:
+                with self._lock:
+                    purged, self._purged = self._purged, set()
+                self.dedup.forget(purged)
+            for frame, record, submitted in batch:
+                try:
+                    t0 = time.perf_counter()
+                    incident = None
+                    if self.dedup is not None:
+                        phash = dhash(frame)
+                        record["phash"] = f"{phash:016x}"
+                        incident = self.dedup.check(record, phash, submitted)
+                    if incident is None:
+                        self._archive(frame, record, submitted)
+                        records.append(record)
+                    else:
+                        self._coalesce(incident, frame, record, submitted, updates, first)
+                    self._record("persistence", time.perf_counter() - t0)
+                except Exception as e:
+                    self.failed += 1
+                    if self.dedup is not None:
+                        self.dedup.discard(record)
+                    print(f"[PERSIST] SNAPSHOT FAILED {record['image_path']}: {e}")
+
+            try:
+                if records or updates:
+                    t0 = time.perf_counter()
+                    if records:
+                        self._insert(records)
+                    missing = coalesce_events(list(updates.values())) if updates else []
+                    for event_id, (_, _, _, _, nbytes, _) in updates.items():
+                        if nbytes and event_id not in missing:
+                            disk_ledger.add(first[event_id][1]["type"], nbytes, count=0)
+                    if missing:
+                        records = self._rescue(missing, updates, first)
+                        if records:
+                            self._insert(records)
+                    self._record("persistence_db", time.perf_counter() - t0)
+            except Exception as e:
+                self.failed += len(records)
+                if self.dedup is not None:
+                    for record in records:
+                        self.dedup.discard(record)
+                print(f"[PERSIST] DB WRITE FAILED ({len(records)} events): {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+# Process-wide writer shared by every camera
+event_writer = EventWriter()
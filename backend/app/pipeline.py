@@ -0,0 +1,134 @@
+import time
+
+from .config import GOVERNOR_ENABLED, INFERENCE_IMGSZ
+from .governor import LatencyGovernor
+from .metrics import OPERATING_POINT_LEVEL
+
+def label_cameras(cameras, detector):
+    """Stamps the loaded model names into each camera's HUD payload."""
+    m_gen, m_spec = detector.model_labels()
+    model_used = f"Hybrid ({m_gen} + {m_spec})"
+    for cam in cameras:
+        cam.detections["debug"]["model_used"] = model_used
+    return model_used
+
+def run_pipeline(registry, get_detector, publish):
+    """Handles motion-gated, batched inference across all cameras and broadcasting at a stable rate.
+
+    `get_detector()` returns the detector or None while models load; `publish(camera_id, payload)`
+    receives every camera's HUD payload once per tick (local hub or a remote coordinator).
+    """
+    start_time = time.time()
+    governor = LatencyGovernor() if GOVERNOR_ENABLED else None
+    operating_point = governor.report() if governor else None
+    if governor is not None:
+        OPERATING_POINT_LEVEL.set(governor.level)
+    
+    while True:
+        t1 = time.time()
+        batch = []
+        detector = get_detector()
+        point = governor.point if governor else None
+        imgsz = point["imgsz"] if point else INFERENCE_IMGSZ
+        
+        for cam in registry:
+            payload = cam.detections
+            packet = cam.packet
+            
+            if cam.has_frame():
+                # Update dims immediately if not set (read from the JPEG header, no decode)
+                if payload["frame_dims"] == [0, 0] and packet.size:
+                    payload["frame_dims"] = list(packet.size)
+
+                if detector is None:
+                    payload["status"] = "MODEL_SYNC"
+                    continue
+                
+                # Frames the fetcher replaced between two ticks were never looked at
+                new_frame = packet.seq != cam.pipeline_seq
+                if new_frame:
+                    cam.frames_dropped += max(0, packet.seq - cam.pipeline_seq - 1)
+                    cam.pipeline_seq = packet.seq
+                
+                # Motion gate + adaptive rate: quiet scenes drop to the idle inference floor
+                motion = cam.check_motion(packet)
+                threat_active = bool(cam.threat_state.threats)
+                payload["debug"]["scheduler"] = {"mode": cam.scheduler.mode(t1), "motion": round(cam.motion.score, 3)}
+                if operating_point is not None:
+                    payload["debug"]["operating_point"] = operating_point
+                
+                if cam.scheduler.due(t1, motion, threat_active):
+                    # Only keyframes are decoded in color, at reduced resolution when the frame dwarfs the model input
+                    t0 = time.perf_counter()
+                    frame, scale = cam.decode(packet, cam.inference_reduce(packet, imgsz))
+                    if frame is None:
+                        cam.frames_dropped += new_frame
+                        continue # Corrupt JPEG, retry on the next frame
+                    detector.record_stage("decode", time.perf_counter() - t0)
+                    cam.frames_inferred += 1
+                    cam.scheduler.mark(t1)
+                    batch.append((cam, packet, frame, scale, cam.scheduler.sweep_due(t1)))
+                else:
+                    # In-between frame: cheap tracker prediction keeps HUD boxes moving
+                    cam.frames_skipped += new_frame
+                    payload["boxes"] = cam.threat_state.tracker.predict().to_dicts()
+                    payload["status"] = "CONNECTED"
+            else:
+                # No frame available
+                payload["fps"] = 0
+                if cam.is_connected:
+                    # Camera thread says linked, but no frames (possible buffer stall or auth)
+                    payload["status"] = "MODEL_SYNC" if detector is None else "UPLINK_STALL"
+                else:
+                    payload["status"] = "OFFLINE"
+                    payload["frame_dims"] = [0, 0]
+
+        if batch:
+            # On batches the governor skips the general model, each camera's person tracks stand in for it
+            held = None
+            if governor is not None and not governor.run_general():
+                held = [cam.threat_state.tracker.held_persons().scale(1 / scale) for cam, _, _, scale, _ in batch]
+            
+            # One model call per head for every camera that has a fresh frame
+            t0 = time.perf_counter()
+            results = detector.detect_batch([item[2] for item in batch], [item[4] for item in batch], point, held)
+            detect_seconds = time.perf_counter() - t0
+            detector.record_stage("detect", detect_seconds)
+            
+            end_time = time.time()
+            fps = 1.0 / (end_time - start_time) if (end_time - start_time) > 0 else 0
+            start_time = end_time
+            
+            for (cam, packet, frame, scale, _), (dets, dims) in zip(batch, results):
+                dets.scale(scale)
+                threats, visible = detector.process_threats(frame, dets, cam.threat_state, cam.id, packet.jpeg, scale)
+                cam.detections.update({
+                    "timestamp": str(time.time()),
+                    "fps": round(fps, 1),
+                    "counts": {
+                        "persons": int(dets.is_person.sum()),
+                        "weapons": int(dets.is_weapon.sum())
+                    },
+                    "threats": threats,
+                    "boxes": visible.to_dicts(), # Serialized only at the API edge
+                    "status": "CONNECTED",
+                    "frame_dims": list(packet.size) if packet.size else dims
+                })
+            
+            if governor is not None:
+                done = time.time()
+                frame_age = max(done - packet.time for _, packet, _, _, _ in batch)
+                threat_active = any(cam.threat_state.threats for cam in registry)
+                if governor.observe(detect_seconds, frame_age, threat_active, done):
+                    operating_point = governor.report()
+                    OPERATING_POINT_LEVEL.set(governor.level)
+            
+            # Sampled batches are also queued for a shadowed candidate version (on its own thread, outside the governor's measurements)
+            if held is None:
+                detector.shadow_batch([item[2] for item in batch], [item[4] for item in batch], point, results, detect_seconds)
+
+        for cam in registry:
+            publish(cam.id, cam.detections)
+        
+        elapsed = time.time() - t1
+        time.sleep(max(0.01, 0.066 - elapsed))
@@ -0,0 +1,216 @@
+import numpy as np
+
+from .config import CONF_THRESH_PERSON, CONF_THRESH_WEAPON, WEAPON_MAX_BOX_AREA_PCT, DEDUP_IOU_THRESH
+
+# Model sources (row tag in Detections.source)
+SOURCE_SPEC = 0
+SOURCE_GEN = 1
+SOURCE_KEYS = ("spec", "gen")
+
+def class_mask(names, predicate):
+    """Boolean lookup table indexed by class id, so membership tests become one gather."""
+    mask = np.zeros(max(names) + 1 if names else 0, dtype=bool)
+    for cls_id, name in names.items():
+        mask[cls_id] = predicate(name.lower())
+    return mask
+
+def _to_numpy(values):
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+def box_areas(xyxy):
+    return (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+
+def box_centers(xyxy):
+    return np.stack(((xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2), axis=1)
+
+def iou_matrix(a, b):
+    """Pairwise Intersection over Union between two (N, 4) / (M, 4) xyxy arrays."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    union = box_areas(a)[:, None] + box_areas(b)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def crop_regions(persons_xyxy, margin, width, height, max_crops):
+    """Integer crop windows around persons (expanded by `margin`), with overlapping windows merged.
+
+    Returns at most `max_crops` windows, or None for crowded frames (more windows than
+    that), which the weapon model should see whole at the full input size instead.
+    """
+    if len(persons_xyxy) == 0:
+        return []
+    boxes = np.round(persons_xyxy).astype(np.int64)
+    boxes[:, :2] -= margin
+    boxes[:, 2:] += margin
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+    # Merge overlapping windows a component at a time until none overlap (merged windows can reach new ones)
+    while len(boxes) > 1:
+        overlap = ((boxes[:, None, 0] < boxes[None, :, 2]) & (boxes[None, :, 0] < boxes[:, None, 2])
+                   & (boxes[:, None, 1] < boxes[None, :, 3]) & (boxes[None, :, 1] < boxes[:, None, 3]))
+        np.fill_diagonal(overlap, True)
+        if overlap.sum() == len(boxes):
+            break
+        # Connected components: every window takes the smallest index it reaches
+        labels = np.arange(len(boxes))
+        while True:
+            reached = np.where(overlap, labels[None, :], len(boxes)).min(axis=1)
+            if np.array_equal(reached, labels):
+                break
+            labels = reached
+        order = np.argsort(labels, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0])
+        grouped = boxes[order]
+        boxes = np.concatenate([np.minimum.reduceat(grouped[:, :2], starts), np.maximum.reduceat(grouped[:, 2:], starts)], axis=1)
+
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    if len(boxes) > max_crops:
+        return None
+    return boxes.tolist()
+
+class Detections:
+    """Array-backed detections for one frame. Row i of every field describes the same box."""
+    __slots__ = ("xyxy", "conf", "cls", "source", "is_person", "is_weapon", "names", "track_id")
+
+    def __init__(self, xyxy, conf, cls, source, is_person, is_weapon, names=({}, {}), track_id=None):
+        self.xyxy = xyxy           # (N, 4) float32
+        self.conf = conf           # (N,) float32
+        self.cls = cls             # (N,) int32, class id within its source model
+        self.source = source       # (N,) uint8, SOURCE_SPEC / SOURCE_GEN
+        self.is_person = is_person # (N,) bool
+        self.is_weapon = is_weapon # (N,) bool
+        self.names = names         # (spec_names, gen_names), shared, used only for serialization
+        self.track_id = np.full(len(conf), -1, np.int32) if track_id is None else track_id # (N,) int32, -1 = untracked
+
+    @classmethod
+    def empty(cls, names=({}, {})):
+        return cls(
+            np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32),
+            np.zeros(0, np.uint8), np.zeros(0, bool), np.zeros(0, bool), names
+        )
+
+    @classmethod
+    def from_result(cls, result, source, person_mask, weapon_mask, frame_area, names):
+        """Thresholds and filters one ultralytics result without leaving NumPy."""
+        boxes = result.boxes
+        xyxy = _to_numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4)
+        conf = _to_numpy(boxes.conf).astype(np.float32).reshape(-1)
+        cls_ids = _to_numpy(boxes.cls).astype(np.int32).reshape(-1)
+
+        is_p = person_mask[cls_ids] & (conf >= CONF_THRESH_PERSON)
+        is_w = weapon_mask[cls_ids] & (conf >= CONF_THRESH_WEAPON)
+        # Weapon Area Filter: Ignore huge false positives (furniture/walls)
+        is_w &= box_areas(xyxy) / frame_area <= WEAPON_MAX_BOX_AREA_PCT
+
+        keep = is_p | is_w
+        return cls(
+            xyxy[keep], conf[keep], cls_ids[keep], np.full(int(keep.sum()), source, np.uint8),
+            is_p[keep], is_w[keep], names
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.xyxy for p in parts]), np.concatenate([p.conf for p in parts]),
+            np.concatenate([p.cls for p in parts]), np.concatenate([p.source for p in parts]),
+            np.concatenate([p.is_person for p in parts]), np.concatenate([p.is_weapon for p in parts]),
+            parts[0].names, np.concatenate([p.track_id for p in parts])
+        )
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, index):
+        return Detections(
+            self.xyxy[index], self.conf[index], self.cls[index], self.source[index],
+            self.is_person[index], self.is_weapon[index], self.names, self.track_id[index]
+        )
+
+    @property
+    def persons(self):
+        return self[self.is_person]
+
+    @property
+    def weapons(self):
+        return self[self.is_weapon]
+
+    def offset(self, dx, dy):
+        """Shifts boxes from crop coordinates back into frame coordinates (in place)."""
+        self.xyxy += np.array([dx, dy, dx, dy], dtype=np.float32)
+        return self
+
+    def scale(self, factor):
+        """Maps boxes from a reduced-resolution decode back into full-frame coordinates (in place)."""
+        if factor != 1:
+            self.xyxy *= np.float32(factor)
+        return self
+
+    def centers(self):
+        return box_centers(self.xyxy)
+
+    def areas(self):
+        return box_areas(self.xyxy)
+
+    def labels(self):
+        return [
+            f"[{self.names[src][cls_id].upper()}/{SOURCE_KEYS[src].upper()}] {conf:.2f}"
+            for src, cls_id, conf in zip(self.source.tolist(), self.cls.tolist(), self.conf.tolist())
+        ]
+
+    def to_dicts(self):
+        """Serializes to the HUD/archive box format. Only call at the API/storage edge."""
+        return [
+            {"cls": cls_id, "label": label, "conf": conf, "x1": x1, "y1": y1, "x2": x2, "y2": y2, "source": SOURCE_KEYS[src],
+             "track_id": track_id if track_id >= 0 else None}
+            for cls_id, label, conf, (x1, y1, x2, y2), src, track_id in zip(
+                self.cls.tolist(), self.labels(), self.conf.tolist(), self.xyxy.tolist(), self.source.tolist(), self.track_id.tolist()
+            )
+        ]
+
+def merge_detections(primary, secondary, iou_thresh=DEDUP_IOU_THRESH):
+    """Cross-model IoU deduplication.
+
+    A secondary box overlapping an already kept box is dropped; if it is more
+    confident, the kept row takes over its geometry, score and class while keeping
+    its person/weapon role.
+    """
+    if len(secondary) == 0:
+        return primary
+    if len(primary) == 0:
+        kept = primary
+    else:
+        kept = primary[np.arange(len(primary))] # copy, rows may be overwritten below
+        overlap = iou_matrix(secondary.xyxy, kept.xyxy) > iou_thresh
+        matched = overlap.any(axis=1)
+        first = overlap.argmax(axis=1)
+
+        # Most confident duplicate per kept row wins the update
+        for i in np.flatnonzero(matched)[np.argsort(secondary.conf[matched])]:
+            j = first[i]
+            if secondary.conf[i] > kept.conf[j]:
+                _overwrite(kept, j, secondary, i)
+        secondary = secondary[~matched]
+
+    # Remaining secondary boxes dedupe against each other in arrival order
+    overlap = iou_matrix(secondary.xyxy, secondary.xyxy) > iou_thresh
+    alive = np.ones(len(secondary), dtype=bool)
+    for i in range(len(secondary)):
+        if not alive[i]:
+            continue
+        dupes = np.flatnonzero(overlap[i, i + 1:] & alive[i + 1:]) + i + 1
+        if len(dupes):
+            alive[dupes] = False
+            best = dupes[secondary.conf[dupes].argmax()]
+            if secondary.conf[best] > secondary.conf[i]:
+                _overwrite(secondary, i, secondary, best)
+    return Detections.concat([kept, secondary[alive]])
+
+def _overwrite(dst, j, src, i):
+    dst.xyxy[j] = src.xyxy[i]
+    dst.conf[j] = src.conf[i]
+    dst.cls[j] = src.cls[i]
+    dst.source[j] = src.source[i]
@@ -0,0 +1,267 @@
+"""Bulk re-analysis of archived images and recordings with the current (or a candidate) model.
+
+Run from backend/:
+
+    python -m app.reanalyze data/events --out rescore.csv
+    python -m app.reanalyze "recordings/*.mp4" --weights runs/new/weights/best.pt --workers 4 --out rescore.parquet
+    python -m app.reanalyze data/events --out rescore.db      # sqlite table `reanalysis_results`
+
+Frames are streamed from disk by a prefetching reader (JPEGs decoded on a thread pool,
+in order), run through detect_batch in batches (optionally on INFERENCE_WORKERS-style
+worker processes) and through the threat rules with a collecting event sink: nothing
+is written to the live archive or DB. Results are written row by row, so memory
+stays flat however many frames are processed.
+
+The threat rules run on media time (video frame rate, archive filename timestamps,
+`--fps` for raw MJPEG captures), so cooldowns and group dwell do not depend on how
+fast frames are processed. Images in a folder are judged as independent stills unless
+--temporal-images is given: a single weapon hit is the vote and groups need no dwell.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .cameras import decode_jpeg
+from .config import INFERENCE_BACKEND, INFERENCE_IMGSZ, INFERENCE_RING_SLOTS, INFERENCE_RING_SLOT_BYTES, DECODE_REDUCED
+from .inference import DetectionSystem, ThreatState
+from .mjpeg import jpeg_size, reduce_factor
+from .sources import expand_sources, media_clock, open_source
+
+COLUMNS = (
+    "source", "frame", "width", "height", "persons", "weapons", "max_weapon_conf",
+    "labels", "threats", "event", "boxes",
+)
+
+class CollectingEventSink:
+    """Side-effect-free event sink: remembers which event the threat rules would have archived."""
+    def __init__(self):
+        self.event = None
+        self.events = 0
+
+    def submit(self, frame, threat_type, labels, confidence, filename, boxes, camera_id=None, timestamp=None):
+        self.event = threat_type
+        self.events += 1
+        return True
+
+    def take(self):
+        event, self.event = self.event, None
+        return event
+
+class CsvResults:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows([row[c] for c in COLUMNS] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetResults:
+    """Streams row groups through pyarrow (optional dependency, only needed for .parquet output)."""
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("source", pa.string()), ("frame", pa.int64()), ("width", pa.int32()), ("height", pa.int32()),
+            ("persons", pa.int32()), ("weapons", pa.int32()), ("max_weapon_conf", pa.float32()),
+            ("labels", pa.string()), ("threats", pa.string()), ("event", pa.string()), ("boxes", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if rows:
+            columns = {c: [row[c] for row in rows] for c in COLUMNS}
+            self.writer.write_table(self.pa.table(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+class SqliteResults:
+    """Results table in a separate sqlite file (never the live archive)."""
+    def __init__(self, path, run_id):
+        self.run_id = run_id
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reanalysis_results (
+                run_id TEXT NOT NULL,
+                source TEXT, frame INTEGER, width INTEGER, height INTEGER,
+                persons INTEGER, weapons INTEGER, max_weapon_conf REAL,
+                labels TEXT, threats TEXT, event TEXT, boxes TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_reanalysis_run ON reanalysis_results(run_id)")
+
+    def write(self, rows):
+        self.conn.executemany(
+            f"INSERT INTO reanalysis_results (run_id, {', '.join(COLUMNS)}) VALUES (?{', ?' * len(COLUMNS)})",
+            [(self.run_id, *(row[c] for c in COLUMNS)) for row in rows]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def open_results(path, run_id):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return CsvResults(path)
+    if ext == ".parquet":
+        return ParquetResults(path)
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return SqliteResults(path, run_id)
+    raise ValueError(f"Unsupported output {path!r} (use .csv, .parquet or .db)")
+
+def prefetch(paths, depth, threads, stop, fps=10.0):
+    """Yields (source, index, frame, scale, media time) in order, decoding up to `depth` frames ahead."""
+    pending = queue.Queue(maxsize=depth)
+    decoder = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="reanalyze-decode")
+
+    def decode(jpeg):
+        size = jpeg_size(jpeg)
+        reduce = reduce_factor(size, INFERENCE_IMGSZ) if DECODE_REDUCED and size else 1
+        return decode_jpeg(jpeg, reduce), reduce
+
+    def read():
+        try:
+            for path in paths:
+                kind, items = open_source(path)
+                clock = media_clock(path, fps)
+                for index, item in enumerate(items):
+                    if stop.is_set():
+                        return
+                    job = decoder.submit(decode, item) if kind == "jpeg" else (item, 1)
+                    pending.put((path, index, job, clock(index)))
+        except Exception as e:
+            print(f"[REANALYZE] READ FAILED: {e}", file=sys.stderr)
+        finally:
+            pending.put(None)
+
+    threading.Thread(target=read, daemon=True, name="reanalyze-reader").start()
+    try:
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            path, index, job, when = item
+            frame, scale = job.result() if hasattr(job, "result") else job
+            if frame is None:
+                print(f"[REANALYZE] SKIPPED undecodable frame {path}#{index}", file=sys.stderr)
+                continue
+            yield path, index, frame, scale, when
+    finally:
+        stop.set()
+        decoder.shutdown(wait=False, cancel_futures=True)
+
+def analyze(paths, detector, results, batch=8, depth=64, threads=4, stateless_images=True, boxes=False, progress_seconds=5, fps=10.0):
+    """Runs every frame through detect_batch + process_threats and streams result rows. Returns totals."""
+    sink = CollectingEventSink()
+    detector.event_sink = sink
+    states = {} # source -> ThreatState (recordings keep temporal context across their frames)
+    totals = {"frames": 0, "events": 0, "weapon_frames": 0}
+    started = last_report = time.time()
+    stop = threading.Event()
+
+    def flush(items):
+        detected = detector.detect_batch([frame for _, _, frame, _, _ in items])
+        rows = []
+        for (path, index, frame, scale, when), (dets, dims) in zip(items, detected):
+            dets.scale(scale)
+            # Independent stills (e.g. data/events) each get a fresh state: no voting across unrelated images
+            still = stateless_images and os.path.isdir(path)
+            state = ThreatState(still=True) if still else states.get(path) or states.setdefault(path, ThreatState())
+            threats, visible = detector.process_threats(frame, dets, state, "reanalyze", None, scale, when)
+            event = sink.take()
+            weapons = visible.weapons
+            classes = sorted({visible.names[src][cls] for src, cls in zip(visible.source.tolist(), visible.cls.tolist())})
+            rows.append({
+                "source": path,
+                "frame": index,
+                "width": int(frame.shape[1] * scale),
+                "height": int(frame.shape[0] * scale),
+                "persons": int(visible.is_person.sum()),
+                "weapons": len(weapons),
+                "max_weapon_conf": round(float(weapons.conf.max()), 4) if len(weapons) else 0.0,
+                "labels": json.dumps(classes),
+                "threats": ";".join(threats),
+                "event": event or "",
+                "boxes": json.dumps(visible.to_dicts()) if boxes else "",
+            })
+            totals["events"] += event is not None
+            totals["weapon_frames"] += len(weapons) > 0
+        results.write(rows)
+        totals["frames"] += len(items)
+
+    items = []
+    for item in prefetch(paths, depth, threads, stop, fps):
+        items.append(item)
+        if len(items) == batch:
+            flush(items)
+            items = []
+        now = time.time()
+        if now - last_report >= progress_seconds:
+            last_report = now
+            rate = totals["frames"] / (now - started)
+            print(f"[REANALYZE] {totals['frames']} frames | {rate:.1f} fps | {totals['events']} events | {item[0]}", file=sys.stderr)
+    if items:
+        flush(items)
+
+    totals["seconds"] = round(time.time() - started, 2)
+    totals["fps"] = round(totals["frames"] / totals["seconds"], 2) if totals["seconds"] else 0.0
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.reanalyze", description="Re-score archived images and recordings without touching the live archive.")
+    parser.add_argument("sources", nargs="+", help="JPEG folders (e.g. data/events), JPEGs, MJPEG captures or video files; globs allowed")
+    parser.add_argument("--out", required=True, help="Results file: .csv, .parquet (needs pyarrow) or .db (sqlite table reanalysis_results)")
+    parser.add_argument("--weights", help="Weapon model checkpoint to evaluate (default: MODEL_PATH_PRIMARY)")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, help="Inference backend (torch, onnx, openvino, stub)")
+    parser.add_argument("--workers", type=int, default=0, help="Inference worker processes (0 = in-process)")
+    parser.add_argument("--batch", type=int, default=8, help="Frames per detect_batch call")
+    parser.add_argument("--prefetch", type=int, default=64, help="Frames decoded ahead of inference")
+    parser.add_argument("--decode-threads", type=int, default=4, help="Parallel JPEG decoders")
+    parser.add_argument("--boxes", action="store_true", help="Include every box as JSON in the results")
+    parser.add_argument("--temporal-images", action="store_true", help="Treat a JPEG folder as one sequence (voting/tracking across images)")
+    parser.add_argument("--fps", type=float, default=10.0, help="Frame rate assumed for raw MJPEG captures (media time of cooldowns and group dwell)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's console output")
+    args = parser.parse_args(argv)
+
+    paths = expand_sources(args.sources)
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"[REANALYZE] run {run_id}: {len(paths)} sources -> {args.out}", file=sys.stderr)
+
+    if args.workers > 0:
+        from .workers import InferencePool
+        detector = InferencePool(args.workers, max(INFERENCE_RING_SLOTS, args.batch), INFERENCE_RING_SLOT_BYTES, args.backend, args.weights)
+    else:
+        detector = DetectionSystem(args.backend, args.weights)
+
+    results = open_results(args.out, run_id)
+    try:
+        with contextlib.nullcontext() if args.verbose else open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull or sys.stdout):
+            totals = analyze(paths, detector, results, args.batch, args.prefetch, args.decode_threads,
+                             not args.temporal_images, args.boxes, fps=args.fps)
+    finally:
+        results.close()
+        if args.workers > 0:
+            detector.close()
+
+    print(f"[REANALYZE] DONE: {totals['frames']} frames in {totals['seconds']}s ({totals['fps']} fps), "
+          f"{totals['weapon_frames']} with weapons, {totals['events']} would-be events -> {args.out}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import collections
+import os
+import re
+import threading
+import time
+
+from .config import INFERENCE_BACKEND, MODEL_REGISTRY_DIR, MODEL_SHADOW_SAMPLE_EVERY, MODEL_SHADOW_QUEUE_SIZE
+from .postprocess import class_mask
+
+# Tactical Whitelists
+WEAPON_KEYWORDS = [
+    'gun', 'pistol', 'rifle', 'handgun', 'firearm',
+    'knife', 'dagger', 'machete', 'sword',
+    'bat', 'baseball bat', 'hockey stick', 'stick', 'weapon', 'club', 'spear'
+]
+
+# Stock ultralytics checkpoints (downloaded by name on first use, like the default yolov8m.pt)
+_STOCK_WEIGHTS = re.compile(r"^yolo[\w.-]*\.pt$")
+
+def resolve_weights(weights, backend=INFERENCE_BACKEND):
+    """Path of a weights file under MODEL_REGISTRY_DIR, or a stock ultralytics name.
+
+    Checkpoints are pickles, so weights named through the API never load from anywhere else.
+    """
+    if _STOCK_WEIGHTS.match(weights):
+        return weights
+    path = os.path.abspath(os.path.join(MODEL_REGISTRY_DIR, weights))
+    if os.path.commonpath([path, MODEL_REGISTRY_DIR]) != MODEL_REGISTRY_DIR:
+        raise ValueError(f"{weights} is outside {MODEL_REGISTRY_DIR}")
+    if backend != "stub" and not os.path.isfile(path):
+        raise ValueError(f"{weights} not found in {MODEL_REGISTRY_DIR}")
+    return path
+
+def model_labels(model_gen, model_weapons):
+    """(general, specialist) checkpoint names for the HUD."""
+    m_gen = os.path.basename(model_gen.ckpt_path) if getattr(model_gen, 'ckpt_path', None) else "yolov8m"
+    m_spec = os.path.basename(model_weapons.ckpt_path) if getattr(model_weapons, 'ckpt_path', None) else "custom"
+    return m_gen, m_spec
+
+class ModelVersion:
+    """One (weapon, general) model pair and the class maps the hot path derives from it.
+
+    bind() sets every field on a detector in one go. The API process of an InferencePool
+    holds versions without models (class names and labels only).
+    """
+    FIELDS = (
+        "model_weapons", "model_gen", "shared_model", "weapon_class_names", "gen_class_names", "class_names",
+        "weapon_ids_gen", "person_ids_gen", "weapon_ids_spec", "person_ids_spec",
+        "weapon_mask_spec", "person_mask_spec", "weapon_mask_gen", "person_mask_gen",
+    )
+
+    def __init__(self, name, weapon_class_names, gen_class_names, model_weapons=None, model_gen=None, weights=(None, None), labels=None):
+        self.name = name
+        self.model_weapons = model_weapons
+        self.model_gen = model_gen
+        # Identical-model fallback: one pass serves both heads
+        self.shared_model = model_weapons is not None and model_weapons is model_gen
+        self.weights = weights # (spec, gen) as requested; None = startup defaults
+        self.labels = labels or (model_labels(model_gen, model_weapons) if model_gen is not None else None)
+        self.loaded_at = time.time()
+        self.load_seconds = None
+
+        self.weapon_class_names = weapon_class_names
+        self.gen_class_names = gen_class_names
+
+        # Map IDs across models
+        self.weapon_ids_gen = [id for id, name in gen_class_names.items() if any(k in name.lower() for k in WEAPON_KEYWORDS)]
+        self.person_ids_gen = [id for id, name in gen_class_names.items() if 'person' in name.lower()]
+
+        self.weapon_ids_spec = [id for id, name in weapon_class_names.items() if any(k in name.lower() for k in WEAPON_KEYWORDS)]
+        self.person_ids_spec = [id for id, name in weapon_class_names.items() if 'person' in name.lower()]
+
+        # Precomputed boolean class masks (class id -> role) for vectorized filtering
+        is_weapon_name = lambda name: any(k in name for k in WEAPON_KEYWORDS)
+        is_person_name = lambda name: 'person' in name
+        self.weapon_mask_spec = class_mask(weapon_class_names, is_weapon_name)
+        self.person_mask_spec = class_mask(weapon_class_names, is_person_name)
+        self.weapon_mask_gen = class_mask(gen_class_names, is_weapon_name)
+        self.person_mask_gen = class_mask(gen_class_names, is_person_name)
+        self.class_names = (weapon_class_names, gen_class_names) # Indexed by SOURCE_SPEC / SOURCE_GEN
+
+    def bind(self, target):
+        for field in self.FIELDS:
+            setattr(target, field, getattr(self, field))
+
+    def info(self):
+        m_gen, m_spec = self.labels or (None, None)
+        return {
+            "general": m_gen,
+            "specialist": m_spec,
+            "weights": {"spec": self.weights[0], "gen": self.weights[1]},
+            "shared": self.shared_model,
+            "sensors": {
+                "general": {"persons": len(self.person_ids_gen), "weapons": len(self.weapon_ids_gen)},
+                "spec": {"persons": len(self.person_ids_spec), "weapons": len(self.weapon_ids_spec)},
+            },
+            "loaded_at": round(self.loaded_at, 1),
+            "load_seconds": self.load_seconds,
+        }
+
+class ShadowComparison:
+    """Detection counts and latency of a candidate version next to the live one, on the same sampled batches."""
+    def __init__(self, candidate, live):
+        self.candidate = candidate
+        self.live = live
+        self.started = time.time()
+        self.batches = 0
+        self.frames = 0
+        self.persons = [0, 0] # live, candidate
+        self.weapons = [0, 0]
+        self.weapon_disagreements = 0 # Frames where only one of the two versions sees a weapon
+        self.seconds = [0.0, 0.0]
+        self._lock = threading.Lock()
+
+    def add(self, live, candidate, live_seconds, candidate_seconds):
+        """`live` / `candidate`: detect_batch results for the same frames."""
+        with self._lock:
+            self.batches += 1
+            self.seconds[0] += live_seconds
+            self.seconds[1] += candidate_seconds
+            for (a, _), (b, _) in zip(live, candidate):
+                self.frames += 1
+                weapons_a, weapons_b = int(a.is_weapon.sum()), int(b.is_weapon.sum())
+                self.persons[0] += int(a.is_person.sum())
+                self.persons[1] += int(b.is_person.sum())
+                self.weapons[0] += weapons_a
+                self.weapons[1] += weapons_b
+                self.weapon_disagreements += (weapons_a > 0) != (weapons_b > 0)
+
+    def report(self):
+        with self._lock:
+            frames = max(1, self.frames)
+            batches = max(1, self.batches)
+            return {
+                "candidate": self.candidate,
+                "live": self.live,
+                "since": round(self.started, 1),
+                "batches": self.batches,
+                "frames": self.frames,
+                "persons_per_frame": {"live": round(self.persons[0] / frames, 2), "candidate": round(self.persons[1] / frames, 2)},
+                "weapons_per_frame": {"live": round(self.weapons[0] / frames, 2), "candidate": round(self.weapons[1] / frames, 2)},
+                "weapon_disagreement_rate": round(self.weapon_disagreements / frames, 3),
+                "detect_ms": {"live": round(self.seconds[0] * 1000 / batches, 1), "candidate": round(self.seconds[1] * 1000 / batches, 1)},
+            }
+
+class ShadowRunner:
+    """Runs shadow comparisons on their own thread, so the live pipeline never waits for a candidate.
+
+    Sampled batches queue up to `maxsize` deep; when the candidate falls behind, the oldest
+    waiting batch is dropped (and counted) instead of delaying newer ones.
+    """
+    def __init__(self, run, maxsize=MODEL_SHADOW_QUEUE_SIZE):
+        self.run = run # Callable(*job)
+        self.pending = collections.deque(maxlen=maxsize)
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, *job):
+        with self._cond:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(job)
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="model-shadow")
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+                job = self.pending.popleft()
+            try:
+                self.run(*job)
+            except Exception as e:
+                print(f"[MODELS] SHADOW RUN FAILED: {e}")
+
+    def stats(self):
+        return {"pending": len(self.pending), "dropped": self.dropped}
+
+class ModelRegistry:
+    """Model versions of one detector.
+
+    load() builds a version in the background (weights, warm-up, class masks) while the
+    active one keeps serving; promote() swaps it in between two batches. A shadowed
+    candidate also runs on every MODEL_SHADOW_SAMPLE_EVERY-th batch (on the ShadowRunner
+    thread), so its detection counts and latency can be compared before promotion.
+    Promotion keeps the previous version loaded for rollback and unloads the rest.
+    """
+    def __init__(self, detector, active, shadow_every=MODEL_SHADOW_SAMPLE_EVERY):
+        self.detector = detector
+        self.versions = {active.name: active}
+        self.active = active.name
+        self.previous = None
+        self.loading = {} # name -> load start time
+        self.errors = {}  # name -> why its last load failed
+        self.shadow = None # ShadowComparison of the candidate being shadowed
+        self.last_shadow = None # Final report of the last comparison that ended in a promotion
+        self.shadow_every = shadow_every
+        self.promotions = 0
+        self.on_promote = None # Optional callable(version), e.g. relabels the HUD
+        self.shadow_runner = ShadowRunner(detector.compare_shadow)
+        self._batches = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        return self.versions[self.active]
+
+    def load(self, name, spec_weights, gen_weights=None, shadow=False, background=True):
+        """Loads a new version next to the active one. `gen_weights=None` keeps the active general model.
+
+        Returns immediately when `background`, else the loaded version (None on failure, see `errors`).
+        """
+        with self._lock:
+            if name in self.versions or name in self.loading:
+                raise ValueError(f"Model version {name} already exists")
+            self.loading[name] = time.time()
+            self.errors.pop(name, None)
+            if gen_weights is None:
+                gen_weights = self.versions[self.active].weights[1]
+        if background:
+            threading.Thread(target=self._load, args=(name, spec_weights, gen_weights, shadow), daemon=True, name="model-load").start()
+            return None
+        return self._load(name, spec_weights, gen_weights, shadow)
+
+    def _load(self, name, spec_weights, gen_weights, shadow):
+        t0 = time.time()
+        try:
+            version = self.detector.load_version(name, spec_weights, gen_weights)
+        except Exception as e:
+            with self._lock:
+                self.loading.pop(name, None)
+                self.errors[name] = repr(e)
+            print(f"[MODELS] LOAD FAILED {name}: {e}")
+            return None
+        version.load_seconds = round(time.time() - t0, 1)
+        with self._lock:
+            self.loading.pop(name, None)
+            self.versions[name] = version
+            if shadow:
+                self.shadow = ShadowComparison(name, self.active)
+        print(f"[MODELS] VERSION READY: {name} {version.labels} in {version.load_seconds}s{' (shadowing)' if shadow else ''}")
+        return version
+
+    def promote(self, name):
+        """Makes a loaded version the live one. Returns it; KeyError when it is not loaded."""
+        with self._lock:
+            version = self.versions[name]
+            if name == self.active:
+                return version
+        self.detector.activate(version) # Lands between two batches
+        with self._lock:
+            self.previous, self.active = self.active, name
+            self.promotions += 1
+            if self.shadow is not None and self.shadow.candidate == name:
+                self.last_shadow = self.shadow.report()
+                self.shadow = None
+            keep = {self.active, self.previous, self.shadow.candidate if self.shadow else None}
+            stale = [n for n in self.versions if n not in keep]
+        for n in stale:
+            self.unload(n)
+        print(f"[MODELS] PROMOTED {name} {version.labels} (previous: {self.previous})")
+        if self.on_promote is not None:
+            self.on_promote(version)
+        return version
+
+    def rollback(self):
+        if self.previous is None:
+            raise KeyError("No previous model version")
+        return self.promote(self.previous)
+
+    def unload(self, name):
+        """Drops a loaded version (never the active one)."""
+        with self._lock:
+            if name == self.active:
+                raise ValueError(f"Model version {name} is active")
+            version = self.versions.pop(name)
+            if self.previous == name:
+                self.previous = None
+            if self.shadow is not None and self.shadow.candidate == name:
+                self.shadow = None
+        self.detector.release_version(version)
+
+    def start_shadow(self, name):
+        """(Re)starts comparing a loaded version against the live one."""
+        with self._lock:
+            if name not in self.versions:
+                raise KeyError(name)
+            if name == self.active:
+                raise ValueError(f"Model version {name} is active")
+            self.shadow = ShadowComparison(name, self.active)
+            return self.shadow
+
+    def stop_shadow(self):
+        with self._lock:
+            shadow, self.shadow = self.shadow, None
+        return shadow.report() if shadow else None
+
+    def shadow_candidate(self):
+        """Version to run in shadow on this batch (every `shadow_every`-th one), or None."""
+        shadow = self.shadow
+        if shadow is None:
+            return None
+        self._batches += 1
+        if self._batches % self.shadow_every:
+            return None
+        return self.versions.get(shadow.candidate)
+
+    def record_shadow(self, candidate, live, results, live_seconds, seconds):
+        shadow = self.shadow
+        if shadow is not None and shadow.candidate == candidate.name:
+            shadow.add(live, results, live_seconds, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "previous": self.previous,
+                "versions": {name: version.info() for name, version in self.versions.items()},
+                "loading": {name: round(time.time() - started, 1) for name, started in self.loading.items()},
+                "errors": dict(self.errors),
+                "promotions": self.promotions,
+                "shadow": self.shadow.report() if self.shadow else None,
+                "shadow_queue": self.shadow_runner.stats(),
+                "last_shadow": self.last_shadow,
+            }
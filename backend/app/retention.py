@@ -0,0 +1,189 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .config import (
+    RETENTION_MAX_COUNT, RETENTION_MAX_AGE_DAYS, RETENTION_MAX_BYTES, RETENTION_TYPE_QUOTAS,
+    RETENTION_INTERVAL_SECONDS, RETENTION_BATCH_SIZE, RETENTION_RESYNC_SECONDS, RECONCILE_INTERVAL_SECONDS
+)
+from .db import (
+    oldest_events, delete_events, event_totals, backfill_disk_bytes, clip_owners, move_event_bytes, reconcile_missing_images
+)
+from .storage import event_disk_bytes, remove_event_files, clip_disk_bytes, remove_clip
+
+class DiskLedger:
+    """In-memory event count and disk usage per threat type, so policies never scan the table."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.bytes = {}
+
+    def add(self, event_type, nbytes, count=1):
+        with self._lock:
+            self.counts[event_type] = self.counts.get(event_type, 0) + count
+            self.bytes[event_type] = self.bytes.get(event_type, 0) + (nbytes or 0)
+
+    def remove(self, event_type, nbytes, count=1):
+        with self._lock:
+            self.counts[event_type] = max(0, self.counts.get(event_type, 0) - count)
+            self.bytes[event_type] = max(0, self.bytes.get(event_type, 0) - (nbytes or 0))
+
+    def reset(self, totals):
+        with self._lock:
+            self.counts = {t: c for t, (c, _) in totals.items()}
+            self.bytes = {t: b for t, (_, b) in totals.items()}
+
+    @property
+    def total_count(self):
+        return sum(self.counts.values())
+
+    @property
+    def total_bytes(self):
+        return sum(self.bytes.values())
+
+    def snapshot(self):
+        with self._lock:
+            return {"count": sum(self.counts.values()), "bytes": sum(self.bytes.values()), "by_type": dict(self.counts)}
+
+class RetentionService:
+    """Scheduled archive compactor enforcing age, per-type, count and size budgets in batches."""
+    def __init__(self, ledger, max_count=RETENTION_MAX_COUNT, max_age_days=RETENTION_MAX_AGE_DAYS,
+                 max_bytes=RETENTION_MAX_BYTES, type_quotas=RETENTION_TYPE_QUOTAS,
+                 interval=RETENTION_INTERVAL_SECONDS, batch_size=RETENTION_BATCH_SIZE):
+        self.ledger = ledger
+        self.max_count = max_count
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.type_quotas = type_quotas
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deleted = 0
+        self.last_run = None
+        self.on_purge = None # Optional callable(event ids), e.g. closes the event writer's open incidents
+        self._last_resync = 0
+        self._last_reconcile = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="retention")
+            self._thread.start()
+
+    def resync(self):
+        """Rebuilds the ledger from the DB (startup, and periodically to absorb external deletes)."""
+        backfill_disk_bytes(event_disk_bytes)
+        self.ledger.reset(event_totals())
+        self._last_resync = time.time()
+
+    def reconcile(self):
+        """Purges rows whose snapshot vanished like any other, releasing their ledger bytes, frames and clips."""
+        deleted = reconcile_missing_images(self._purge, self.batch_size)
+        self.deleted += deleted
+        self._last_reconcile = time.time()
+        return deleted
+
+    def run_once(self):
+        deleted = 0
+
+        # 1. Max age
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            while True:
+                rows = oldest_events(self.batch_size, older_than=cutoff)
+                if not rows:
+                    break
+                deleted += self._purge(rows)
+
+        # 2. Per-threat-type quotas
+        for event_type, quota in self.type_quotas.items():
+            while self.ledger.counts.get(event_type, 0) > quota:
+                excess = self.ledger.counts[event_type] - quota
+                rows = oldest_events(min(excess, self.batch_size), event_type=event_type)
+                if not rows:
+                    break
+                deleted += self._purge(rows)
+
+        # 3. Max count
+        while self.max_count and self.ledger.total_count > self.max_count:
+            rows = oldest_events(min(self.ledger.total_count - self.max_count, self.batch_size))
+            if not rows:
+                break
+            deleted += self._purge(rows)
+
+        # 4. Max bytes on disk
+        while self.max_bytes and self.ledger.total_bytes > self.max_bytes:
+            rows = oldest_events(self.batch_size)
+            if not rows:
+                break
+            excess, take = self.ledger.total_bytes - self.max_bytes, 0
+            for take, row in enumerate(rows, start=1):
+                excess -= row["disk_bytes"] or 0
+                if excess <= 0:
+                    break
+            deleted += self._purge(rows[:take])
+
+        self.deleted += deleted
+        self.last_run = time.time()
+        if deleted:
+            print(f"[RETENTION] Purged {deleted} events ({self.ledger.total_count} kept, {self.ledger.total_bytes / 1e6:.1f} MB)")
+        return deleted
+
+    def stats(self):
+        return {
+            **self.ledger.snapshot(),
+            "deleted": self.deleted,
+            "last_run": self.last_run,
+            "policy": {
+                "max_count": self.max_count,
+                "max_age_days": self.max_age_days,
+                "max_bytes": self.max_bytes,
+                "type_quotas": self.type_quotas,
+            },
+        }
+
+    def _purge(self, rows):
+        event_ids = [row["id"] for row in rows]
+        delete_events(event_ids)
+        if self.on_purge is not None:
+            self.on_purge(event_ids)
+        clips = {}  # clip_path -> oldest purged event linking it
+        for row in rows:
+            remove_event_files(row["image_path"])
+            self.ledger.remove(row["type"], row["disk_bytes"])
+            if row.get("clip_path"):
+                clips[row["clip_path"]] = min(row["id"], clips.get(row["clip_path"], row["id"]))
+        self._release_clips(clips)
+        return len(rows)
+
+    def _release_clips(self, clips):
+        """Deletes clips no remaining event links.
+
+        A shared clip is charged to the oldest event linking it; when that one is purged,
+        its bytes move to the oldest event still linking the clip.
+        """
+        owners = clip_owners(list(clips))
+        for clip_path, purged_id in clips.items():
+            owner = owners.get(clip_path)
+            if owner is None:
+                remove_clip(clip_path)
+            elif purged_id < owner[0]:
+                nbytes = clip_disk_bytes(clip_path)
+                if nbytes:
+                    move_event_bytes(owner[0], nbytes)
+                    self.ledger.add(owner[1], nbytes, count=0)
+
+    def _run(self):
+        while True:
+            try:
+                if time.time() - self._last_resync >= RETENTION_RESYNC_SECONDS:
+                    self.resync()
+                if time.time() - self._last_reconcile >= RECONCILE_INTERVAL_SECONDS:
+                    self.reconcile()
+                self.run_once()
+            except Exception as e:
+                print(f"[RETENTION] Sweep failed: {e}")
+            time.sleep(self.interval)
+
+# Process-wide ledger (fed by the event writer) and compactor
+disk_ledger = DiskLedger()
+retention_service = RetentionService(disk_ledger)
@@ -0,0 +1,159 @@
+"""Offline frame sources: recorded MJPEG captures, video files and JPEG folders (e.g. data/events)."""
+import glob
+import os
+import re
+import time
+from datetime import datetime
+
+import cv2
+
+from .mjpeg import read_parts
+
+MJPEG_EXTENSIONS = (".mjpeg", ".mjpg")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+SNAPSHOT_TIME = re.compile(r"^(\d{8}_\d{6})") # Archive names start with the event time (see storage.event_filename)
+
+def iter_jpeg_stream(path):
+    """JPEG bytes from a recorded stream: a multipart capture (`curl .../stream > cap.mjpeg`)
+    or raw concatenated JPEGs (`ffmpeg -f mjpeg`)."""
+    with open(path, "rb") as f:
+        head = f.read(2)
+        f.seek(0)
+        if head == b"\xff\xd8":
+            yield from _split_jpegs(f)
+            return
+        # Multipart capture: the first boundary line names the boundary
+        while True:
+            line = f.readline(1024)
+            if not line:
+                return
+            if line.strip().startswith(b"--"):
+                boundary = line.strip()[2:]
+                f.seek(0)
+                yield from read_parts(f, boundary)
+                return
+
+def _jpeg_end(data, start):
+    """Index just past the EOI of the JPEG starting at `start`, or -1 while it is incomplete.
+
+    Walks the marker segments, skipping each payload by its length, so an EOI inside an
+    APPn segment (EXIF thumbnails) does not end the frame.
+    """
+    i, n = start + 2, len(data)
+    while i + 1 < n:
+        if data[i] != 0xFF:
+            # Corrupt segment chain: fall back to the first EOI
+            end = data.find(b"\xff\xd9", i)
+            return end + 2 if end >= 0 else -1
+        marker = data[i + 1]
+        if marker == 0xD9:
+            return i + 2
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2 if marker != 0xFF else 1 # Fill bytes and standalone markers carry no length
+            continue
+        if i + 3 >= n:
+            return -1
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+        if marker == 0xDA:
+            # Entropy-coded scan: runs to the first 0xFF that is not byte stuffing, a restart marker or fill
+            while True:
+                i = data.find(b"\xff", i)
+                if i < 0 or i + 1 >= n:
+                    return -1
+                following = data[i + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    i += 2
+                elif following == 0xFF:
+                    i += 1
+                else:
+                    break
+    return -1
+
+def _split_jpegs(f, chunk_size=1 << 20):
+    buffer = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if chunk:
+            buffer += chunk
+        pos = 0
+        while True:
+            start = buffer.find(b"\xff\xd8", pos)
+            if start < 0:
+                pos = max(pos, len(buffer) - 1) # Keep a trailing 0xFF that may open the next SOI
+                break
+            end = _jpeg_end(buffer, start)
+            if end < 0:
+                pos = start
+                break
+            yield buffer[start:end]
+            pos = end
+        buffer = buffer[pos:]
+        if not chunk:
+            return
+
+def _image_names(path):
+    return [name for name in sorted(os.listdir(path)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+def iter_image_dir(path):
+    """JPEG bytes of every image in a folder, in name (= timestamp for data/events) order."""
+    for name in _image_names(path):
+        with open(os.path.join(path, name), "rb") as f:
+            yield f.read()
+
+def _image_time(path):
+    match = SNAPSHOT_TIME.match(os.path.basename(path))
+    if match:
+        return time.mktime(datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timetuple())
+    return os.path.getmtime(path)
+
+def media_clock(path, fps):
+    """Returns index -> media time (seconds) for the frames of `open_source(path)`.
+
+    Video files use their container frame rate, images the time in their archive name
+    (else their mtime); raw MJPEG captures carry no timing and are assumed to run at `fps`.
+    """
+    if os.path.isdir(path):
+        times = [_image_time(os.path.join(path, name)) for name in _image_names(path)]
+        return lambda index: times[index]
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        when = _image_time(path)
+        return lambda index: when
+    if not path.lower().endswith(MJPEG_EXTENSIONS):
+        cap = cv2.VideoCapture(path)
+        rate = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        fps = rate if rate and rate > 0 else fps
+    return lambda index: index / fps
+
+def iter_video(path):
+    """Decoded BGR frames from any file OpenCV can open."""
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+def open_source(path):
+    """Returns (kind, iterator): kind "jpeg" yields JPEG bytes, kind "frame" yields decoded BGR frames."""
+    if os.path.isdir(path):
+        return "jpeg", iter_image_dir(path)
+    if path.lower().endswith(MJPEG_EXTENSIONS):
+        return "jpeg", iter_jpeg_stream(path)
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        return "jpeg", _single(path)
+    return "frame", iter_video(path)
+
+def _single(path):
+    with open(path, "rb") as f:
+        yield f.read()
+
+def expand_sources(patterns):
+    """Expands shell-style globs (quoted on the command line) into source paths."""
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return paths
@@ -0,0 +1,117 @@
+import numpy as np
+
+from .postprocess import box_centers
+
+def _cell_keys(cx, cy):
+    """One sortable int64 per grid cell (column in the high half, row in the low half)."""
+    return (cx.astype(np.int64) << 32) + cy.astype(np.int64)
+
+def _expand_ranges(lo, hi):
+    """For ranges [lo[i], hi[i]) returns (owner i, position) for every position, without a Python loop."""
+    counts = hi - lo
+    owners = np.repeat(np.arange(len(lo)), counts)
+    starts = np.repeat(lo - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return owners, starts + np.arange(counts.sum())
+
+def _components(n, a, b):
+    """Connected-component label per node for the undirected edges (a[k], b[k]).
+
+    Min-label propagation with pointer jumping: converges in a few vectorized passes.
+    """
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        merged = labels.copy()
+        np.minimum.at(merged, a, low)
+        np.minimum.at(merged, b, low)
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+class SpatialIndex:
+    """Uniform grid over one frame's person boxes, bucketed by center.
+
+    Built once per keyframe and shared by the threat rules: person-weapon association
+    and group detection only compare detections in neighbouring cells, so their cost
+    grows with the number of nearby pairs instead of persons x weapons or persons^2.
+    """
+    def __init__(self, xyxy, cell):
+        self.xyxy = xyxy
+        self.cell = float(cell)
+        self.centers = box_centers(xyxy)
+        self.cells = np.floor(self.centers / self.cell).astype(np.int64)
+        keys = _cell_keys(self.cells[:, 0], self.cells[:, 1])
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+        # Half-size of the largest box: how far from a box's own cell its edges can reach
+        self.half_extent = float(((xyxy[:, 2:] - xyxy[:, :2]).max(axis=0) / 2).max()) if len(xyxy) else 0.0
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def _candidates(self, query_cells, reach):
+        """(query row, person row) for every person whose cell is within `reach` cells of the query's."""
+        offsets = np.arange(-reach, reach + 1)
+        dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+        cx = (query_cells[:, None, 0] + dx.reshape(1, -1)).reshape(-1)
+        cy = (query_cells[:, None, 1] + dy.reshape(1, -1)).reshape(-1)
+        keys = _cell_keys(cx, cy)
+        lo = np.searchsorted(self.sorted_keys, keys, side="left")
+        hi = np.searchsorted(self.sorted_keys, keys, side="right")
+        owners, positions = _expand_ranges(lo, hi)
+        return owners // len(offsets) ** 2, self.order[positions]
+
+    def associate(self, points, margin):
+        """Single pass weapon->person pairing.
+
+        Returns (point rows, person rows) for every point (weapon center) lying inside a
+        person box expanded by `margin` pixels, sorted by point and then by distance to
+        the person's center, so the first pair of each point is its closest carrier.
+        """
+        if len(points) == 0 or len(self) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        reach = int(np.ceil((self.half_extent + margin) / self.cell))
+        query_cells = np.floor(points / self.cell).astype(np.int64)
+        w, p = self._candidates(query_cells, reach)
+        box = self.xyxy[p]
+        px, py = points[w, 0], points[w, 1]
+        inside = (
+            (px >= box[:, 0] - margin) & (px <= box[:, 2] + margin) &
+            (py >= box[:, 1] - margin) & (py <= box[:, 3] + margin)
+        )
+        w, p = w[inside], p[inside]
+        distance = np.linalg.norm(points[w] - self.centers[p], axis=1)
+        order = np.lexsort((distance, w))
+        return w[order], p[order]
+
+    def groups(self, distance, min_count):
+        """Every dense group of persons: DBSCAN over box centers (eps=`distance`, min_samples=`min_count`).
+
+        Separate crowds come out as separate groups. Returns a list of person-row arrays;
+        each group holds at least one person with `min_count` persons (itself included)
+        within `distance`.
+        """
+        n = len(self)
+        if n < min_count:
+            return []
+        a, b = self._candidates(self.cells, int(np.ceil(distance / self.cell)))
+        close = (a != b) & (np.linalg.norm(self.centers[a] - self.centers[b], axis=1) <= distance)
+        a, b = a[close], b[close]
+        # Core persons have min_count - 1 neighbours (plus themselves) within `distance`
+        core = np.bincount(a, minlength=n) + 1 >= min_count
+        if not core.any():
+            return []
+
+        # Cores chain into clusters; border persons join the cluster of a core neighbour
+        core_edge = core[a] & core[b]
+        labels = _components(n, a[core_edge], b[core_edge])
+        labels[~core] = -1
+        border = ~core[a] & core[b]
+        labels[a[border]] = labels[b[border]]
+
+        clustered = np.flatnonzero(labels >= 0)
+        order = clustered[np.argsort(labels[clustered], kind="stable")]
+        _, starts = np.unique(labels[order], return_index=True)
+        return np.split(order, starts[1:])
@@ -1,8 +1,89 @@
 import os
+import re
+from datetime import datetime
+
 import cv2
-from .config import SAVE_DIR
+from .config import SAVE_DIR, VARIANT_DIR, PERSIST_JPEG_QUALITY, IMAGE_VARIANTS, DEDUP_MAX_FRAMES
+
+def encode_snapshot(frame, quality=PERSIST_JPEG_QUALITY):
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+_THREAT_TYPE = re.compile(r"^[A-Z][A-Z_]*$")
+
+def event_filename(threat_type, camera_id=None, when=None):
+    """Snapshot filename of a new event: `<YYYYmmdd_HHMMSS>[_<camera>]_<THREAT_TYPE>.jpg`."""
+    if not _THREAT_TYPE.match(threat_type or ""):
+        raise ValueError(f"Invalid threat type {threat_type!r}")
+    timestamp_str = (when or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    # Camera id keeps simultaneous incidents from different cameras from sharing a filename
+    prefix = f"{timestamp_str}_{camera_id}" if camera_id else timestamp_str
+    filename = f"{prefix}_{threat_type}.jpg"
+    if os.path.basename(filename) != filename:
+        raise ValueError(f"Invalid snapshot name {filename!r}")
+    return filename
 
-def save_snapshot(frame, filename):
+def write_snapshot(data, filename):
     filepath = os.path.join(SAVE_DIR, filename)
-    cv2.imwrite(filepath, frame)
+    with open(filepath, "wb") as f:
+        f.write(data)
     return filepath
+
+def write_atomic(path, data):
+    """Writes through a temp file, so readers never see a partial file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def clip_name(image_path):
+    """Pre/post-event clip filename, derived from the snapshot name."""
+    return os.path.splitext(image_path)[0] + ".avi"
+
+def frame_name(image_path, index):
+    """Representative frame `index` (1, 2, ...) of a coalesced incident; 0 is the snapshot itself."""
+    if index == 0:
+        return image_path
+    stem, ext = os.path.splitext(image_path)
+    return f"{stem}.{index}{ext}"
+
+def variant_path(image_path, variant):
+    """Location of a downscaled copy of the snapshot (thumb, web)."""
+    return os.path.join(VARIANT_DIR, f"{os.path.splitext(image_path)[0]}.{variant}.jpg")
+
+def event_files(image_path):
+    """On-disk images of an archived event (snapshot, representative frames, their variants).
+
+    Clips are not included: several events can link the same clip (see ClipRecorder.request).
+    """
+    if not image_path:
+        return []
+    frames = [frame_name(image_path, index) for index in range(max(1, DEDUP_MAX_FRAMES))]
+    return [
+        *(os.path.join(SAVE_DIR, name) for name in frames),
+        *(variant_path(name, variant) for name in frames for variant in IMAGE_VARIANTS),
+    ]
+
+def event_disk_bytes(image_path):
+    return sum(os.path.getsize(p) for p in event_files(image_path) if os.path.exists(p))
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error deleting old event file {path}: {e}")
+
+def remove_event_files(image_path):
+    for path in event_files(image_path):
+        _remove(path)
+
+def clip_disk_bytes(clip_path):
+    path = os.path.join(SAVE_DIR, clip_path)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def remove_clip(clip_path):
+    _remove(os.path.join(SAVE_DIR, clip_path))
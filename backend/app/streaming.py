@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import cv2
+
+from .config import VIDEO_MAX_FPS, VIDEO_QUALITY_LEVELS, VIDEO_DEFAULT_QUALITY, VIDEO_ENCODE_QUALITY
+
+BOUNDARY = "frame"
+
+def snap_quality(quality):
+    """Maps a requested JPEG quality onto the shared levels so viewers can reuse each other's encodes."""
+    if quality is None:
+        return None
+    return min(VIDEO_QUALITY_LEVELS, key=lambda level: abs(level - quality))
+
+def mjpeg_part(data):
+    return (b'--' + BOUNDARY.encode() + b'\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + data + b'\r\n')
+
+class FrameBroadcaster:
+    """Encode-once MJPEG fan-out for one camera.
+
+    Viewers without a quality cap get the camera's own JPEG bytes relayed untouched.
+    Otherwise each new frame is decoded once and JPEG-encoded at most once per quality
+    level no matter how many viewers are connected. Viewers await the next sequence number on the event loop
+    and always jump to the newest frame, so slow clients drop frames instead of queueing.
+    """
+    def __init__(self, camera):
+        self.camera = camera
+        self.viewers = 0
+        self.encodes = 0
+        self.relayed = 0 # Frames sent as the camera's original bytes
+        self._lock = threading.Lock()
+        self._cache_seq = -1
+        self._cache = {} # quality -> jpeg bytes for _cache_seq
+        self._loop = None
+        self._new_frame = None
+
+    def bind(self, loop):
+        """Attaches the broadcaster to the server's event loop (called on startup)."""
+        self._loop = loop
+        self._new_frame = asyncio.Event()
+
+    def notify(self):
+        """Fetcher-thread hook: wakes waiting viewers for the new frame."""
+        if self._loop is not None and self.viewers:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Swap in a fresh event so every waiter of the old one resumes exactly once
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+
+    def encoded(self, quality):
+        """Returns (seq, jpeg bytes) for the latest frame, encoding only on the first request per quality."""
+        packet = self.camera.packet
+        seq = packet.seq
+        if quality is None:
+            if packet.jpeg is not None:
+                self.relayed += 1
+                return seq, packet.jpeg # Passthrough: no decode, no encode
+            quality = VIDEO_ENCODE_QUALITY
+        with self._lock:
+            if seq != self._cache_seq:
+                self._cache_seq = seq
+                self._cache = {}
+            data = self._cache.get(quality)
+            if data is None:
+                frame, _ = self.camera.decode(packet)
+                if frame is None:
+                    return seq, None
+                ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if not ok:
+                    return seq, None
+                data = self._cache[quality] = buffer.tobytes()
+                self.encodes += 1
+        return seq, data
+
+    async def _wait_for_frame(self, timeout=1.0):
+        if self._new_frame is None:
+            await asyncio.sleep(0.05)
+            return
+        try:
+            await asyncio.wait_for(self._new_frame.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def stream(self, max_fps=VIDEO_MAX_FPS, quality=VIDEO_DEFAULT_QUALITY):
+        """Async multipart generator for one viewer with its own FPS and quality caps."""
+        loop = asyncio.get_running_loop()
+        min_interval = 1.0 / max(0.1, min(max_fps, VIDEO_MAX_FPS))
+        quality = snap_quality(quality)
+        last_seq = -1
+        next_send = 0.0
+
+        self.viewers += 1
+        try:
+            while True:
+                if self.camera.frame_seq == last_seq or not self.camera.has_frame():
+                    await self._wait_for_frame()
+                    continue
+
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                if quality is None and self.camera.packet.jpeg is not None:
+                    seq, data = self.encoded(None) # Relaying bytes needs no worker thread
+                else:
+                    seq, data = await asyncio.to_thread(self.encoded, quality)
+                if data is None:
+                    # Undecodable frame: skip it and wait for the next one instead of retrying it
+                    last_seq = seq
+                    await self._wait_for_frame()
+                    continue
+                last_seq = seq
+                next_send = loop.time() + min_interval
+                yield mjpeg_part(data)
+        finally:
+            self.viewers -= 1
+
+    def stats(self):
+        return {"viewers": self.viewers, "encodes": self.encodes, "relayed": self.relayed}
@@ -0,0 +1,173 @@
+from collections import deque
+
+import numpy as np
+
+from .config import (
+    TRACK_IOU_THRESH, TRACK_MAX_MISSES, TRACK_ASSOCIATION_MEMORY, STATIC_MOTION_PX
+)
+from .postprocess import Detections, iou_matrix
+
+# Constant-velocity model over (cx, cy, w, h); one step per processing tick
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001, 0.0001])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4, 1e4])
+
+def _xyxy_to_z(xyxy):
+    return np.array([(xyxy[0] + xyxy[2]) / 2, (xyxy[1] + xyxy[3]) / 2, xyxy[2] - xyxy[0], xyxy[3] - xyxy[1]])
+
+class Track:
+    """SORT-style track: Kalman-filtered box plus the history used by the threat rules."""
+    def __init__(self, track_id, dets, row):
+        self.id = track_id
+        self.is_weapon = bool(dets.is_weapon[row])
+        self.x = np.zeros(8)
+        self.x[:4] = _xyxy_to_z(dets.xyxy[row])
+        self.P = _P0.copy()
+        self.hits = 1
+        self.misses = 0           # Consecutive keyframes without a matching detection
+        self.suppressed = False   # Static noise: hidden from HUD and alerting
+        self.anchor = self.x[:2].copy()
+        self.static_updates = 0   # Keyframes spent within STATIC_MOTION_PX of the anchor
+        self.handled = deque(maxlen=TRACK_ASSOCIATION_MEMORY)
+        self.carrier_id = None    # Person track most recently associated with this weapon
+        self._copy_row(dets, row)
+
+    def _copy_row(self, dets, row):
+        self.conf = float(dets.conf[row])
+        self.cls = int(dets.cls[row])
+        self.source = int(dets.source[row])
+        self.is_person = bool(dets.is_person[row])
+
+    def predict(self):
+        self.x = _F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = _F @ self.P @ _F.T + _Q
+
+    def update(self, dets, row):
+        z = _xyxy_to_z(dets.xyxy[row])
+        S = _H @ self.P @ _H.T + _R
+        K = self.P @ _H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - _H @ self.x)
+        self.P = (np.eye(8) - K @ _H) @ self.P
+        self.hits += 1
+        self.misses = 0
+        self._copy_row(dets, row)
+
+        # Static bookkeeping on the measured (not filtered) center
+        if np.linalg.norm(z[:2] - self.anchor) > STATIC_MOTION_PX:
+            self.anchor = z[:2].copy()
+            self.static_updates = 0
+        else:
+            self.static_updates += 1
+
+    def observe_handling(self, person_track_ids):
+        """Records whether a person track was near this weapon on the current keyframe."""
+        self.handled.append(len(person_track_ids) > 0)
+        if len(person_track_ids):
+            self.carrier_id = int(person_track_ids[0])
+
+    def is_handled(self):
+        return any(self.handled)
+
+    def xyxy(self):
+        cx, cy, w, h = self.x[:4]
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+class Tracker:
+    """IoU + Kalman multi-object tracker (persons and weapons tracked separately)."""
+    def __init__(self, iou_thresh=TRACK_IOU_THRESH, max_misses=TRACK_MAX_MISSES):
+        self.iou_thresh = iou_thresh
+        self.max_misses = max_misses
+        self.tracks = {}
+        self.next_id = 1
+        self.names = ({}, {})
+
+    def update(self, dets):
+        """Keyframe step: predicts, associates `dets` to tracks and returns a track id per row.
+
+        Rows that already carry a track id are held track estimates (see held_persons): they
+        keep their id but are no evidence, so their track only predicts (no hits, no
+        correction, misses unchanged) and they never start a track.
+        """
+        self.names = dets.names
+        for track in self.tracks.values():
+            track.predict()
+
+        held = dets.track_id >= 0
+        track_ids = np.full(len(dets), -1, dtype=np.int32)
+        for row in np.flatnonzero(held):
+            if int(dets.track_id[row]) in self.tracks:
+                track_ids[row] = dets.track_id[row]
+        coasting = set(track_ids[held].tolist())
+        tracks = [t for t in self.tracks.values() if t.id not in coasting]
+
+        if tracks and len(dets):
+            track_xyxy = np.array([t.xyxy() for t in tracks], dtype=np.float32)
+            iou = iou_matrix(dets.xyxy, track_xyxy)
+            iou[held] = 0
+            # Never match a person detection to a weapon track (or vice versa)
+            iou[dets.is_weapon[:, None] != np.array([t.is_weapon for t in tracks])[None, :]] = 0
+
+            # Greedy highest-IoU-first assignment
+            while True:
+                r, c = np.unravel_index(iou.argmax(), iou.shape)
+                if iou[r, c] < self.iou_thresh:
+                    break
+                tracks[c].update(dets, r)
+                track_ids[r] = tracks[c].id
+                iou[r, :] = 0
+                iou[:, c] = 0
+
+        matched = set(track_ids.tolist())
+        for track in tracks:
+            if track.id not in matched:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    del self.tracks[track.id]
+
+        for row in np.flatnonzero((track_ids < 0) & ~held):
+            track = Track(self.next_id, dets, row)
+            self.tracks[track.id] = track
+            track_ids[row] = track.id
+            self.next_id += 1
+        return track_ids
+
+    def predict(self):
+        """In-between step: advances every track and returns the boxes to show without running the models."""
+        visible = []
+        for track in self.tracks.values():
+            track.predict()
+            if track.misses == 0 and not track.suppressed:
+                visible.append(track)
+        return self._as_detections(visible)
+
+    def held_persons(self):
+        """Person tracks seen on the last keyframe, as detections at their current estimate.
+
+        Stands in for the general model on batches the latency governor skips it. The rows
+        carry their track ids, so update() recognizes them and does not count them as hits.
+        """
+        return self._as_detections([t for t in self.tracks.values() if t.is_person and t.misses == 0])
+
+    def _as_detections(self, tracks):
+        if not tracks:
+            return Detections.empty(self.names)
+        return Detections(
+            np.array([t.xyxy() for t in tracks], dtype=np.float32),
+            np.array([t.conf for t in tracks], dtype=np.float32),
+            np.array([t.cls for t in tracks], dtype=np.int32),
+            np.array([t.source for t in tracks], dtype=np.uint8),
+            np.array([t.is_person for t in tracks], dtype=bool),
+            np.array([t.is_weapon for t in tracks], dtype=bool),
+            self.names,
+            np.array([t.id for t in tracks], dtype=np.int32),
+        )
+
+    def get(self, track_id):
+        return self.tracks.get(track_id)
+
+    def __len__(self):
+        return len(self.tracks)
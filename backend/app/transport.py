@@ -0,0 +1,159 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import struct
+import threading
+
+from .config import DIST_SECRET, DIST_HANDSHAKE_TIMEOUT_SECONDS
+
+# Frame: >II (header length, payload length), JSON header, raw payload bytes (JPEGs travel unencoded)
+_PREFIX = struct.Struct(">II")
+_HANDSHAKE_MAX_BYTES = 4096
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class HandshakeError(Exception):
+    pass
+
+class Connection:
+    """One message-framed, thread-safe-to-send TCP connection."""
+    def __init__(self, sock, peer=None):
+        self.sock = sock
+        self.peer = peer
+        self._rfile = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+        self.max_message = None # Bytes; set while the peer is not authenticated yet
+
+    def send(self, header, payload=b""):
+        data = json.dumps(header, separators=(",", ":")).encode()
+        with self._send_lock:
+            self.sock.sendall(_PREFIX.pack(len(data), len(payload)) + data + payload)
+
+    def recv(self):
+        """Returns (header, payload), or None once the peer closed the connection."""
+        prefix = self._rfile.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            return None
+        header_len, payload_len = _PREFIX.unpack(prefix)
+        if self.max_message is not None and header_len + payload_len > self.max_message:
+            raise ValueError(f"message of {header_len + payload_len} bytes exceeds {self.max_message}")
+        header = self._rfile.read(header_len)
+        payload = self._rfile.read(payload_len) if payload_len else b""
+        if len(header) < header_len or len(payload) < payload_len:
+            return None
+        return json.loads(header), payload
+
+    def settimeout(self, seconds):
+        self.sock.settimeout(seconds)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class TcpTransport:
+    """Plain TCP broker-less transport: the coordinator listens, inference nodes dial in.
+
+    Every connection starts with a mutual challenge-response on the shared secret
+    (HMAC-SHA256 over fresh nonces), so only nodes holding it can talk to the
+    coordinator and nodes only take assignments from a coordinator holding it.
+    """
+    def __init__(self, secret=DIST_SECRET, handshake_timeout=DIST_HANDSHAKE_TIMEOUT_SECONDS):
+        self.secret = secret.encode()
+        self.handshake_timeout = handshake_timeout
+        self.rejected = 0
+
+    def _digest(self, role, nonce):
+        return hmac.new(self.secret, role + bytes.fromhex(nonce), hashlib.sha256).hexdigest()
+
+    def _check(self, expected, received):
+        if not isinstance(received, str) or not hmac.compare_digest(expected, received):
+            raise HandshakeError("shared secret mismatch")
+
+    def _accept(self, conn):
+        """Coordinator side of the handshake."""
+        nonce = os.urandom(16).hex()
+        conn.send({"type": "challenge", "nonce": nonce})
+        message = conn.recv()
+        if message is None or message[0].get("type") != "auth":
+            raise HandshakeError("no auth reply")
+        header = message[0]
+        self._check(self._digest(b"node", nonce), header.get("digest"))
+        conn.send({"type": "welcome", "digest": self._digest(b"coordinator", str(header.get("nonce")))})
+
+    def _dial(self, conn):
+        """Node side of the handshake."""
+        message = conn.recv()
+        if message is None or message[0].get("type") != "challenge":
+            raise HandshakeError("no challenge")
+        nonce = os.urandom(16).hex()
+        conn.send({"type": "auth", "digest": self._digest(b"node", str(message[0].get("nonce"))), "nonce": nonce})
+        message = conn.recv()
+        if message is None or message[0].get("type") != "welcome":
+            raise HandshakeError("rejected by coordinator")
+        self._check(self._digest(b"coordinator", nonce), message[0].get("digest"))
+
+    def listen(self, address, on_connection):
+        """Accepts connections on a daemon thread; `on_connection(conn)` runs on its own thread per authenticated peer."""
+        host, port = parse_address(address)
+        if not self.secret and not is_loopback(host):
+            raise ValueError(f"Refusing to listen on {address} without a shared secret (set HAWKEYE_SECRET)")
+        server = socket.create_server((host, port), reuse_port=False)
+
+        def serve(sock, peer):
+            conn = Connection(sock, f"{peer[0]}:{peer[1]}")
+            try:
+                conn.settimeout(self.handshake_timeout)
+                conn.max_message = _HANDSHAKE_MAX_BYTES
+                self._accept(conn)
+                conn.settimeout(None)
+                conn.max_message = None
+            except Exception as e:
+                self.rejected += 1
+                print(f"[TRANSPORT] REJECTED {conn.peer}: {e}")
+                conn.close()
+                return
+            on_connection(conn)
+
+        def accept_loop():
+            while True:
+                sock, peer = server.accept()
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=serve, args=(sock, peer), daemon=True).start()
+
+        threading.Thread(target=accept_loop, daemon=True, name="transport-accept").start()
+        return server
+
+    def connect(self, address, timeout=5):
+        sock = socket.create_connection(parse_address(address), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = Connection(sock, address)
+        try:
+            self._dial(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+# Transport registry (DIST_TRANSPORT). Alternatives only need listen()/connect() returning Connection-like objects.
+TRANSPORTS = {"tcp": TcpTransport}
+
+def get_transport(name):
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown transport {name!r} (supported: {', '.join(TRANSPORTS)})")
+    return TRANSPORTS[name]()
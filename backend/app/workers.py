@@ -0,0 +1,307 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+from .config import (
+    INFERENCE_WORKERS, INFERENCE_RING_SLOTS, INFERENCE_RING_SLOT_BYTES, INFERENCE_WORKER_TIMEOUT_SECONDS, INFERENCE_BACKEND,
+    MODEL_LOAD_TIMEOUT_SECONDS
+)
+from .framering import FrameRing
+from .inference import DetectionSystem
+from .postprocess import Detections
+from .registry import ModelVersion
+
+def _pack(dets):
+    # Names stay out of the result messages; the pool re-attaches its own copy
+    return (dets.xyxy, dets.conf, dets.cls, dets.source, dets.is_person, dets.is_weapon, dets.track_id)
+
+def _unpack(arrays, names):
+    return Detections(*arrays[:6], names=names, track_id=arrays[6])
+
+def _serve_control(detector, control, replies):
+    """Model registry commands from the pool (one queue per worker). Loads run here, off the inference loop."""
+    while True:
+        command = control.get()
+        if command is None:
+            break
+        op, request, name, *args = command
+        try:
+            if op == "load":
+                version = detector.models.load(name, *args, background=False)
+                if version is None:
+                    raise RuntimeError(detector.models.errors.get(name))
+                replies.put((request, os.getpid(), True, (version.class_names, version.labels)))
+            elif op == "unload" and name in detector.models.versions and name != detector.models.active:
+                detector.models.unload(name)
+        except Exception as e:
+            replies.put((request, os.getpid(), False, repr(e)))
+
+def worker_main(ring_name, slots, slot_bytes, tasks, results, shadow_results, control, replies, backend=INFERENCE_BACKEND,
+                spec_weights=None, gen_weights=None, version="startup"):
+    """Inference worker process: loads the models once, then serves batches from the shared frame ring."""
+    detector = DetectionSystem(backend, spec_weights, gen_weights, version)
+    ring = FrameRing(slots, slot_bytes, name=ring_name)
+    timings = []
+    detector.stage_observer = lambda stage, seconds: timings.append((stage, seconds)) # Replayed by the pool
+    threading.Thread(target=_serve_control, args=(detector, control, replies), daemon=True, name="model-control").start()
+    results.put(("ready", os.getpid(), detector.class_names, detector.model_labels()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job, items, full_sweep, point, held, version, shadow = task
+        timings.clear()
+        try:
+            if shadow:
+                candidate = detector.models.versions[version]
+            elif version != detector.models.active:
+                # The pool promoted a version: every worker switches before its next batch
+                detector.models.promote(version)
+            # items: (slot, seq) tuples for ring frames, or the frame itself when it did not fit a slot
+            frames = [ring.view(*item) if isinstance(item, tuple) else item for item in items]
+            live = [i for i, frame in enumerate(frames) if frame is not None]
+            out = [None] * len(items)
+            if live:
+                if held is not None:
+                    held = [_unpack(held[i], detector.class_names) for i in live]
+                if shadow:
+                    detected = detector.run_version(candidate, [frames[i] for i in live], [full_sweep[i] for i in live], point)
+                else:
+                    detected = detector.detect_batch([frames[i] for i in live], [full_sweep[i] for i in live], point, held)
+                for i, (dets, dims) in zip(live, detected):
+                    # A slot rewritten during inference means the pool already gave up on this job
+                    if not isinstance(items[i], tuple) or ring.seq(items[i][0]) == items[i][1]:
+                        out[i] = (_pack(dets), dims)
+            del frames
+            (shadow_results if shadow else results).put(("result", job, out, list(timings)))
+        except Exception as e:
+            (shadow_results if shadow else results).put(("error", job, repr(e)))
+
+class InferencePool(DetectionSystem):
+    """Drop-in DetectionSystem whose models run in worker processes.
+
+    Frames are copied once into a shared-memory ring and workers map them without
+    copying; detections come back as plain arrays over a multiprocessing queue. Each
+    detect_batch call spreads its frames across the workers, so cameras scale with
+    cores while the API process only runs the threat rules.
+    Model versions load in every worker at once (each has a control queue); tasks name
+    the version to run, so a promotion switches all workers before their next batch.
+    """
+    def __init__(self, workers=INFERENCE_WORKERS, slots=INFERENCE_RING_SLOTS, slot_bytes=INFERENCE_RING_SLOT_BYTES,
+                 backend=INFERENCE_BACKEND, spec_weights=None):
+        self.workers = workers
+        self.backend = backend
+        self.spec_weights = spec_weights
+        self.gen_weights = None
+        self.version = "startup" # Version the workers run (and restarted workers load)
+        self.ctx = mp.get_context("spawn") # Fresh interpreters: no forked torch/OpenCV thread state
+        self.ring = FrameRing(slots, slot_bytes)
+        self.tasks = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.shadow_results = self.ctx.Queue() # Shadow jobs are collected on the shadow thread
+        self.replies = self.ctx.Queue() # Answers to model registry commands
+        self.procs = []
+        self.controls = {} # worker process -> its control queue
+        self.seq = itertools.count(1)
+        self.jobs = itertools.count(1)
+        self.requests = itertools.count(1)
+        self.inline_frames = 0 # Frames too large for a slot, sent through the queue instead
+        self.timeouts = 0
+        self.head_pool = None
+
+        for _ in range(workers):
+            self._spawn()
+        ready = self._wait_ready(workers)
+        _, _, class_names, self.labels = ready[0]
+        self._init_classes(ModelVersion(self.version, *class_names, weights=(spec_weights, None), labels=self.labels))
+        atexit.register(self.close)
+        print(f"[WORKERS] {workers} inference processes online (ring: {slots} x {slot_bytes // 1024} KiB)")
+
+    def _spawn(self):
+        control = self.ctx.Queue()
+        proc = self.ctx.Process(
+            target=worker_main,
+            args=(self.ring.name, self.ring.slots, self.ring.slot_bytes, self.tasks, self.results, self.shadow_results, control, self.replies,
+                  self.backend, self.spec_weights, self.gen_weights, self.version),
+            daemon=True, name=f"inference-{len(self.procs)}"
+        )
+        proc.start()
+        self.procs.append(proc)
+        self.controls[proc] = control
+        return proc
+
+    def _wait_ready(self, count):
+        ready = []
+        while len(ready) < count:
+            try:
+                message = self.results.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in self.procs):
+                    raise RuntimeError("Inference workers exited during model load")
+                continue
+            if message[0] == "ready":
+                ready.append(message)
+        return ready
+
+    def _check_workers(self):
+        """Replaces crashed workers (they announce themselves with a late 'ready' message)."""
+        for proc in list(self.procs):
+            if not proc.is_alive():
+                print(f"[WORKERS] {proc.name} EXITED (code {proc.exitcode}), RESTARTING")
+                self.procs.remove(proc)
+                self.controls.pop(proc, None)
+                self._spawn()
+
+    def model_labels(self):
+        return self.labels
+
+    def load_version(self, name, spec_weights, gen_weights=None):
+        """Loads the version in every worker, next to their active one, and waits until all of them are done."""
+        request = next(self.requests)
+        controls = list(self.controls.values())
+        for control in controls:
+            control.put(("load", request, name, spec_weights, gen_weights))
+        loaded = []
+        deadline = time.time() + MODEL_LOAD_TIMEOUT_SECONDS
+        try:
+            while len(loaded) < len(controls):
+                try:
+                    reply_to, pid, ok, payload = self.replies.get(timeout=max(0.01, deadline - time.time()))
+                except queue.Empty:
+                    raise TimeoutError(f"{len(controls) - len(loaded)} workers did not load {name} within {MODEL_LOAD_TIMEOUT_SECONDS}s")
+                if reply_to != request:
+                    continue # Late answer to an earlier, abandoned load
+                if not ok:
+                    raise RuntimeError(f"worker {pid}: {payload}")
+                loaded.append(payload)
+        except Exception:
+            self._unload(name) # Workers that did load it drop it again
+            raise
+        class_names, labels = loaded[0]
+        return ModelVersion(name, *class_names, weights=(spec_weights, gen_weights), labels=labels)
+
+    def activate(self, version):
+        """Later tasks name this version; each worker swaps before its next batch."""
+        with self._swap_lock:
+            version.bind(self) # Class names and masks only: the models live in the workers
+            self.labels = version.labels
+            self.version = version.name
+            self.spec_weights, self.gen_weights = version.weights
+
+    def release_version(self, version):
+        self._unload(version.name)
+
+    def _unload(self, name):
+        for control in list(self.controls.values()):
+            control.put(("unload", 0, name))
+
+    def detect_batch(self, frames, full_sweep=None, point=None, held=None):
+        if not frames:
+            return []
+        with self._swap_lock:
+            out = self._dispatch(frames, full_sweep, point, held, self.version)
+            results = []
+            for frame, result in zip(frames, out):
+                if result is None:
+                    h, w = frame.shape[:2]
+                    results.append((Detections.empty(self.class_names), (w, h)))
+                else:
+                    arrays, dims = result
+                    results.append((_unpack(arrays, self.class_names), dims))
+            return results
+
+    def compare_shadow(self, candidate, frames, full_sweep, point, live, live_seconds):
+        if candidate.name not in self.models.versions:
+            return # Unloaded while the batch waited
+        if point and candidate.gen_class_names != self.gen_class_names:
+            point = {**point, "gen_model": None} # Ladder variants only stand in for the live general model
+        t0 = time.perf_counter()
+        out = self._dispatch(frames, full_sweep, point, None, candidate.name, shadow=True)
+        seconds = time.perf_counter() - t0
+        self.record_stage("shadow", seconds)
+        if any(result is None for result in out):
+            return # A worker failed or timed out: no comparison for this batch
+        results = [(_unpack(arrays, candidate.class_names), dims) for arrays, dims in out]
+        self.models.record_shadow(candidate, live, results, live_seconds, seconds)
+
+    def _dispatch(self, frames, full_sweep, point, held, version, shadow=False):
+        """Spreads one batch over the workers. Returns the packed result per frame (None where it failed).
+
+        Shadow batches run on the shadow thread next to live ones: their frames travel through
+        the task queue (the ring belongs to the live batch) and their results come back separately.
+        """
+        full_sweep = full_sweep or [False] * len(frames)
+        if shadow:
+            items, results = list(frames), self.shadow_results
+        else:
+            self._check_workers()
+            items, results = [], self.results
+            for i, frame in enumerate(frames):
+                if i < self.ring.slots and self.ring.fits(frame):
+                    seq = next(self.seq)
+                    self.ring.write(i, frame, seq)
+                    items.append((i, seq))
+                else:
+                    self.inline_frames += 1
+                    items.append(frame)
+
+        # Contiguous chunks, one job per worker
+        n_jobs = min(len(frames), len(self.procs))
+        bounds = [round(k * len(frames) / n_jobs) for k in range(n_jobs + 1)]
+        pending = {}
+        for lo, hi in zip(bounds, bounds[1:]):
+            job = next(self.jobs)
+            pending[job] = (lo, hi)
+            self.tasks.put((job, items[lo:hi], full_sweep[lo:hi], point, [_pack(d) for d in held[lo:hi]] if held is not None else None, version, shadow))
+
+        out = [None] * len(frames)
+        deadline = time.time() + INFERENCE_WORKER_TIMEOUT_SECONDS
+        while pending:
+            try:
+                message = results.get(timeout=max(0.01, deadline - time.time()))
+            except queue.Empty:
+                self.timeouts += 1
+                print(f"[WORKERS] TIMEOUT: {len(pending)} jobs unanswered after {INFERENCE_WORKER_TIMEOUT_SECONDS}s")
+                break
+            kind, job, payload = message[0], message[1], message[2]
+            if kind == "ready" or job not in pending:
+                continue # Restarted worker or a stale job from an earlier timeout
+            lo, _ = pending.pop(job)
+            if kind == "error":
+                print(f"[WORKERS] INFERENCE FAILED (job {job}): {payload}")
+                continue
+            if not shadow:
+                for stage, seconds in message[3]:
+                    self.record_stage(stage, seconds)
+            for offset, result in enumerate(payload):
+                out[lo + offset] = result
+        return out
+
+    def stats(self):
+        return {
+            "workers": len(self.procs),
+            "alive": sum(p.is_alive() for p in self.procs),
+            "inline_frames": self.inline_frames,
+            "timeouts": self.timeouts,
+        }
+
+    def close(self):
+        if self.ring is None:
+            return
+        for _ in self.procs:
+            self.tasks.put(None)
+        for control in self.controls.values():
+            control.put(None)
+        for proc in self.procs:
+            proc.join(timeout=2)
+        self.procs = []
+        try:
+            self.ring.close()
+        except BufferError:
+            pass # A frame view is still referenced; the segment is released at exit
+        self.ring = None
@@ -0,0 +1,31 @@
+import pytest
+
+from app import db, storage
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    """Fresh events DB and snapshot directory under tmp_path; yields the snapshot directory."""
+    save_dir = tmp_path / "events"
+    (save_dir / "variants").mkdir(parents=True)
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "events.db"))
+    monkeypatch.setattr(db, "SAVE_DIR", str(save_dir))
+    monkeypatch.setattr(storage, "SAVE_DIR", str(save_dir))
+    monkeypatch.setattr(storage, "VARIANT_DIR", str(save_dir / "variants"))
+    monkeypatch.setattr(db, "_conn", None)
+    db.init_db()
+    yield save_dir
+    db.get_connection().close()
+    db._conn = None
+
+@pytest.fixture
+def add_event(archive):
+    """Inserts one event row (writing a snapshot of `nbytes` unless `write=False`) and returns its id."""
+    def add(image_path, event_type="WEAPON_DETECTED", timestamp="2026-01-01T00:00:00", nbytes=100,
+            camera_id="cam0", clip_path=None, confidence=0.9, write=True):
+        if write:
+            (archive / image_path).write_bytes(b"\0" * nbytes)
+        return db.log_events([{
+            "timestamp": timestamp, "type": event_type, "labels": [], "confidence": confidence,
+            "image_path": image_path, "bboxes": [], "camera_id": camera_id, "disk_bytes": nbytes, "clip_path": clip_path,
+        }])[0]
+    return add
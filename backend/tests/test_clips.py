@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.clips import ClipBuffer, ClipRecorder, write_mjpeg_avi
+
+def jpeg(width=64, height=48, shade=0):
+    frame = np.full((height, width, 3), shade, np.uint8)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+def test_write_mjpeg_avi_round_trips_through_opencv(tmp_path):
+    frames = [jpeg(shade=i * 20) for i in range(10)]
+    path = str(tmp_path / "clip.avi")
+    nbytes = write_mjpeg_avi(path, frames, fps=5)
+
+    assert nbytes == (tmp_path / "clip.avi").stat().st_size
+    assert not (tmp_path / "clip.avi.tmp").exists()
+    cap = cv2.VideoCapture(path)
+    assert cap.get(cv2.CAP_PROP_FRAME_COUNT) == 10
+    assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(5)
+    decoded = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        decoded.append(frame)
+    assert len(decoded) == 10
+    assert decoded[0].shape == (48, 64, 3)
+    assert decoded[-1].mean() > decoded[0].mean()
+
+def test_write_mjpeg_avi_pads_odd_frames(tmp_path):
+    frames = [jpeg(), jpeg(shade=128)]
+    frames = [f if len(f) % 2 else f + b"\0" for f in frames] # Odd chunk sizes need RIFF padding
+    path = str(tmp_path / "odd.avi")
+    write_mjpeg_avi(path, frames, fps=2)
+    data = open(path, "rb").read()
+    assert data[:4] == b"RIFF" and int.from_bytes(data[4:8], "little") == len(data) - 8
+    assert cv2.VideoCapture(path).get(cv2.CAP_PROP_FRAME_COUNT) == 2
+
+def test_clip_buffer_throttles_and_expires():
+    buffer = ClipBuffer(fps=5, horizon=2, max_bytes=1 << 20)
+    for i in range(60):
+        buffer.add(jpeg=b"x" * 10, now=100 + i * 0.1)
+    times = [t for t, _ in buffer.frames]
+    assert all(b - a >= 0.2 - 1e-9 for a, b in zip(times, times[1:]))
+    assert times[0] >= times[-1] - 2
+    assert buffer.bytes == 10 * len(times)
+    assert [t for t, _ in buffer.window(105, 105.5)] == [t for t in times if 105 <= t <= 105.5]
+
+def test_clip_buffer_byte_cap():
+    buffer = ClipBuffer(fps=10, horizon=60, max_bytes=1000)
+    for i in range(50):
+        buffer.add(jpeg=b"x" * 100, now=100 + i)
+    assert buffer.bytes <= 1000
+    assert len(buffer.frames) == 10
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = ClipRecorder(pre=5, post=5, max_seconds=20)
+    monkeypatch.setattr(recorder, "start", lambda: None) # No writer thread: only scheduling is under test
+    recorder.buffer("cam0").add(jpeg=b"x", now=1000)
+    return recorder
+
+def test_recorder_reuse_extends_post_roll(recorder):
+    first = recorder.request("cam0", "a.jpg", "WEAPON_DETECTED", now=1000)
+    assert first == "a.avi"
+    assert recorder.request("cam0", "b.jpg", "WEAPON_DETECTED", now=1003) == first
+    job = recorder._last["cam0"]
+    assert (job.start, job.end) == (995, 1008)
+    assert recorder.reused == 1 and recorder.pending == 1
+
+def test_recorder_starts_new_clip_after_post_roll_or_cap(recorder):
+    assert recorder.request("cam0", "a.jpg", "WEAPON_DETECTED", now=1000) == "a.avi"
+    assert recorder.request("cam0", "b.jpg", "WEAPON_DETECTED", now=1006) == "b.avi" # Past the post-roll
+    assert recorder.request("cam0", "c.jpg", "WEAPON_DETECTED", now=1010) == "b.avi"
+    assert recorder.request("cam0", "d.jpg", "WEAPON_DETECTED", now=1014) == "b.avi"
+    assert recorder.request("cam0", "e.jpg", "WEAPON_DETECTED", now=1018) == "e.avi" # b would exceed 20 s
+    assert recorder.pending == 3
+
+def test_recorder_skips_cameras_without_frames(recorder):
+    assert recorder.request("cam1", "a.jpg", "WEAPON_DETECTED", now=1000) is None
@@ -0,0 +1,76 @@
+import pytest
+
+from app import db
+
+def page_ids(**filters):
+    return [row["id"] for row in db.get_events(**filters)]
+
+@pytest.fixture
+def events(add_event):
+    """Ten events alternating cameras and types, one per minute."""
+    ids = []
+    for i in range(10):
+        ids.append(add_event(
+            f"{i}.jpg", event_type=("WEAPON_DETECTED", "SUSPICIOUS_GROUP")[i % 2], camera_id=f"cam{i % 3}",
+            timestamp=f"2026-01-01T00:{i:02d}:00", confidence=i / 10,
+        ))
+    return ids
+
+def test_keyset_pages_cover_everything_once(events):
+    seen, before = [], None
+    while True:
+        page = page_ids(limit=3, before_id=before)
+        if not page:
+            break
+        seen.extend(page)
+        before = page[-1]
+    assert seen == events[::-1]
+
+def test_pages_are_stable_under_inserts(events, add_event):
+    first = page_ids(limit=4)
+    add_event("new.jpg")
+    assert page_ids(limit=4, before_id=first[-1]) == events[::-1][4:8]
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"event_types": ["SUSPICIOUS_GROUP"]}, [9, 7, 5, 3, 1]),
+    ({"camera_ids": ["cam0", "cam2"]}, [9, 8, 6, 5, 3, 2, 0]),
+    ({"since": "2026-01-01T00:03:00", "until": "2026-01-01T00:06:00"}, [5, 4, 3]),
+    ({"min_confidence": 0.75}, [9, 8]),
+    ({"event_types": ["WEAPON_DETECTED"], "camera_ids": ["cam0"], "before_id": 8}, [6, 0]),
+])
+def test_filters(events, filters, expected):
+    assert page_ids(**filters) == [events[i] for i in expected]
+
+def test_get_event_by_id(events):
+    row = db.get_event_by_id(events[3])
+    assert (row["image_path"], row["camera_id"], row["frame_count"]) == ("3.jpg", "cam0", 1)
+    assert db.get_event_by_id(12345) is None
+
+def test_reconcile_hands_missing_rows_to_purge(archive, events):
+    (archive / "2.jpg").unlink()
+    (archive / "7.jpg").unlink()
+    batches = []
+    def purge(rows):
+        batches.append([row["image_path"] for row in rows])
+        db.delete_events([row["id"] for row in rows])
+        return len(rows)
+    assert db.reconcile_missing_images(purge, batch_size=4) == 2
+    assert batches == [["2.jpg"], ["7.jpg"]]
+    assert len(page_ids()) == 8
+
+def test_init_db_migrates_old_archives(archive):
+    conn = db.get_connection()
+    conn.execute("DROP TABLE events")
+    conn.execute("""CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, type TEXT NOT NULL,
+                    labels TEXT, confidence REAL, image_path TEXT, bboxes TEXT)""")
+    conn.execute("INSERT INTO events (timestamp, type, image_path) VALUES ('2025-01-01T00:00:00', 'WEAPON_DETECTED', 'old.jpg')")
+    conn.commit()
+    db.init_db()
+    row = db.get_events()[0]
+    assert row["image_path"] == "old.jpg" and row["frame_count"] == 1
+    assert {"camera_id", "disk_bytes", "clip_path", "phash", "kept_frames"} <= set(row)
+    indexes = {r[1] for r in conn.execute("PRAGMA index_list(events)")}
+    assert {"idx_events_camera", "idx_events_clip_path", "idx_events_timestamp"} <= indexes
+
+def test_wal_mode(archive):
+    assert db.get_connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
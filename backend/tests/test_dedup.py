@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.dedup import SnapshotDeduper, dhash, hamming
+
+def scene(seed=0, brightness=0):
+    rng = np.random.default_rng(seed)
+    frame = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (320, 240), interpolation=cv2.INTER_CUBIC)
+    return cv2.add(frame, np.full_like(frame, brightness))
+
+def record(camera_id="cam0", threat_type="WEAPON_DETECTED", image_path="a.jpg"):
+    return {"camera_id": camera_id, "type": threat_type, "image_path": image_path}
+
+def test_dhash_matches_for_jpeg_and_frame():
+    frame = scene()
+    jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    assert 0 <= dhash(frame) < 1 << 64
+    assert hamming(dhash(jpeg), dhash(frame)) <= 4
+
+def test_dhash_separates_scenes_and_tolerates_lighting():
+    base = dhash(scene(0))
+    assert hamming(base, dhash(scene(0, brightness=20))) <= 4
+    assert hamming(base, dhash(scene(1))) > 16
+
+def test_dhash_rejects_undecodable_bytes():
+    with pytest.raises(ValueError):
+        dhash(b"not a jpeg")
+
+def test_hamming():
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(5, 5) == 0
+
+@pytest.fixture
+def deduper():
+    return SnapshotDeduper(max_distance=4, window=10, max_frames=3, keep_every=2)
+
+def test_near_duplicates_within_window_coalesce(deduper):
+    first = record()
+    assert deduper.check(first, 0, now=100) is None
+    incident = deduper.check(record(image_path="b.jpg"), 0b111, now=105)
+    assert incident is not None and incident.record is first
+    assert incident.frame_count == 2 and incident.phash == 0b111 and incident.last_seen == 105
+    assert deduper.stats() == {"open_incidents": 1, "coalesced": 1}
+
+@pytest.mark.parametrize("phash, now, other", [
+    (0b11111, 105, {}),                      # Too different
+    (0, 111, {}),                            # Window elapsed
+    (0, 105, {"camera_id": "cam1"}),         # Other camera
+    (0, 105, {"threat_type": "SUSPICIOUS_GROUP"}),
+])
+def test_distinct_snapshots_open_new_incidents(deduper, phash, now, other):
+    deduper.check(record(), 0, now=100)
+    assert deduper.check(record(**other), phash, now) is None
+
+def test_window_follows_the_latest_frame(deduper):
+    deduper.check(record(), 0, now=100)
+    for now in (108, 116, 124):
+        assert deduper.check(record(), 0, now) is not None
+
+def test_keep_frame_every_nth_up_to_max(deduper):
+    deduper.check(record(), 0, now=100)
+    kept = []
+    for i in range(8):
+        incident = deduper.check(record(), 0, now=101 + i)
+        kept.append(deduper.keep_frame(incident))
+    # frame_count 2..9: every 2nd coalesced frame, two representatives besides the snapshot
+    assert kept == [None, 1, None, 2, None, None, None, None]
+
+def test_inserted_and_forget(deduper):
+    first = record()
+    deduper.check(first, 0, now=100)
+    deduper.inserted(first, 42)
+    assert deduper.open[("cam0", "WEAPON_DETECTED")].event_id == 42
+    deduper.forget({41})
+    assert deduper.stats()["open_incidents"] == 1
+    deduper.forget({42})
+    assert deduper.check(record(), 0, now=101) is None # Row purged by retention: new incident
+
+def test_reopen_and_discard(deduper):
+    deduper.check(record(), 0, now=100)
+    late = record(image_path="b.jpg")
+    assert deduper.check(late, 0, now=101) is not None
+    deduper.reopen(late, 0, now=101)
+    assert deduper.coalesced == 0
+    assert deduper.open[("cam0", "WEAPON_DETECTED")].record is late
+    deduper.discard(record()) # Not the open incident's record: ignored
+    assert deduper.stats()["open_incidents"] == 1
+    deduper.discard(late)
+    assert deduper.stats()["open_incidents"] == 0
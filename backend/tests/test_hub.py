@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import msgpack
+import pytest
+
+from app import hub as hub_module
+from app.hub import BOX_FIELDS, DetectionHub
+
+class FakeSocket:
+    def __init__(self, stall=False):
+        self.stall = stall
+        self.sent = asyncio.Queue()
+        self.closed = False
+
+    async def send_text(self, message):
+        if self.stall:
+            await asyncio.Event().wait()
+        await self.sent.put(message)
+
+    send_bytes = send_text
+
+    async def receive_text(self):
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+def decode(message):
+    return msgpack.unpackb(message) if isinstance(message, bytes) else json.loads(message)
+
+def payload(boxes=(), status="CLEAR", fps=10):
+    return {"boxes": list(boxes), "status": status, "fps": fps}
+
+BOX = {"cls": 0, "label": "[PERSON/GEN] 0.90", "conf": 0.9, "x1": 1, "y1": 2, "x2": 3, "y2": 4, "source": "gen", "track_id": 7}
+
+def run(scenario):
+    async def main():
+        hub = DetectionHub()
+        hub.bind(asyncio.get_running_loop())
+        return await scenario(hub)
+    return asyncio.run(main())
+
+@pytest.fixture(autouse=True)
+def fast_timers(monkeypatch):
+    monkeypatch.setattr(hub_module, "HUB_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(hub_module, "HUB_SEND_TIMEOUT_SECONDS", 0.1)
+
+def test_publish_skips_unchanged_payloads():
+    hub = DetectionHub()
+    assert hub.publish("cam0", payload())
+    assert not hub.publish("cam0", payload())
+    assert hub.publish("cam0", payload(fps=11))
+    assert hub.stats()["versions"] == {"cam0": 2}
+
+def test_delta_carries_only_changed_fields():
+    hub = DetectionHub()
+    hub.publish("cam0", payload())
+    hub.publish("cam0", payload(status="THREAT"))
+    messages = hub.channels["cam0"].current[1]["json"]
+    delta, snapshot = decode(messages["delta"]), decode(messages["snapshot"])
+    assert delta == {"type": "delta", "camera_id": "cam0", "version": 2, "data": {"status": "THREAT"}}
+    assert snapshot["data"] == payload(status="THREAT")
+    assert decode(messages["heartbeat"])["data"] == {}
+
+def test_client_gets_snapshot_then_deltas_then_heartbeats():
+    async def scenario(hub):
+        socket = FakeSocket()
+        hub.publish("cam0", payload())
+        client = asyncio.create_task(hub.serve(socket, "cam0"))
+        first = decode(await socket.sent.get())
+        hub.publish("cam0", payload(fps=12))
+        second = decode(await socket.sent.get())
+        third = decode(await socket.sent.get())
+        client.cancel()
+        return first, second, third
+
+    first, second, third = run(scenario)
+    assert (first["type"], first["version"], first["data"]) == ("snapshot", 1, payload())
+    assert (second["type"], second["version"], second["data"]) == ("delta", 2, {"fps": 12})
+    assert (third["type"], third["version"]) == ("heartbeat", 2)
+
+def test_client_more_than_one_version_behind_gets_snapshot():
+    async def scenario(hub):
+        socket = FakeSocket()
+        hub.publish("cam0", payload())
+        client = asyncio.create_task(hub.serve(socket, "cam0"))
+        await socket.sent.get()
+        hub.publish("cam0", payload(fps=12))
+        hub.publish("cam0", payload(fps=13, status="THREAT"))
+        message = decode(await socket.sent.get())
+        client.cancel()
+        return message
+
+    message = run(scenario)
+    assert (message["type"], message["version"]) == ("snapshot", 3)
+    assert message["data"] == payload(fps=13, status="THREAT")
+
+def test_late_msgpack_client_gets_compact_boxes():
+    async def scenario(hub):
+        socket = FakeSocket()
+        hub.publish("cam0", payload(boxes=[BOX]))
+        client = asyncio.create_task(hub.serve(socket, "cam0", encoding="msgpack"))
+        message = await socket.sent.get()
+        client.cancel()
+        return message
+
+    message = run(scenario)
+    assert isinstance(message, bytes)
+    decoded = decode(message)
+    assert decoded["type"] == "snapshot" and decoded["box_fields"] == list(BOX_FIELDS)
+    assert decoded["data"]["boxes"] == [[BOX[f] for f in BOX_FIELDS]]
+
+def test_stalled_client_is_dropped():
+    async def scenario(hub):
+        socket = FakeSocket(stall=True)
+        hub.publish("cam0", payload())
+        await asyncio.wait_for(hub.serve(socket, "cam0"), 2)
+        return socket, hub.stats()
+
+    socket, stats = run(scenario)
+    assert socket.closed
+    assert stats["dropped"] == 1 and stats["clients"] == 0
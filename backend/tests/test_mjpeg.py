@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+from app.mjpeg import jpeg_size, parse_boundary, read_parts, reduce_factor
+
+def multipart(*bodies, boundary=b"frame", length=True):
+    out = b"preamble\r\n"
+    for body in bodies:
+        out += b"--" + boundary + b"\r\nContent-Type: image/jpeg\r\n"
+        if length:
+            out += b"Content-Length: %d\r\n" % len(body)
+        out += b"\r\n" + body + b"\r\n"
+    return out + b"--" + boundary + b"--\r\n"
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("multipart/x-mixed-replace; boundary=frame", b"frame"),
+    ('multipart/x-mixed-replace;boundary="123456789000000000000987654321"', b"123456789000000000000987654321"),
+    ("Multipart/X-Mixed-Replace; charset=utf-8; Boundary=--myboundary", b"--myboundary"),
+    ("image/jpeg", None),
+    ("multipart/x-mixed-replace", None),
+])
+def test_parse_boundary(content_type, expected):
+    assert parse_boundary(content_type) == expected
+
+def test_read_parts_with_content_length():
+    bodies = [b"\xff\xd8one\r\n--frame\xff\xd9", b"\xff\xd8two\xff\xd9"] # Boundary-like bytes inside a sized body
+    assert list(read_parts(io.BytesIO(multipart(*bodies)), b"frame")) == bodies
+
+def test_read_parts_without_content_length():
+    bodies = [b"\xff\xd8line one\r\nline two\xff\xd9", b"\xff\xd8three\xff\xd9"]
+    assert list(read_parts(io.BytesIO(multipart(*bodies, length=False)), b"frame")) == bodies
+
+def test_read_parts_accepts_boundary_with_dashes():
+    bodies = [b"abc", b"def"]
+    stream = io.BytesIO(multipart(*bodies, boundary=b"--myboundary"))
+    assert list(read_parts(stream, b"--myboundary")) == bodies
+
+def test_read_parts_stops_at_truncated_part():
+    data = multipart(b"complete", b"truncated")
+    stream = io.BytesIO(data[:data.index(b"truncated") + 4])
+    assert list(read_parts(stream, b"frame")) == [b"complete"]
+
+def test_read_parts_rejects_oversized_declared_length():
+    stream = io.BytesIO(multipart(b"x" * 101))
+    with pytest.raises(ValueError):
+        list(read_parts(stream, b"frame", max_frame_bytes=100))
+
+def test_read_parts_resyncs_after_oversized_undeclared_part():
+    # No line breaks: the body must not be read past the limit before being dropped
+    stream = io.BytesIO(multipart(b"small", b"x" * 5000, b"after", length=False))
+    assert list(read_parts(stream, b"frame", max_frame_bytes=1000)) == [b"small", b"after"]
+
+def test_jpeg_size_reads_sof_without_decoding():
+    app0 = b"\xff\xe0\x00\x10" + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0\x00\x11\x08" + (480).to_bytes(2, "big") + (640).to_bytes(2, "big") + b"\x03" + b"\x00" * 9
+    assert jpeg_size(b"\xff\xd8" + app0 + sof0 + b"\xff\xd9") == (640, 480)
+    assert jpeg_size(b"not a jpeg") is None
+
+def test_reduce_factor_keeps_target_resolution():
+    assert reduce_factor((1600, 1200), 640) == 2
+    assert reduce_factor((5120, 3840), 640) == 8
+    assert reduce_factor((640, 480), 640) == 1
+    assert reduce_factor(None, 640) == 1
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.postprocess import Detections, SOURCE_GEN, SOURCE_SPEC, class_mask, crop_regions, iou_matrix, merge_detections
+
+NAMES = ({0: "gun", 1: "knife"}, {0: "person", 1: "chair", 2: "knife"})
+
+def dets(rows, source, track_id=None):
+    """rows: (x1, y1, x2, y2, conf, cls, is_weapon)."""
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 7)
+    is_weapon = rows[:, 6].astype(bool)
+    return Detections(
+        rows[:, :4].astype(np.float32), rows[:, 4].astype(np.float32), rows[:, 5].astype(np.int32),
+        np.full(len(rows), source, np.uint8), ~is_weapon, is_weapon, NAMES,
+        None if track_id is None else np.array(track_id, np.int32),
+    )
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [0, 0, 0, 0]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1, 1 / 3, 0], [0, 0, 0]], rtol=1e-6)
+
+def test_class_mask():
+    mask = class_mask(NAMES[1], lambda name: name in ("knife", "gun"))
+    assert mask.tolist() == [False, False, True]
+
+def test_merge_with_empty_sides():
+    spec = dets([(0, 0, 10, 10, 0.9, 0, 1)], SOURCE_SPEC)
+    assert merge_detections(spec, Detections.empty(NAMES)) is spec
+    merged = merge_detections(Detections.empty(NAMES), spec)
+    assert merged.xyxy.tolist() == spec.xyxy.tolist()
+
+def test_less_confident_duplicate_is_dropped():
+    spec = dets([(0, 0, 10, 10, 0.9, 0, 1)], SOURCE_SPEC)
+    gen = dets([(1, 0, 11, 10, 0.5, 2, 1), (50, 50, 80, 120, 0.8, 0, 0)], SOURCE_GEN)
+    merged = merge_detections(spec, gen)
+    assert merged.xyxy.tolist() == [[0, 0, 10, 10], [50, 50, 80, 120]]
+    assert merged.source.tolist() == [SOURCE_SPEC, SOURCE_GEN]
+
+def test_more_confident_duplicate_overwrites_but_keeps_role():
+    spec = dets([(0, 0, 10, 10, 0.5, 0, 1)], SOURCE_SPEC)
+    gen = dets([(1, 0, 11, 10, 0.7, 0, 0), (0, 1, 10, 11, 0.95, 2, 0)], SOURCE_GEN)
+    merged = merge_detections(spec, gen)
+    assert len(merged) == 1
+    assert merged.xyxy.tolist() == [[0, 1, 10, 11]]
+    assert (float(merged.conf[0]), int(merged.cls[0]), int(merged.source[0])) == (np.float32(0.95), 2, SOURCE_GEN)
+    assert merged.is_weapon.tolist() == [True]
+    assert spec.conf.tolist() == [np.float32(0.5)] # Inputs are not modified
+
+def test_secondary_duplicates_collapse_onto_the_best():
+    gen = dets([(0, 0, 10, 10, 0.4, 0, 0), (1, 0, 11, 10, 0.9, 0, 0), (2, 0, 12, 10, 0.6, 0, 0)], SOURCE_GEN)
+    merged = merge_detections(Detections.empty(NAMES), gen)
+    assert merged.xyxy.tolist() == [[1, 0, 11, 10]]
+    assert merged.conf.tolist() == [np.float32(0.9)]
+
+def test_held_track_ids_survive_the_merge():
+    spec = dets([(0, 0, 10, 10, 0.9, 0, 1)], SOURCE_SPEC)
+    held = dets([(100, 100, 150, 200, 0.8, 0, 0), (300, 0, 350, 100, 0.6, 0, 0)], SOURCE_GEN, track_id=[4, 9])
+    assert merge_detections(spec, held).track_id.tolist() == [-1, 4, 9]
+
+def test_from_result_thresholds_and_area_filter():
+    boxes = SimpleNamespace(
+        xyxy=np.array([[0, 0, 10, 10], [0, 0, 10, 10], [0, 0, 90, 90], [0, 0, 10, 10], [0, 0, 10, 10]], np.float32),
+        conf=np.array([0.9, 0.1, 0.9, 0.3, 0.9], np.float32),
+        cls=np.array([0, 0, 2, 2, 1], np.float32),
+    )
+    person_mask = class_mask(NAMES[1], lambda name: name == "person")
+    weapon_mask = class_mask(NAMES[1], lambda name: name == "knife")
+    result = Detections.from_result(SimpleNamespace(boxes=boxes), SOURCE_GEN, person_mask, weapon_mask, 100 * 100, NAMES)
+    # Low-confidence person, oversized knife, low-confidence knife and the chair are filtered out
+    assert result.conf.tolist() == [np.float32(0.9)]
+    assert result.is_person.tolist() == [True]
+
+def test_to_dicts():
+    row = dets([(1, 2, 3, 4, 0.5, 2, 1)], SOURCE_GEN, track_id=[3]).to_dicts()[0]
+    assert row == {"cls": 2, "label": "[KNIFE/GEN] 0.50", "conf": 0.5, "x1": 1.0, "y1": 2.0, "x2": 3.0, "y2": 4.0,
+                   "source": "gen", "track_id": 3}
+
+def test_crop_regions_expand_clip_and_merge():
+    persons = np.array([[10, 10, 50, 100], [60, 10, 100, 100], [400, 200, 440, 300]], np.float32)
+    regions = crop_regions(persons, 20, 640, 480, 8)
+    assert sorted(regions) == [[0, 0, 120, 120], [380, 180, 460, 320]]
+
+def test_crop_regions_merge_transitively():
+    # Each window only reaches its neighbour, and the merged window reaches the next one
+    persons = np.array([[0, 0, 10, 10], [15, 0, 25, 10], [30, 0, 40, 10], [200, 0, 210, 10]], np.float32)
+    assert sorted(crop_regions(persons, 3, 640, 480, 8)) == [[0, 0, 43, 13], [197, 0, 213, 13]]
+
+def test_crop_regions_crowded_frame_and_empty():
+    persons = np.array([[i * 100, 0, i * 100 + 20, 20] for i in range(6)], np.float32)
+    assert crop_regions(persons, 10, 640, 480, 5) is None
+    assert len(crop_regions(persons, 10, 640, 480, 6)) == 6
+    assert crop_regions(np.zeros((0, 4), np.float32), 10, 640, 480, 5) == []
+
+def test_crop_regions_leave_no_overlaps():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 1000, (200, 2))
+    persons = np.concatenate([xy, xy + rng.uniform(5, 60, (200, 2))], axis=1).astype(np.float32)
+    regions = np.array(crop_regions(persons, 10, 1100, 1100, 1000))
+    windows = np.round(persons).astype(np.int64) + [-10, -10, 10, 10]
+    windows = windows.clip(0, 1100)
+    covered = (regions[None, :, :2] <= windows[:, None, :2]).all(axis=2) & (regions[None, :, 2:] >= windows[:, None, 2:]).all(axis=2)
+    assert covered.any(axis=1).all()
+    a, b = regions[:, None], regions[None, :]
+    overlap = (a[..., 0] < b[..., 2]) & (b[..., 0] < a[..., 2]) & (a[..., 1] < b[..., 3]) & (b[..., 1] < a[..., 3])
+    assert overlap.sum() == len(regions) # Only each window with itself
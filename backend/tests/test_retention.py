@@ -0,0 +1,108 @@
+import pytest
+
+from app import db
+from app.retention import DiskLedger, RetentionService
+
+def service(**policy):
+    options = {"max_count": 0, "max_age_days": 0, "max_bytes": 0, "type_quotas": {}, "batch_size": 2}
+    options.update(policy)
+    retention = RetentionService(DiskLedger(), **options)
+    retention.resync()
+    return retention
+
+def remaining():
+    return [row["image_path"] for row in db.oldest_events(100)]
+
+def test_ledger_counts_and_clamps():
+    ledger = DiskLedger()
+    ledger.add("A", 100)
+    ledger.add("A", 50)
+    ledger.add("B", 10)
+    ledger.add("A", 25, count=0)
+    ledger.remove("B", 40)
+    assert ledger.snapshot() == {"count": 2, "bytes": 175, "by_type": {"A": 2, "B": 0}}
+
+def test_resync_rebuilds_ledger(add_event):
+    add_event("a.jpg", nbytes=100)
+    add_event("b.jpg", event_type="SUSPICIOUS_GROUP", nbytes=30)
+    retention = service()
+    assert retention.ledger.counts == {"WEAPON_DETECTED": 1, "SUSPICIOUS_GROUP": 1}
+    assert retention.ledger.total_bytes == 130
+
+def test_max_count_drops_oldest(archive, add_event):
+    for i in range(5):
+        add_event(f"{i}.jpg")
+    retention = service(max_count=2)
+    assert retention.run_once() == 3
+    assert remaining() == ["3.jpg", "4.jpg"]
+    assert not (archive / "0.jpg").exists() and (archive / "4.jpg").exists()
+    assert retention.ledger.total_count == 2 and retention.ledger.total_bytes == 200
+
+def test_max_age(add_event):
+    add_event("old.jpg", timestamp="2000-01-01T00:00:00")
+    add_event("new.jpg", timestamp="2999-01-01T00:00:00")
+    assert service(max_age_days=30).run_once() == 1
+    assert remaining() == ["new.jpg"]
+
+def test_type_quota_spares_other_types(add_event):
+    add_event("g1.jpg", event_type="SUSPICIOUS_GROUP")
+    add_event("w1.jpg")
+    add_event("g2.jpg", event_type="SUSPICIOUS_GROUP")
+    add_event("g3.jpg", event_type="SUSPICIOUS_GROUP")
+    assert service(type_quotas={"SUSPICIOUS_GROUP": 1}).run_once() == 2
+    assert remaining() == ["w1.jpg", "g3.jpg"]
+
+def test_max_bytes_deletes_only_the_excess(add_event):
+    for i, nbytes in enumerate((100, 300, 50, 50)):
+        add_event(f"{i}.jpg", nbytes=nbytes)
+    retention = service(max_bytes=150, batch_size=10)
+    assert retention.run_once() == 2
+    assert remaining() == ["2.jpg", "3.jpg"]
+    assert retention.ledger.total_bytes == 100
+
+def test_on_purge_receives_deleted_ids(add_event):
+    ids = [add_event(f"{i}.jpg") for i in range(3)]
+    retention = service(max_count=1)
+    purged = []
+    retention.on_purge = purged.extend
+    retention.run_once()
+    assert purged == ids[:2]
+
+def test_shared_clip_moves_to_next_owner_then_is_deleted(archive, add_event):
+    (archive / "a.avi").write_bytes(b"\0" * 1000)
+    first = add_event("a.jpg", clip_path="a.avi", nbytes=1100) # Carries the clip bytes
+    second = add_event("b.jpg", clip_path="a.avi", nbytes=100)
+    retention = service()
+
+    retention._purge(db.oldest_events(1))
+    assert (archive / "a.avi").exists()
+    assert db.get_event_by_id(second)["disk_bytes"] == 1100
+    assert retention.ledger.total_bytes == 1100
+    assert db.get_event_by_id(first) is None
+
+    retention._purge(db.oldest_events(1))
+    assert not (archive / "a.avi").exists()
+    assert retention.ledger.total_count == 0 and retention.ledger.total_bytes == 0
+
+def test_purging_a_later_sharer_keeps_the_owner_charged(archive, add_event):
+    (archive / "a.avi").write_bytes(b"\0" * 1000)
+    first = add_event("a.jpg", clip_path="a.avi", nbytes=1100)
+    second = add_event("b.jpg", clip_path="a.avi", nbytes=100)
+    retention = service()
+    retention._purge([dict(db.get_event_by_id(second))])
+    assert (archive / "a.avi").exists()
+    assert db.get_event_by_id(first)["disk_bytes"] == 1100
+
+def test_reconcile_purges_rows_without_snapshots(archive, add_event):
+    add_event("kept.jpg")
+    gone = add_event("gone.jpg", nbytes=100, clip_path="gone.avi")
+    (archive / "gone.avi").write_bytes(b"\0" * 10)
+    (archive / "gone.jpg").unlink()
+    retention = service()
+    purged = []
+    retention.on_purge = purged.extend
+    assert retention.reconcile() == 1
+    assert purged == [gone]
+    assert remaining() == ["kept.jpg"]
+    assert not (archive / "gone.avi").exists()
+    assert retention.ledger.total_bytes == 100
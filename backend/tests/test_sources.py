@@ -0,0 +1,27 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from app.sources import _split_jpegs
+
+def encode(frame, **params):
+    flags = [cv2.IMWRITE_JPEG_PROGRESSIVE, 1] if params.get("progressive") else []
+    return cv2.imencode(".jpg", frame, flags)[1].tobytes()
+
+def with_exif_thumbnail(jpeg, thumbnail):
+    payload = b"Exif\0\0" + thumbnail
+    return jpeg[:2] + b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload + jpeg[2:]
+
+@pytest.mark.parametrize("chunk_size", [1 << 20, 1000, 7])
+def test_split_jpegs_finds_each_frames_own_eoi(chunk_size):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    frames = [
+        with_exif_thumbnail(encode(frame), encode(frame[:16, :16])),
+        encode(frame),
+        encode(frame, progressive=True),
+    ]
+    stream = io.BytesIO(b"junk" + b"".join(frames) + b"\xff\xd8truncated")
+    assert list(_split_jpegs(stream, chunk_size)) == frames
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from app.spatial import SpatialIndex
+
+def boxes_at(centers, size=20):
+    centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+    return np.concatenate([centers - size / 2, centers + size / 2], axis=1)
+
+def brute_force_groups(centers, distance, min_count):
+    """Reference DBSCAN over all pairs."""
+    centers = np.asarray(centers, dtype=np.float64)
+    n = len(centers)
+    near = np.linalg.norm(centers[:, None] - centers[None, :], axis=2) <= distance
+    core = near.sum(axis=1) >= min_count
+    labels = np.full(n, -1)
+    for seed in np.flatnonzero(core):
+        if labels[seed] >= 0:
+            continue
+        labels[seed] = seed
+        stack = [seed]
+        while stack:
+            i = stack.pop()
+            for j in np.flatnonzero(near[i]):
+                if labels[j] < 0:
+                    labels[j] = seed
+                    if core[j]:
+                        stack.append(j)
+    return labels
+
+def as_sets(groups):
+    return sorted(sorted(int(i) for i in group) for group in groups)
+
+def test_groups_empty_and_sparse():
+    assert SpatialIndex(boxes_at(np.zeros((0, 2))), 50).groups(50, 3) == []
+    assert SpatialIndex(boxes_at([[0, 0], [500, 500], [1000, 0]]), 50).groups(50, 2) == []
+
+def test_groups_splits_separate_crowds():
+    crowd_a = [[100, 100], [130, 100], [100, 130], [130, 130]]
+    crowd_b = [[800, 600], [830, 600], [800, 630]]
+    loner = [[400, 400]]
+    index = SpatialIndex(boxes_at(crowd_a + loner + crowd_b), 60)
+    assert as_sets(index.groups(60, 3)) == [[0, 1, 2, 3], [5, 6, 7]]
+
+def test_groups_attach_border_points():
+    # Three cores close together plus one person only near the end of the chain
+    centers = [[0, 0], [40, 0], [80, 0], [130, 0]]
+    assert as_sets(SpatialIndex(boxes_at(centers), 50).groups(50, 3)) == [[0, 1, 2, 3]]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_groups_match_reference_dbscan(seed):
+    rng = np.random.default_rng(seed)
+    centers = np.concatenate([rng.normal(c, 40, (15, 2)) for c in rng.uniform(0, 2000, (6, 2))] + [rng.uniform(0, 2000, (30, 2))])
+    distance, min_count = 60, 4
+    groups = SpatialIndex(boxes_at(centers), distance).groups(distance, min_count)
+
+    labels = brute_force_groups(centers, distance, min_count)
+    expected = [np.flatnonzero(labels == label) for label in np.unique(labels[labels >= 0])]
+    # Border persons reachable from two clusters may join either one, so compare cores and coverage
+    core = (np.linalg.norm(centers[:, None] - centers[None, :], axis=2) <= distance).sum(axis=1) >= min_count
+    assert len(groups) == len(expected)
+    assert sorted(np.concatenate(groups).tolist()) == np.flatnonzero(labels >= 0).tolist()
+    assert as_sets(g[core[g]] for g in groups) == as_sets(g[core[g]] for g in expected)
+
+def test_associate_orders_carriers_by_distance():
+    persons = np.array([[0, 0, 100, 200], [60, 0, 160, 200], [1000, 1000, 1100, 1200]], dtype=np.float32)
+    weapons = np.array([[100, 100], [500, 500], [1050, 1100]], dtype=np.float32)
+    w, p = SpatialIndex(persons, 60).associate(weapons, margin=10)
+    assert w.tolist() == [0, 0, 2]
+    assert p.tolist() == [1, 0, 2] # Weapon 0 is closer to person 1's center
+
+def test_associate_margin():
+    persons = np.array([[0, 0, 100, 100]], dtype=np.float32)
+    point = np.array([[130, 50]], dtype=np.float32)
+    assert len(SpatialIndex(persons, 60).associate(point, margin=20)[0]) == 0
+    assert len(SpatialIndex(persons, 60).associate(point, margin=40)[0]) == 1
@@ -0,0 +1,82 @@
+import numpy as np
+
+from app.postprocess import Detections, SOURCE_GEN
+from app.tracking import Tracker
+
+def dets(*boxes, weapon=()):
+    """Detections for `boxes` (xyxy); rows listed in `weapon` are weapons, the rest persons."""
+    n = len(boxes)
+    is_weapon = np.isin(np.arange(n), weapon)
+    return Detections(
+        np.array(boxes, dtype=np.float32).reshape(n, 4), np.full(n, 0.9, np.float32), np.zeros(n, np.int32),
+        np.full(n, SOURCE_GEN, np.uint8), ~is_weapon, is_weapon,
+    )
+
+def test_new_detections_start_tracks():
+    tracker = Tracker()
+    ids = tracker.update(dets([0, 0, 50, 100], [200, 0, 250, 100]))
+    assert ids.tolist() == [1, 2]
+    assert len(tracker) == 2
+
+def test_moving_box_keeps_its_id():
+    tracker = Tracker()
+    first = tracker.update(dets([0, 0, 50, 100]))[0]
+    for step in range(1, 6):
+        assert tracker.update(dets([10 * step, 0, 10 * step + 50, 100]))[0] == first
+    track = tracker.get(first)
+    assert track.hits == 6
+    # Constant-velocity estimate follows the motion
+    assert track.x[4] > 5
+
+def test_person_never_matches_weapon_track():
+    tracker = Tracker()
+    tracker.update(dets([0, 0, 50, 100], weapon=[0]))
+    ids = tracker.update(dets([0, 0, 50, 100]))
+    assert ids.tolist() == [2]
+    assert tracker.get(1).misses == 1
+
+def test_unmatched_tracks_expire_after_max_misses():
+    tracker = Tracker(max_misses=2)
+    tracker.update(dets([0, 0, 50, 100]))
+    for _ in range(2):
+        tracker.update(dets())
+        assert tracker.get(1) is not None
+    tracker.update(dets())
+    assert tracker.get(1) is None
+
+def test_predict_returns_only_tracks_seen_last_keyframe():
+    tracker = Tracker()
+    tracker.update(dets([0, 0, 50, 100], [200, 0, 250, 100]))
+    tracker.update(dets([0, 0, 50, 100]))
+    predicted = tracker.predict()
+    assert predicted.track_id.tolist() == [1]
+    tracker.get(1).suppressed = True
+    assert len(tracker.predict()) == 0
+
+def test_held_persons_are_not_evidence():
+    tracker = Tracker(max_misses=2)
+    tracker.update(dets([0, 0, 50, 100], [300, 0, 340, 40], weapon=[1]))
+    held = tracker.held_persons()
+    assert held.track_id.tolist() == [1] and held.is_person.all()
+
+    for _ in range(5):
+        ids = tracker.update(Detections.concat([tracker.held_persons(), dets([300, 0, 340, 40], weapon=[0])]))
+        assert ids.tolist() == [1, 2]
+    person = tracker.get(1)
+    assert person.hits == 1 and person.misses == 0 # No confirmation from its own estimate
+    assert tracker.get(2).hits == 6
+
+def test_held_rows_never_start_tracks():
+    tracker = Tracker(max_misses=0)
+    tracker.update(dets([0, 0, 50, 100]))
+    held = tracker.held_persons()
+    tracker.update(dets()) # Track 1 expires
+    assert tracker.update(held).tolist() == [-1]
+    assert len(tracker) == 0
+
+def test_real_detection_refreshes_a_held_track():
+    tracker = Tracker()
+    tracker.update(dets([0, 0, 50, 100]))
+    tracker.update(tracker.held_persons())
+    assert tracker.update(dets([2, 0, 52, 100])).tolist() == [1]
+    assert tracker.get(1).hits == 2
@@ -1,7 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { Shield, AlertTriangle, Users, Target, Activity, Radio } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
-import type { DetectionMessage } from '../types';
+import type { DetectionMessage, HubMessage } from '../types';
 
 const Dashboard: React.FC = () => {
     const [detection, setDetection] = useState<DetectionMessage | null>(null);
@@ -26,8 +26,15 @@ const Dashboard: React.FC = () => {
                 setTimeout(connect, 3000);
             };
 
+            let current: DetectionMessage | null = null;
             ws.onmessage = (event) => {
-                const data: DetectionMessage = JSON.parse(event.data);
+                const msg: HubMessage = JSON.parse(event.data);
+                if (msg.type === 'heartbeat') return;
+                // Snapshots replace the state, deltas carry only the fields that changed
+                const data = (msg.type === 'snapshot' || !current
+                    ? msg.data
+                    : { ...current, ...msg.data }) as DetectionMessage;
+                current = data;
                 setDetection(data);
 
                 if (data.threats.length > 0) {
@@ -1,20 +1,50 @@
-import React, { useEffect, useState, useMemo } from 'react';
-import { Calendar, RefreshCw, X, Filter, Clock, Fingerprint } from 'lucide-react';
+import React, { useEffect, useRef, useState } from 'react';
+import { Calendar, RefreshCw, X, Filter, Clock, Fingerprint, Film, Layers, ChevronsDown } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import axios from 'axios';
 import type { SurveillanceEvent } from '../types';
 
+const API_URL = 'http://localhost:8000';
+const PAGE_SIZE = 60;
+const EVENT_TYPES = ['WEAPON_DETECTED', 'PERSON_WITH_WEAPON', 'SUSPICIOUS_GROUP'];
+
+interface EventFilters {
+    type: string;
+    camera: string;
+    since: string;
+    until: string;
+}
+
 const Events: React.FC = () => {
     const [events, setEvents] = useState<SurveillanceEvent[]>([]);
     const [selectedEvent, setSelectedEvent] = useState<SurveillanceEvent | null>(null);
+    const [selectedFrame, setSelectedFrame] = useState(0);
     const [isLoading, setIsLoading] = useState(true);
-    const [filterType, setFilterType] = useState<string>('ALL');
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
+    const [filters, setFilters] = useState<EventFilters>({ type: 'ALL', camera: 'ALL', since: '', until: '' });
+    const [cameras, setCameras] = useState<string[]>([]);
+    const [cursor, setCursor] = useState<string | null>(null);
+    const eventsRef = useRef<SurveillanceEvent[]>([]);
+    eventsRef.current = events;
+
+    // Keyset pagination: the server hands out X-Next-Cursor while older events remain
+    const fetchPage = async (before?: string | null) => {
+        const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+        if (before) params.set('before', before);
+        if (filters.type !== 'ALL') params.append('type', filters.type);
+        if (filters.camera !== 'ALL') params.append('camera', filters.camera);
+        if (filters.since) params.set('since', filters.since);
+        if (filters.until) params.set('until', filters.until);
+        const response = await axios.get<SurveillanceEvent[]>(`${API_URL}/events`, { params });
+        return { items: response.data, next: (response.headers['x-next-cursor'] as string | undefined) ?? null };
+    };
 
     const fetchEvents = async () => {
         setIsLoading(true);
         try {
-            const response = await axios.get('http://localhost:8000/events');
-            setEvents(response.data);
+            const { items, next } = await fetchPage();
+            setEvents(items);
+            setCursor(next);
         } catch (error) {
             console.error("Failed to fetch events:", error);
         } finally {
@@ -22,11 +52,53 @@ const Events: React.FC = () => {
         }
     };
 
+    // Auto-refresh only re-reads the first page: new incidents go on top, loaded older pages stay
+    const refreshHead = async () => {
+        try {
+            const { items, next } = await fetchPage();
+            const prev = eventsRef.current;
+            const newest = prev.length ? prev[0].id : 0;
+            const fresh = items.filter(e => e.id > newest);
+            if (prev.length === 0 || fresh.length === items.length) {
+                // Gap to the loaded pages: start over from this page
+                setEvents(items);
+                setCursor(next);
+                return;
+            }
+            const updated = new Map(items.map(e => [e.id, e])); // Sustained incidents keep growing
+            setEvents([...fresh, ...prev.map(e => updated.get(e.id) ?? e)]);
+        } catch (error) {
+            console.error("Failed to refresh events:", error);
+        }
+    };
+
+    const loadMore = async () => {
+        if (!cursor || isLoadingMore) return;
+        setIsLoadingMore(true);
+        try {
+            const { items, next } = await fetchPage(cursor);
+            setEvents(prev => [...prev, ...items]);
+            setCursor(next);
+        } catch (error) {
+            console.error("Failed to fetch older events:", error);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
+    useEffect(() => {
+        axios.get<{ id: string }[]>(`${API_URL}/cameras`)
+            .then(response => setCameras(response.data.map(cam => cam.id)))
+            .catch(error => console.error("Failed to fetch cameras:", error));
+    }, []);
+
     useEffect(() => {
         fetchEvents();
-        const interval = setInterval(fetchEvents, 10000); // Auto-refresh every 10s
+        const interval = setInterval(refreshHead, 10000); // Auto-refresh every 10s
         return () => clearInterval(interval);
-    }, []);
+    }, [filters]);
+
+    const setFilter = (key: keyof EventFilters, value: string) => setFilters(prev => ({ ...prev, [key]: value }));
 
     // Tactical log displays all recorded priority incidents
 
@@ -58,6 +130,39 @@ const Events: React.FC = () => {
                 </div>
 
                 <div className="flex items-center gap-4">
+                    <div className="flex items-center gap-2 text-[10px] font-black uppercase">
+                        <Filter className="w-4 h-4 opacity-60" />
+                        <select
+                            value={filters.type}
+                            onChange={e => setFilter('type', e.target.value)}
+                            className="h-10 px-2 bg-black border border-tactical-green/30 text-tactical-green uppercase"
+                        >
+                            <option value="ALL">All Types</option>
+                            {EVENT_TYPES.map(type => <option key={type} value={type}>{type.replace(/_/g, ' ')}</option>)}
+                        </select>
+                        <select
+                            value={filters.camera}
+                            onChange={e => setFilter('camera', e.target.value)}
+                            className="h-10 px-2 bg-black border border-tactical-green/30 text-tactical-green uppercase"
+                        >
+                            <option value="ALL">All Cameras</option>
+                            {cameras.map(id => <option key={id} value={id}>{id}</option>)}
+                        </select>
+                        <input
+                            type="datetime-local"
+                            value={filters.since}
+                            onChange={e => setFilter('since', e.target.value)}
+                            title="From"
+                            className="h-10 px-2 bg-black border border-tactical-green/30 text-tactical-green"
+                        />
+                        <input
+                            type="datetime-local"
+                            value={filters.until}
+                            onChange={e => setFilter('until', e.target.value)}
+                            title="Until"
+                            className="h-10 px-2 bg-black border border-tactical-green/30 text-tactical-green"
+                        />
+                    </div>
                     <button
                         onClick={fetchEvents}
                         className="btn-tactical flex items-center gap-2 h-10 px-4"
@@ -91,11 +196,12 @@ const Events: React.FC = () => {
                                     animate={{ opacity: 1, scale: 1 }}
                                     whileHover={{ y: -4 }}
                                     className="panel group cursor-pointer hover:border-tactical-green/60 transition-all overflow-hidden border-tactical-green/20"
-                                    onClick={() => setSelectedEvent(event)}
+                                    onClick={() => { setSelectedEvent(event); setSelectedFrame(0); }}
                                 >
                                     <div className="relative aspect-video bg-black overflow-hidden border-b border-tactical-green/10">
                                         <img
-                                            src={`http://localhost:8000/images/${event.image_path}?t=${new Date(event.timestamp).getTime()}`}
+                                            src={`${API_URL}/events/${event.id}/image?variant=thumb`}
+                                            loading="lazy"
                                             alt={event.type}
                                             className="w-full h-full object-cover opacity-70 group-hover:opacity-100 group-hover:scale-105 transition-all duration-500"
                                         />
@@ -106,6 +212,11 @@ const Events: React.FC = () => {
                                             }`}>
                                             {event.type.replace(/_/g, ' ')}
                                         </div>
+                                        {(event.frame_count ?? 1) > 1 && (
+                                            <div className="absolute bottom-2 right-2 flex items-center gap-1 px-2 py-0.5 text-[9px] font-black tracking-widest border border-tactical-green/40 bg-black/60 text-tactical-green">
+                                                <Layers className="w-3 h-3" /> x{event.frame_count}
+                                            </div>
+                                        )}
                                     </div>
                                     <div className="p-3 space-y-2 bg-panel-bg/30">
                                         <div className="flex justify-between items-center text-[9px] font-black uppercase tracking-tighter text-tactical-green/40">
@@ -125,6 +236,18 @@ const Events: React.FC = () => {
                         </AnimatePresence>
                     </div>
                 )}
+                {cursor && events.length > 0 && (
+                    <div className="flex justify-center pb-8">
+                        <button
+                            onClick={loadMore}
+                            disabled={isLoadingMore}
+                            className="btn-tactical flex items-center gap-2 h-10 px-6"
+                        >
+                            {isLoadingMore ? <RefreshCw className="w-4 h-4 animate-spin" /> : <ChevronsDown className="w-4 h-4" />}
+                            LOAD OLDER INCIDENTS
+                        </button>
+                    </div>
+                )}
             </div>
 
             {/* Detail Modal */}
@@ -160,7 +283,7 @@ const Events: React.FC = () => {
                                     <div className="absolute inset-0 opacity-10 pointer-events-none" style={{ backgroundImage: 'radial-gradient(circle, #00ff41 1px, transparent 1px)', backgroundSize: '20px 20px' }} />
 
                                     <img
-                                        src={`http://localhost:8000/images/${selectedEvent.image_path}?t=${new Date(selectedEvent.timestamp).getTime()}`}
+                                        src={`${API_URL}/events/${selectedEvent.id}/image?variant=web&frame=${selectedFrame}`}
                                         alt="Full Evidence"
                                         className="max-h-full max-w-full object-contain shadow-[0_0_30px_rgba(0,0,0,0.5)] border border-white/5 z-10"
                                     />
@@ -179,6 +302,27 @@ const Events: React.FC = () => {
                                             <p className="text-2xl font-black tracking-tighter text-white">{formatDate(selectedEvent.timestamp)}</p>
                                         </div>
 
+                                        {(selectedEvent.frame_count ?? 1) > 1 && (
+                                            <div>
+                                                <h3 className="text-[10px] uppercase tracking-[0.2em] text-tactical-green/40 font-black border-b border-tactical-green/10 pb-1 mb-2">Sustained Incident</h3>
+                                                <p className="text-[10px] font-black uppercase opacity-80">
+                                                    {selectedEvent.frame_count} captures, last {formatDate(selectedEvent.last_timestamp ?? selectedEvent.timestamp)}
+                                                </p>
+                                                <div className="flex gap-2 pt-2">
+                                                    {Array.from({ length: selectedEvent.kept_frames ?? 1 }, (_, i) => (
+                                                        <img
+                                                            key={i}
+                                                            src={`${API_URL}/events/${selectedEvent.id}/image?variant=thumb&frame=${i}`}
+                                                            loading="lazy"
+                                                            alt={`Capture ${i + 1}`}
+                                                            onClick={() => setSelectedFrame(i)}
+                                                            className={`w-16 aspect-video object-cover cursor-pointer border ${i === selectedFrame ? 'border-tactical-green' : 'border-white/10 opacity-60 hover:opacity-100'}`}
+                                                        />
+                                                    ))}
+                                                </div>
+                                            </div>
+                                        )}
+
                                         <div>
                                             <h3 className="text-[10px] uppercase tracking-[0.2em] text-tactical-green/40 font-black border-b border-tactical-green/10 pb-1 mb-2">Classification</h3>
                                             <p className="text-2xl font-black text-tactical-red shadow-glow-red italic tracking-tight">{selectedEvent.type.replace(/_/g, ' ')}</p>
@@ -217,6 +361,14 @@ const Events: React.FC = () => {
                                     </div>
 
                                     <div className="pt-8 border-t border-tactical-green/10">
+                                        {selectedEvent.clip_path && (
+                                            <a
+                                                href={`${API_URL}/events/${selectedEvent.id}/clip`}
+                                                className="w-full h-10 mb-3 flex items-center justify-center gap-2 border border-tactical-green/40 hover:bg-tactical-green/10 transition-all text-[10px] font-black uppercase tracking-[0.3em]"
+                                            >
+                                                <Film className="w-4 h-4" /> Download Clip
+                                            </a>
+                                        )}
                                         <button
                                             onClick={() => setSelectedEvent(null)}
                                             className="w-full h-12 border-2 border-tactical-green bg-tactical-green/5 hover:bg-tactical-green hover:text-black transition-all font-black uppercase tracking-[0.3em] active:scale-95 shadow-[0_0_15px_rgba(0,255,65,0.1)]"
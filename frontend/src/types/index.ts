@@ -6,6 +6,8 @@ export interface Box {
     y1: number;
     x2: number;
     y2: number;
+    source?: string;
+    track_id?: number | null;
 }
 
 export interface DetectionMessage {
@@ -18,11 +20,19 @@ export interface DetectionMessage {
     threats: string[];
     boxes: Box[];
     status: string;
+    camera_id?: string;
     debug: {
         model_used: string;
     };
 }
 
+export interface HubMessage {
+    type: 'snapshot' | 'delta' | 'heartbeat';
+    camera_id: string;
+    version: number;
+    data: Partial<DetectionMessage>;
+}
+
 export interface SurveillanceEvent {
     id: number;
     timestamp: string;
@@ -31,4 +41,10 @@ export interface SurveillanceEvent {
     confidence: number;
     image_path: string;
     bboxes: string; // JSON string
+    camera_id?: string | null;
+    clip_path?: string | null;
+    frame_count?: number | null;
+    first_timestamp?: string | null;
+    last_timestamp?: string | null;
+    kept_frames?: number | null;
 }